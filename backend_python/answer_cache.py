@@ -0,0 +1,225 @@
+import re
+import threading
+import time
+
+import numpy as np
+
+from telemetry import record_cache
+from vector_backends import embed_query
+
+LIVE_QUERY_TYPES = ("realtime", "historical")  # Answers that depend on the state of the game
+
+# Words that change which play, inning, team or count a question is about. Two questions are only the same
+# question if they agree on all of them, however close their embeddings are.
+ORDINAL_WORDS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6, "seventh": 7,
+                 "eighth": 8, "ninth": 9, "tenth": 10, "eleventh": 11, "twelfth": 12, "last": "last"}
+NUMBER_WORDS = {"zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12}
+SIDE_WORDS = {"home": "home", "away": "away", "visiting": "away", "visitor": "away", "visitors": "away",
+              "top": "top", "bottom": "bottom"}
+SENTENCE_WORDS = {"who", "what", "when", "where", "why", "how", "which", "whose", "is", "was", "are", "were", "did",
+                  "does", "do", "can", "could", "has", "have", "had", "tell", "show", "give", "list", "the", "a", "an",
+                  "in", "i"}
+KEY_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9']+")
+
+
+def key_terms(text):
+    """
+    Returns the terms of a question that must match exactly for two questions to share an answer: numbers
+    (digits, number words and ordinals, so "3rd", "third" and "3" agree), sides (home/away and the top/bottom
+    of an inning) and names (capitalized words and abbreviations such as ERA).
+    """
+    terms = set()
+    for token in KEY_TOKEN_PATTERN.findall(text or ""):
+        word = token.lower().removesuffix("'s")
+        number = re.fullmatch(r"(\d+)(?:st|nd|rd|th)?", word)
+        if number:
+            terms.add(f"n:{int(number.group(1))}")
+        elif word in ORDINAL_WORDS or word in NUMBER_WORDS:
+            terms.add(f"n:{ORDINAL_WORDS.get(word, NUMBER_WORDS.get(word))}")
+        elif word in SIDE_WORDS:
+            terms.add(f"s:{SIDE_WORDS[word]}")
+        elif token[0].isupper() and word not in SENTENCE_WORDS:
+            terms.add(f"name:{word}")
+    return frozenset(terms)
+
+
+class QueryEmbedder:
+    """
+    Embeds questions for the answer cache with a semantic embedding model (e.g. the Vertex AI query
+    embedding behind the persistent EmbeddingCache), returning float32 unit vectors.
+    """
+    def __init__(self, model_factory):
+        """
+        Initializes the QueryEmbedder.
+
+        Args:
+            model_factory (callable): Returns the embedding model; called on first use, so the model connects lazily.
+        """
+        self.model_factory = model_factory
+
+    def embed(self, text):
+        """Returns the unit query embedding of a text."""
+        vector = np.asarray(embed_query(self.model_factory(), text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticAnswerCache:
+    """
+    Caches chat answers by meaning rather than exact text.
+
+    Entries are grouped by (game, window, query type) — the window being the segment or time bucket the
+    question was asked in — and matched by the cosine similarity of a semantic query embedding within a
+    group. A close embedding is not enough: the key_terms() of both questions (numbers, innings, sides,
+    names) must also be equal, since "the 3rd inning" and "the 4th inning" embed almost identically.
+    Each entry stores the embeddings of both the raw question and the optimized query, so a repeated
+    question can be answered before classification (lookup_raw) and a differently worded question with
+    the same optimized query after it (lookup). Entries expire after a TTL, and invalidate_game drops the
+    game-state dependent ones when new plays arrive.
+    """
+    def __init__(self, embedder, threshold=0.95, ttl_seconds=300, max_entries_per_key=256):
+        """
+        Initializes the SemanticAnswerCache.
+
+        Args:
+            embedder (object): Object with an embed(text) method returning unit vectors from a semantic
+                embedding model, such as QueryEmbedder. Bag-of-words embeddings (HashingEmbedder) score
+                questions that differ in one decisive word as near-identical and must not be used here.
+            threshold (float): Minimum cosine similarity for a hit.
+            ttl_seconds (float): Lifetime of an entry.
+            max_entries_per_key (int): Oldest entries of a group are evicted beyond this size.
+        """
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_key = max_entries_per_key
+        self._groups = {}  # (game, window, query_type) -> list of entries
+        self._generations = {}  # game -> generation, bumped by invalidate_game
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup_raw(self, game, windows, query):
+        """
+        Looks a raw user question up across query types before it has been classified.
+
+        Args:
+            game (str): Game identifier.
+            windows (dict): Query type -> window the question would fall in for that type.
+            query (str): The user's question.
+
+        Returns:
+            dict: The cached answer, or None.
+        """
+        vector = self._embed(query)
+        if vector is None:
+            return self._count(None, count_miss=False)
+        terms = key_terms(query)
+        best = None
+        with self._lock:
+            for query_type, window in windows.items():
+                match = self._best((game, window, query_type), vector, terms, "raw")
+                if match and (best is None or match[0] > best[0]):
+                    best = match
+        return self._count(best, count_miss=False)  # A miss here is followed by lookup(), which counts it
+
+    def lookup(self, game, window, query_type, optimized_query):
+        """Returns the cached answer for an optimized query in a (game, window, type) group, or None."""
+        vector = self._embed(optimized_query)
+        if vector is None:
+            return self._count(None)
+        with self._lock:
+            match = self._best((game, window, query_type), vector, key_terms(optimized_query), "optimized")
+        return self._count(match)
+
+    def generation(self, game):
+        """Returns the game's invalidation generation; pass it to store() to avoid caching answers computed before new plays."""
+        with self._lock:
+            return self._generations.get(game, 0)
+
+    def store(self, game, window, query_type, query, optimized_query, answer, generation=None):
+        """
+        Caches an answer under both the raw and the optimized query. When `generation` is given and the game
+        has been invalidated since, the answer is already stale and is not stored.
+        """
+        vector, raw_vector = self._embed(optimized_query), self._embed(query)
+        if vector is None or raw_vector is None:
+            return
+        entry = {
+            "optimized_vector": vector,
+            "optimized_terms": key_terms(optimized_query),
+            "raw_vector": raw_vector,
+            "raw_terms": key_terms(query),
+            "answer": answer,
+            "created_at": time.time(),
+        }
+        with self._lock:
+            if generation is not None and generation != self._generations.get(game, 0):
+                return
+            group = self._groups.setdefault((game, window, query_type), [])
+            group.append(entry)
+            del group[:-self.max_entries_per_key]
+
+    def invalidate_game(self, game, query_types=LIVE_QUERY_TYPES):
+        """Drops the entries of the given query types for a game (e.g. when new plays arrive)."""
+        with self._lock:
+            self._generations[game] = self._generations.get(game, 0) + 1
+            for key in [key for key in self._groups if key[0] == game and key[2] in query_types]:
+                del self._groups[key]
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self._groups.clear()
+
+    def stats(self):
+        """Returns hit/miss counters and the number of cached entries."""
+        with self._lock:
+            entries = sum(len(group) for group in self._groups.values())
+            hits, misses, groups = self.hits, self.misses, len(self._groups)
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": round(hits / total, 3) if total else 0.0,
+                "entries": entries, "groups": groups}
+
+    def _embed(self, text):
+        """Embeds a question, or returns None (a miss) when the embedding model is unavailable."""
+        try:
+            return self.embedder.embed(text)
+        except Exception as e:
+            print(f"Answer cache embedding failed, bypassing the cache: {e}")
+            return None
+
+    def _best(self, key, vector, terms, field):
+        """
+        Returns (similarity, answer) of the closest live entry in a group that is above the threshold and has the
+        same key terms. Caller holds the lock.
+        """
+        group = self._groups.get(key)
+        if not group:
+            return None
+        cutoff = time.time() - self.ttl_seconds
+        group[:] = [entry for entry in group if entry["created_at"] >= cutoff]
+        if not group:
+            del self._groups[key]
+            return None
+        candidates = [entry for entry in group if entry[f"{field}_terms"] == terms]
+        if not candidates:
+            return None
+        similarities = np.stack([entry[f"{field}_vector"] for entry in candidates]) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return float(similarities[best]), candidates[best]["answer"]
+
+    def _count(self, match, count_miss=True):
+        with self._lock:
+            if match is None:
+                self.misses += count_miss
+            else:
+                self.hits += 1
+        if match is None:
+            record_cache("answer", misses=int(count_miss))
+            return None
+        record_cache("answer", hits=1)
+        return match[1]
@@ -1,21 +1,40 @@
 from flask_cors import CORS
 import requests
 from real_time_insights import *
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, Response, request, jsonify
 import uuid
 import base64
 import json
 from historic_insights import *
-from baseball_agent_chat import BaseballAnalysisService
+from baseball_agent_chat import BaseballAnalysisService, VECTOR_BACKEND, vertex_connections, embedding_cache
 from data_processor_vertex_ai import DataProcessor
 from video_analyzer import VideoAnalyzer
+from job_scheduler import JobScheduler, Priority, JobRejected, DeadlineExceeded
+from rag_jobs import AnalysisJobManager
+from video_preprocessor import SegmentTranscoder
+from video_clips import ClipCutter
+from segmenter import LiveSegmenter, load_segment_index, index_existing_segments, needs_reindex
+from play_alignment import build_alignment
+from segment_streaming import resolve_segment, send_segment
+from segment_catalog import SegmentCatalog
+from highlights import HighlightBuilder
+from answer_cache import SemanticAnswerCache, QueryEmbedder
+from query_router import QueryRouter
+from llm_clients import generative_model
+from telemetry import configure as configure_telemetry, stage, bind, stage_metrics
+from segment_uploads import UploadSessionManager, UploadTooLarge, UploadOffsetMismatch, EmptyUpload, save_stream, new_clip_name
+import asyncio
+import threading
+import time
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
+configure_telemetry()  # Spans for every request stage; exported over OTLP when OTEL_EXPORTER_OTLP_ENDPOINT is set
 app = Flask(__name__)   
 CORS(app)
 SEGMENT_DIR = os.path.join(os.getcwd(), "segments")
+HIGHLIGHTS_DIR = os.path.join(os.getcwd(), "highlights")
 SAVED_SEGMENTS_DIR = os.path.join(os.getcwd(), "saved_segments")
 if not os.path.exists(SAVED_SEGMENTS_DIR):
     os.makedirs(SAVED_SEGMENTS_DIR)
@@ -23,21 +42,106 @@ if not os.path.exists(SAVED_SEGMENTS_DIR):
 DATA_DIRECTORY = "data/event"
 GOOGLE_API_KEY = os.environ['GOOGLE_API_KEY']
 MODEL_ID = "gemini-2.0-flash-exp"
+SCHEDULER_WORKERS = int(os.environ.get("SCHEDULER_WORKERS", 4))  # Concurrent Gemini-bound jobs across all endpoints
+CHAT_CREW_POOL_SIZE = int(os.environ.get("CHAT_CREW_POOL_SIZE", SCHEDULER_WORKERS))  # Pre-built crew bundles, one per concurrent chat request
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 32))  # Records per embedding call during /ingest-data
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", 4))  # Embedding calls in flight at once during /ingest-data
+HISTORICAL_FAST_PATH = os.environ.get("HISTORICAL_FAST_PATH", "1") == "1"  # Two direct Gemini calls instead of the historical crews
+INTERACTIVE_DEADLINE = float(os.environ.get("INTERACTIVE_DEADLINE", 30))  # Seconds a chat query may wait in the queue
+LIVE_DEADLINE = float(os.environ.get("LIVE_DEADLINE", 60))  # Seconds a live insight request may wait in the queue
+PREPROCESS_SEGMENTS = os.environ.get("PREPROCESS_SEGMENTS", "0") == "1"  # Transcode segments before uploading them to Gemini
+PREPROCESS_PROFILE = os.environ.get("PREPROCESS_PROFILE", "model")
+SEGMENT_SOURCE = os.environ.get("SEGMENT_SOURCE")  # Optional game video file or stream URL to segment continuously
+CHAT_CLIP_SECONDS = float(os.environ.get("CHAT_CLIP_SECONDS", 10))  # Seconds of video before current_time analyzed per chat question; 0 sends the whole segment
+GAME_PK = "775296"
+GAME_FEED_URL = f"https://statsapi.mlb.com/api/v1.1/game/{GAME_PK}/feed/live"
+ANSWER_CACHE = os.environ.get("ANSWER_CACHE", "0") == "1"  # Reuse chat answers for near-identical questions
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.95))  # Cosine similarity of Vertex query embeddings for reusing a chat answer
+LOCAL_ROUTER = os.environ.get("LOCAL_ROUTER", "1") == "1"  # Route chat questions locally when confident, skipping the LLM classifier
+LOCAL_ROUTER_CONFIDENCE = float(os.environ.get("LOCAL_ROUTER_CONFIDENCE", 0.75))  # Score share the winning route needs to skip the LLM classifier
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", 300))  # Seconds a cached chat answer stays valid
+LIVE_FEED_POLL_SECONDS = float(os.environ.get("LIVE_FEED_POLL_SECONDS", 0))  # Re-fetch the GUMBO feed this often (0 disables) so new plays get aligned
+MAX_CLIP_SECONDS = float(os.environ.get("MAX_CLIP_SECONDS", 60))  # Longest highlight clip /clips will cut
+VECTOR_WARM_UP = os.environ.get("VECTOR_WARM_UP", "1") == "1"  # Connect vector retrieval in the background at startup instead of on the first question
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 200 * 1024 * 1024))  # Largest clip /save-segment and /uploads accept
 
+scheduler = JobScheduler(num_workers=SCHEDULER_WORKERS)
 
-analysis_service = BaseballAnalysisService()
-data_processor = DataProcessor(directory_path=DATA_DIRECTORY)
-analyzer = VideoAnalyzer(GOOGLE_API_KEY, MODEL_ID)
-
-url = "https://statsapi.mlb.com/api/v1.1/game/775296/feed/live"
-response = requests.get(url)
+response = requests.get(GAME_FEED_URL)
 raw_data = response.json()
 
 gumbo_data = GumboData(**raw_data)
 gumbo_utils = GumboUtilities(gumbo_data)
-sync_data = {}
-with open("sync.json", "r") as f:
-    sync_data = json.load(f)
+
+if not SEGMENT_SOURCE and os.path.isdir(SEGMENT_DIR) and needs_reindex(load_segment_index(SEGMENT_DIR)):
+    try:
+        index_existing_segments(SEGMENT_DIR)  # One-off index for pre-populated segments
+    except Exception as e:
+        print(f"Error indexing existing segments: {e}")
+alignment = build_alignment(gumbo_utils, load_segment_index(SEGMENT_DIR))  # Segment/video time -> play index
+segment_catalog = SegmentCatalog(SEGMENT_DIR, segment_index=load_segment_index(SEGMENT_DIR)).start()
+saved_catalog = SegmentCatalog(SAVED_SEGMENTS_DIR).start()
+upload_sessions = UploadSessionManager(os.path.join("cache", "uploads"), SAVED_SEGMENTS_DIR, MAX_UPLOAD_BYTES,
+                                       on_complete=lambda name: saved_catalog.refresh(name, describe=False))
+
+preprocessor = SegmentTranscoder(cache_dir=os.path.join("cache", "transcoded"), profile=PREPROCESS_PROFILE) if PREPROCESS_SEGMENTS else None
+clip_cutter = ClipCutter(cache_dir=os.path.join("cache", "clips"), segment_bounds=alignment.segment_bounds)  # Keyframe-aligned segment offsets
+highlight_cutter = ClipCutter(cache_dir=SAVED_SEGMENTS_DIR)  # Viewer clips, deduplicated by (segment, range) through their names
+answer_cache = SemanticAnswerCache(QueryEmbedder(vertex_connections.query_embed_model), threshold=ANSWER_CACHE_THRESHOLD,
+                                  ttl_seconds=ANSWER_CACHE_TTL) if ANSWER_CACHE else None
+analysis_service = BaseballAnalysisService(preprocessor=preprocessor, clip_cutter=clip_cutter if CHAT_CLIP_SECONDS > 0 else None,
+                                           clip_seconds=CHAT_CLIP_SECONDS, alignment=alignment,
+                                           answer_cache=answer_cache, game_id=GAME_PK,
+                                           router=QueryRouter(log_path=os.path.join("cache", "query_log.jsonl"),
+                                                              min_confidence=LOCAL_ROUTER_CONFIDENCE) if LOCAL_ROUTER else None,
+                                           crew_pool_size=CHAT_CREW_POOL_SIZE, historical_fast_path=HISTORICAL_FAST_PATH)
+analyzer = VideoAnalyzer(GOOGLE_API_KEY, MODEL_ID, preprocessor=preprocessor)
+
+def inning_at(segment_name, seconds):
+    """Returns the inning of the play shown `seconds` into a segment, or None before the first play."""
+    plays = gumbo_utils.get_all_plays()
+    if not plays:
+        return None
+    start, _ = alignment.segment_bounds(segment_name)
+    return plays[alignment.play_index_at(start + seconds)].about.inning
+
+data_processor = DataProcessor(directory_path=DATA_DIRECTORY, connections=vertex_connections,
+                               inning_at=inning_at, embed_batch_size=EMBED_BATCH_SIZE, embed_workers=EMBED_WORKERS, game_id=GAME_PK,
+                               ledger_path=os.path.join("cache", f"ingest_ledger_{VECTOR_BACKEND}.json"),  # One ledger per index
+                               embedding_cache=embedding_cache)
+highlights = HighlightBuilder(DATA_DIRECTORY, SEGMENT_DIR, output_dir=HIGHLIGHTS_DIR,
+                              cache_dir=os.path.join("cache", "highlights"), inning_at=inning_at)
+highlights.request_update()  # Picks up analyses written while the server was down
+rag_jobs = AnalysisJobManager(analyzer, scheduler, jobs_dir=os.path.join("cache", "rag_jobs"),
+                              on_segment_done=lambda analysis_path, video_path: highlights.request_update(
+                                  os.path.dirname(analysis_path), os.path.dirname(video_path)))  # Jobs may write outside DATA_DIRECTORY
+rag_jobs.resume_pending()
+
+segmenter = None
+if SEGMENT_SOURCE:
+    def on_segment(name, entry):
+        alignment.set_segment(name, entry)
+        segment_catalog.set_duration(name, entry["duration"])
+        segment_catalog.refresh(name, describe=False)
+
+    segmenter = LiveSegmenter(SEGMENT_SOURCE, output_dir=SEGMENT_DIR, on_segment=on_segment)
+    segmenter.start()
+
+def poll_live_feed():
+    """Periodically refreshes the GUMBO feed in place and aligns newly arrived plays."""
+    while True:
+        time.sleep(LIVE_FEED_POLL_SECONDS)
+        try:
+            gumbo_utils.data = GumboData(**requests.get(GAME_FEED_URL).json())
+            if alignment.update(gumbo_utils.get_all_plays()) and answer_cache:
+                answer_cache.invalidate_game(GAME_PK)  # Answers about the game state are stale once new plays arrive
+        except Exception as e:
+            print(f"Error refreshing live feed: {e}")
+
+if LIVE_FEED_POLL_SECONDS > 0:
+    threading.Thread(target=poll_live_feed, name="live-feed-poller", daemon=True).start()
+if VECTOR_WARM_UP:
+    threading.Thread(target=vertex_connections.warm_up, name="vector-warm-up", daemon=True).start()
 print("Running your server")
 
 @app.route('/team-logo', methods=['POST'])
@@ -53,24 +157,66 @@ def get_team_logo():
 @app.route('/list-segments', methods=['GET'])
 def list_segments():
     try:
-        print("Listing segments")
-        segments = os.listdir(SEGMENT_DIR)
-        segments = sorted(segments)
-        return jsonify({"segments": segments})
+        first = request.args.get('from', type=int)
+        last = request.args.get('to', type=int)
+        offset = request.args.get('offset', 0, type=int)
+        limit = request.args.get('limit', type=int)
+        if first is not None or last is not None:
+            entries = segment_catalog.segment_range(first or 0, last if last is not None else float("inf"))
+        elif offset or limit is not None:
+            entries = segment_catalog.page(offset, limit)
+        else:
+            entries = None  # Full listing, served from the catalog's cached snapshot
+        segments = segment_catalog.names() if entries is None else [entry["name"] for entry in entries]
+        response = {"segments": segments, "total": len(segment_catalog)}
+        if request.args.get('details') == '1':
+            response["details"] = entries if entries is not None else segment_catalog.page()
+        return jsonify(response)
     except Exception as e:
         print(f"Error listing segments: {e}")
         return jsonify({"error": "Failed to list segments"}), 500
 
+@app.route('/segment-index', methods=['GET'])
+def segment_index():
+    try:
+        index = load_segment_index(SEGMENT_DIR)
+        if index is None:
+            return jsonify({"error": "Segment index not built yet."}), 404
+        return jsonify(index)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/segment-plays', methods=['GET'])
+def segment_plays():
+    try:
+        segment_name = request.args.get('segmentName')
+        video_time = request.args.get('t', type=float)
+        if segment_name:
+            start, end = alignment.segment_bounds(segment_name)
+        elif video_time is not None:
+            start = end = video_time
+        else:
+            return jsonify({"error": "segmentName or t is required"}), 400
+        return jsonify({
+            "start": start,
+            "end": end,
+            "plays": alignment.plays_between(start, end),
+            "pitches": [{"play": play, "event": event} for play, event in alignment.pitches_between(start, end)],
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/stream-segment', methods=['GET'])
 def stream_segment():
     try:
         segment_name = request.args.get('segmentName')
         if not segment_name:
             return jsonify({"error": "Segment Name is required"}), 400
-        segment_path = os.path.join(SEGMENT_DIR, segment_name)
-        if not os.path.exists(segment_path):
+        segment_path = resolve_segment(SEGMENT_DIR, segment_name)
+        if not segment_path:
             return jsonify({"error": f"Segment {segment_name} not found."}), 404
-        return send_file(segment_path, mimetype='video/mp4')
+        # While a game is being segmented the newest file may still be growing; only indexed segments are final
+        return send_segment(segment_path, immutable=segmenter is None or segmenter.is_finished(os.path.basename(segment_path)))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -81,48 +227,162 @@ def segment_description():
         segment_name = data.get('segmentName')
         if not segment_name:
             return jsonify({"error": "Segment Name is required"}), 400
-        segment_path = os.path.join(SEGMENT_DIR, segment_name)
-        if not os.path.exists(segment_path):
+        if segment_name not in segment_catalog:
             return jsonify({"error": f"Segment {segment_name} not found."}), 404
-        with open("sync.json", "r") as f:
-            data = json.load(f)
-        live_data_index = data.get(segment_name)
-        if segment_name != "segment_003.mp4":
-            live_data_index += 1
+        live_data_index = alignment.play_index_for_segment(segment_name)
         live_data = json.loads(gumbo_utils.get_all_plays()[live_data_index].model_dump_json())
         return live_data
     except Exception as e:
         print(f"Error fetching live data: {e}")
         return jsonify({"error": "Error fetching live data"}), 500
 
+def is_video_mimetype(mimetype):
+    """Returns whether an upload's content type can be a recorded clip (video/* or untyped binary)."""
+    return bool(mimetype) and (mimetype.startswith('video/') or mimetype == 'application/octet-stream')
+
+def saved_clip_response(clip_id, status=200):
+    return jsonify({
+        "message": f"Segment saved successfully as {clip_id}",
+        "clipId": clip_id,
+        "videoUrl": f"/saved_segments/{clip_id}",
+    }), status
+
 @app.route('/save-segment', methods=['POST'])
 def save_segment():
+    """
+    Saves a recorded clip. The body is streamed to disk in chunks when it is sent raw (video/* or
+    application/octet-stream) or as multipart form data with a "video" file part. The original JSON body
+    with a base64 data URL is still accepted. Responds with the new clip id so no /get-latest-video
+    round trip is needed. Empty bodies and other content types are rejected with 400.
+    """
     try:
-        data = request.get_json()
-        video_data = data.get('videoData')
-        if not video_data:
+        if request.content_length and request.content_length > MAX_UPLOAD_BYTES:
+            return jsonify({"error": f"Video exceeds {MAX_UPLOAD_BYTES} bytes"}), 413
+        if request.content_length == 0:
             return jsonify({"error": "Video data is required"}), 400
-        if not isinstance(video_data, str) or not video_data.startswith('data:video/mp4;base64,'):
-            return jsonify({"error": "Invalid video data format. Expected a base64 string."}), 400
-        base64_data = video_data.replace('data:video/mp4;base64,', '')
-        video_buffer = base64.b64decode(base64_data)
-        segment_name = f"video_segment_{uuid.uuid4()}.mp4"
-        file_path = os.path.join(SAVED_SEGMENTS_DIR, segment_name)
-        with open(file_path, 'wb') as f:
-            f.write(video_buffer)
-        return jsonify({"message": f"Segment saved successfully as {segment_name}"}), 200
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('video')
+            if upload is None:
+                return jsonify({"error": "Video file part 'video' is required"}), 400
+            if not is_video_mimetype(upload.mimetype):
+                return jsonify({"error": f"Unsupported video content type: {upload.mimetype or 'none'}"}), 400
+            segment_name = save_stream(upload.stream, SAVED_SEGMENTS_DIR, MAX_UPLOAD_BYTES)
+        elif request.mimetype != 'application/json':
+            if not is_video_mimetype(request.mimetype):
+                return jsonify({"error": f"Unsupported content type: {request.mimetype or 'none'}"}), 400
+            segment_name = save_stream(request.stream, SAVED_SEGMENTS_DIR, MAX_UPLOAD_BYTES)
+        else:
+            data = request.get_json()
+            video_data = data.get('videoData')
+            if not video_data:
+                return jsonify({"error": "Video data is required"}), 400
+            if not isinstance(video_data, str) or not video_data.startswith('data:video/mp4;base64,'):
+                return jsonify({"error": "Invalid video data format. Expected a base64 string."}), 400
+            video_buffer = base64.b64decode(video_data[len('data:video/mp4;base64,'):])
+            if not video_buffer:
+                return jsonify({"error": "Video data is required"}), 400
+            segment_name = new_clip_name()
+            with open(os.path.join(SAVED_SEGMENTS_DIR, segment_name), 'wb') as f:
+                f.write(video_buffer)
+        saved_catalog.refresh(segment_name, describe=False)  # Visible to /get-latest-video before the watcher fires
+        return saved_clip_response(segment_name)
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except EmptyUpload as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error saving video segment: {e}")
         return jsonify({"error": "Failed to save segment"}), 500
 
+@app.route('/clips', methods=['POST'])
+def create_clip():
+    """
+    Cuts a clip from segments/ with stream copy. The body gives segmentName and start/end seconds
+    relative to that segment; ranges may spill into the neighbouring segments. The same
+    (segment, range) always maps to the same clip, which is reused.
+    """
+    try:
+        data = request.get_json()
+        segment_name = data.get('segmentName')
+        start, end = float(data.get('start', 0)), float(data.get('end', 0))
+        if not segment_name:
+            return jsonify({"error": "Segment Name is required"}), 400
+        if not 0 < end - start <= MAX_CLIP_SECONDS:
+            return jsonify({"error": f"end must be after start and at most {MAX_CLIP_SECONDS} seconds later"}), 400
+        segment_path = resolve_segment(SEGMENT_DIR, segment_name)
+        if not segment_path:
+            return jsonify({"error": f"Segment {segment_name} not found."}), 404
+        clip_path = highlight_cutter.cut_range(segment_path, start, end)
+        if clip_path == segment_path:
+            return jsonify({"error": "The requested range is outside the available segments."}), 400
+        clip_id = os.path.basename(clip_path)
+        created = clip_id not in saved_catalog
+        saved_catalog.refresh(clip_id, describe=False)
+        return saved_clip_response(clip_id, 201 if created else 200)
+    except Exception as e:
+        print(f"Error cutting clip: {e}")
+        return jsonify({"error": "Failed to cut clip"}), 500
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Starts a resumable clip upload. The total size may be given in the Upload-Length header."""
+    try:
+        length = request.headers.get('Upload-Length', type=int)
+        session = upload_sessions.create(length)
+        return jsonify(session), 201
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/uploads/<upload_id>', methods=['GET', 'PATCH'])
+def resumable_upload(upload_id):
+    """
+    GET returns the upload's current offset. PATCH appends the raw request body at the offset given in
+    the Upload-Offset header; a client that lost its connection asks for the offset and resumes from it.
+    """
+    try:
+        if request.method == 'GET':
+            session = upload_sessions.status(upload_id)
+            if session is None:
+                return jsonify({"error": "Upload not found"}), 404
+            return jsonify(session)
+        offset = request.headers.get('Upload-Offset', type=int)
+        if offset is None:
+            return jsonify({"error": "Upload-Offset header is required"}), 400
+        session = upload_sessions.append(upload_id, offset, request.stream)
+        if "clipId" in session:
+            return saved_clip_response(session["clipId"])
+        return jsonify(session)
+    except KeyError:
+        return jsonify({"error": "Upload not found"}), 404
+    except UploadOffsetMismatch as e:
+        return jsonify({"error": str(e), "offset": e.expected}), 409
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Finishes an upload started without Upload-Length and returns the clip id."""
+    try:
+        session = upload_sessions.complete(upload_id)
+        return saved_clip_response(session["clipId"], 201)
+    except KeyError:
+        return jsonify({"error": "Upload not found"}), 404
+    except UploadOffsetMismatch as e:
+        return jsonify({"error": str(e), "offset": e.expected}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/get-latest-video', methods=['GET'])
 async def get_latest_video():
     try:
-        video_files = [file for file in os.listdir(SAVED_SEGMENTS_DIR) if file.endswith('.mp4')]
-        if not video_files:
+        latest = saved_catalog.latest()
+        if not latest:
             return jsonify({"error": "No video segments found."}), 404
-        latest_video_file = max(video_files, key=lambda file: os.path.getmtime(os.path.join(SAVED_SEGMENTS_DIR, file)))
-        return jsonify({"latestVideoFile": latest_video_file}), 200
+        return jsonify({"latestVideoFile": latest["name"]}), 200
     except Exception as e:
         print(f"Error in get-latest-video: {e}")
         return jsonify({"error": "Internal server error while fetching the latest video."}), 500
@@ -130,10 +390,40 @@ async def get_latest_video():
 @app.route('/saved_segments/<filename>', methods=['GET'])
 def serve_saved_segment(filename):
     try:
-        file_path = os.path.join(SAVED_SEGMENTS_DIR, filename)
-        if not os.path.exists(file_path):
+        file_path = resolve_segment(SAVED_SEGMENTS_DIR, filename)
+        if not file_path:
             return jsonify({"error": "File not found"}), 404
-        return send_from_directory(SAVED_SEGMENTS_DIR, filename)
+        return send_segment(file_path)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/highlights', methods=['GET'])
+def list_highlights():
+    try:
+        manifest = highlights.manifest
+        reels = [{"name": reel, "clips": len(clips), "videoUrl": f"/highlights/{reel}"}
+                 for reel, clips in sorted(manifest["reels"].items())]
+        events = [dict(event, clip=os.path.basename(event["clip"]))
+                  for analysis in manifest["analyses"].values() for event in analysis["events"]]
+        return jsonify({"reels": reels, "events": events})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/highlights/rebuild', methods=['POST'])
+def rebuild_highlights():
+    try:
+        highlights.request_update()
+        return jsonify({"message": "Highlight update queued"}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/highlights/<filename>', methods=['GET'])
+def serve_highlight(filename):
+    try:
+        file_path = resolve_segment(HIGHLIGHTS_DIR, filename)
+        if not file_path or not filename.endswith('.mp4'):
+            return jsonify({"error": "File not found"}), 404
+        return send_segment(file_path, immutable=False)  # Reels grow as more segments are analyzed
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -187,15 +477,21 @@ async def match_overview():
         json_data = request.get_json()
         print(json_data)
         chunk_number = json_data["chunk_number"]
-        genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
-        client = genai.GenerativeModel('gemini-1.5-flash')
-        index_number = sync_data.get(chunk_number)
-        app = BaseballInsightApp(gumbo_utils, client, index_number)
-        data_processor = BaseballDataProcessor()
-        data_processor.load_data('mlb_batters_stats_combined.csv', 'mlb_pitchers_stats_combined.csv')
-        historic_insight_analyzer = BaseballStrategyAnalyzer(os.environ["GOOGLE_API_KEY"])
-        insights = await app.process_game_update(historic_insight_analyzer, data_processor)
+        with stage("http.match_overview", chunk_number=chunk_number):
+            client = generative_model('gemini-1.5-flash', os.environ.get("GOOGLE_API_KEY"))
+            index_number = alignment.play_index_for_segment(chunk_number)
+            app = BaseballInsightApp(gumbo_utils, client, index_number)
+            data_processor = BaseballDataProcessor()
+            with stage("match_overview.load_csv"):
+                data_processor.load_data('mlb_batters_stats_combined.csv', 'mlb_pitchers_stats_combined.csv')
+            historic_insight_analyzer = BaseballStrategyAnalyzer(os.environ.get("GOOGLE_API_KEY"))
+            # The coroutine is created on the worker, so a shed or expired job leaves no un-awaited coroutine behind
+            future = scheduler.submit(Priority.LIVE, bind(lambda: asyncio.run(app.process_game_update(historic_insight_analyzer, data_processor)),
+                                                          "match_overview.queue_wait"), deadline=LIVE_DEADLINE)
+            insights = await asyncio.wrap_future(future)
         return insights
+    except (JobRejected, DeadlineExceeded) as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -208,9 +504,17 @@ def analyze():
         query = data['query']
         video = data['video']
         current_time = data['current_time']
+        if data.get('segment_time') is not None:
+            # The playhead inside the segment is exact; place it on the video timeline from the segment index
+            current_time = alignment.segment_bounds(video)[0] + float(data['segment_time'])
         complete_path_video = os.path.join(SEGMENT_DIR, video)
-        result = analysis_service.run(query, complete_path_video, current_time)
+        with stage("http.analyze", video=video):
+            result = scheduler.run(Priority.INTERACTIVE, bind(analysis_service.run, "analyze.queue_wait"), query, complete_path_video, current_time,
+                                   deadline=INTERACTIVE_DEADLINE)
         return jsonify({"result": result})
+    except (JobRejected, DeadlineExceeded) as e:
+        print(f"Chat query not scheduled: {e}")
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         print(f"Error during processing: {e}")
         return jsonify({"error": str(e)}), 500
@@ -218,8 +522,11 @@ def analyze():
 @app.route('/ingest-data', methods=['POST'])
 def ingest_data_endpoint():
     try:
-        data_processor.ingest_data()
-        return jsonify({"message": "Data ingestion process initiated"}), 200
+        with stage("http.ingest_data"):
+            summary = data_processor.ingest_data()
+        if answer_cache:
+            answer_cache.invalidate_game(GAME_PK, query_types=("historical",))  # Retrieval now sees new segments
+        return jsonify({"message": "Data ingestion process initiated", "summary": summary}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -229,10 +536,79 @@ def analyze_rag():
         video_dir = request.form.get('video_dir')
         output_dir = request.form.get('output_dir')
         max_workers = int(request.form.get('max_workers', 4))
+        max_retries = int(request.form.get('max_retries', 3))
         if not video_dir or not output_dir:
             return jsonify({"error": "video_dir and output_dir are required"}), 400
-        analyzer.process_segments(video_dir, output_dir, max_workers)
-        return jsonify({"message": "Video segments processed successfully"}), 200
+        if not os.path.isdir(video_dir):
+            return jsonify({"error": f"video_dir {video_dir} not found."}), 404
+        with stage("http.analyze_rag"):
+            job_id = rag_jobs.submit(video_dir, output_dir, max_workers, max_retries)
+        return jsonify({"message": "Video segment analysis job submitted", "job_id": job_id,
+                        "status_url": f"/analyze_rag/{job_id}"}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analyze_rag/jobs', methods=['GET'])
+def list_analyze_rag_jobs():
+    try:
+        return jsonify({"jobs": rag_jobs.list_jobs()}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analyze_rag/<job_id>', methods=['GET'])
+def analyze_rag_status(job_id):
+    try:
+        job = rag_jobs.status(job_id)
+        if job is None:
+            return jsonify({"error": f"Job {job_id} not found."}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analyze_rag/<job_id>/cancel', methods=['POST'])
+def cancel_analyze_rag(job_id):
+    try:
+        if not rag_jobs.cancel(job_id):
+            return jsonify({"error": f"Job {job_id} not found."}), 404
+        return jsonify(rag_jobs.status(job_id)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/scheduler-metrics', methods=['GET'])
+def scheduler_metrics():
+    try:
+        return jsonify(dict(scheduler.metrics(), crew_pool=analysis_service.crew_pool.stats())), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/answer-cache', methods=['GET', 'DELETE'])
+def answer_cache_stats():
+    try:
+        if answer_cache is None:
+            return jsonify({"error": "Answer cache is disabled."}), 404
+        if request.method == 'DELETE':
+            answer_cache.clear()
+        return jsonify(answer_cache.stats()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(stage_metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/vector-connection', methods=['GET'])
+def vector_connection_status():
+    try:
+        return jsonify(vertex_connections.status()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/embedding-cache', methods=['GET'])
+def embedding_cache_stats():
+    try:
+        if embedding_cache is None:
+            return jsonify({"error": "Embedding cache is disabled."}), 404
+        return jsonify(embedding_cache.stats()), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -242,9 +618,7 @@ if __name__ == '__main__':
     raw_data = response.json()
     gumbo_data = GumboData(**raw_data)
     gumbo_utils = GumboUtilities(gumbo_data)
-    sync_data = {}
-    with open("sync.json", "r") as f:
-        sync_data = json.load(f)
+    alignment.update(gumbo_utils.get_all_plays())
     print("Running your server")
     app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 7770)))
     print("started")
\ No newline at end of file
@@ -4,77 +4,55 @@ from langchain.tools import tool
 import json
 from datetime import datetime, timedelta
 import time
-from google import genai
 from google.genai import types
 from textwrap import dedent
 from dotenv import load_dotenv
 from pydantic import BaseModel
+from types import SimpleNamespace
 import uuid
+import re
 from crewai.tools import BaseTool
-from google.cloud import aiplatform
-from google.oauth2 import service_account
-from crewai_tools import SerperDevTool, ScrapeWebsiteTool
-from crewai import LLM
-from llama_index.core import (
-    StorageContext,
-    Settings,
-    VectorStoreIndex,
-)
-from llama_index.core.vector_stores.types import (
-    MetadataFilters,
-    MetadataFilter,
-    FilterOperator,
-)
-from llama_index.embeddings.vertex import VertexTextEmbedding
-from llama_index.vector_stores.vertexaivectorsearch import VertexAIVectorStore
+
+from crew_pool import CrewPool
+from hybrid_retrieval import query_filters
+from query_router import clean_question
+from embedding_cache import EmbeddingCache
+from vertex_connection import VertexConnectionManager
+from llm_clients import crew_llm, genai_client
+from telemetry import stage, record_usage, record_cache
 
 load_dotenv()
 
 
 # --- Configuration ---
-PROJECT_ID = os.environ["PROJECT_ID"]  # Google Cloud project ID
-REGION = os.environ["REGION"]  # Region for Vertex AI services
-GCS_BUCKET_NAME = os.environ["GCS_BUCKET_NAME"]  # Google Cloud Storage bucket name
+PROJECT_ID = os.environ.get("PROJECT_ID")  # Google Cloud project ID
+REGION = os.environ.get("REGION")  # Region for Vertex AI services
+GCS_BUCKET_NAME = os.environ.get("GCS_BUCKET_NAME")  # Google Cloud Storage bucket name
 GCS_BUCKET_URI = f"gs://{GCS_BUCKET_NAME}"  # Google Cloud Storage bucket URI
 VS_DIMENSIONS = 768  # Vector dimensions for Vertex AI Vector Search
 
-VS_INDEX_NAME = os.environ["VS_INDEX_NAME"]  # Name of the Vertex AI Vector Search index
-VS_INDEX_ENDPOINT_NAME = os.environ["VS_INDEX_ENDPOINT_NAME"]  # Name of the Vertex AI Vector Search index endpoint
+VS_INDEX_NAME = os.environ.get("VS_INDEX_NAME")  # Name of the Vertex AI Vector Search index
+VS_INDEX_ENDPOINT_NAME = os.environ.get("VS_INDEX_ENDPOINT_NAME")  # Name of the Vertex AI Vector Search index endpoint
 
-GOOGLE_API_KEY = os.environ["GOOGLE_API_KEY"]  # API key for Google services (Gemini, etc.)
-MODEL_ID = os.environ["MODEL_ID"]  # Model ID for Gemini
-INDEX_ID = os.environ["INDEX_ID"]  # ID of the Vertex AI Matching Engine Index
-ENDPOINT_ID = os.environ["ENDPOINT_ID"]  # ID of the Vertex AI Matching Engine Index Endpoint
+GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")  # API key for Google services (Gemini, etc.)
+MODEL_ID = os.environ.get("MODEL_ID")  # Model ID for Gemini
+INDEX_ID = os.environ.get("INDEX_ID")  # ID of the Vertex AI Matching Engine Index
+ENDPOINT_ID = os.environ.get("ENDPOINT_ID")  # ID of the Vertex AI Matching Engine Index Endpoint
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "vertex")  # "vertex" (Vertex AI Vector Search) or "local" (in-process index)
+LOCAL_VECTOR_DIR = os.environ.get("LOCAL_VECTOR_DIR", os.path.join("cache", "vector_index"))  # Where the local index is persisted
+VECTOR_EMBEDDINGS = os.environ.get("VECTOR_EMBEDDINGS", "vertex")  # "vertex" or "hashing" (local, fully offline) for the local index
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", os.path.join("cache", "embeddings"))  # Empty disables the embedding cache
 
 
-# Initialize tools
-search_tool = SerperDevTool()  # Tool for searching the web
-scrape_web = ScrapeWebsiteTool()  # Tool for scraping website content
 SYSTEM_PROMPT = "When given a video and a query, provide answer to the user query based on the provided video"  # System Prompt for analyzing the video
-print("Connecting to Vertex AI Vector Search...")
-
-# Initialize Vertex AI and Vector Search
-try:
-    aiplatform.init(project=PROJECT_ID, location=REGION)  # Initialize Vertex AI
-    vertex_ai_index = aiplatform.MatchingEngineIndex(index_name=INDEX_ID)  # Load the Vertex AI Matching Engine Index
-    vertex_ai_endpoint = aiplatform.MatchingEngineIndexEndpoint(index_endpoint_name=ENDPOINT_ID)  # Load the Vertex AI Matching Engine Index Endpoint
-    vector_store = VertexAIVectorStore(project_id=PROJECT_ID, region=REGION, index_id=vertex_ai_index.resource_name, endpoint_id=vertex_ai_endpoint.resource_name, gcs_bucket_name=GCS_BUCKET_NAME)  # Initialize the Vertex AI Vector Store
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)  # Initialize the storage context for LlamaIndex
 
-    # Load credentials
-    key_path = "1.json"  # Path to Service Account
-    credentials = service_account.Credentials.from_service_account_file(key_path)  # Load credentials from service account file
 
-    # Configure embedding model
-    embed_model = VertexTextEmbedding(model_name="textembedding-gecko@003", project=PROJECT_ID, location="us-central1", credentials=credentials)  # Initialize the Vertex AI Text Embedding model
-    Settings.embed_model = embed_model  # Set the embedding model for LlamaIndex
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIR) if EMBEDDING_CACHE_DIR else None  # Shared with ingestion
 
-    # Initialize index
-    index = VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=embed_model)  # Load the LlamaIndex Vector Store Index
-    print("Vertex AI Vector Search connected.")
-except Exception as e:
-    print(f"Error connecting to Vertex AI Vector Search: {e}")
-    raise
+# Vector Search, the embedding model and the web tools connect on first use (or on warm_up()), not at import
+vertex_connections = VertexConnectionManager(backend=VECTOR_BACKEND, project_id=PROJECT_ID, region=REGION, index_id=INDEX_ID,
+                                             endpoint_id=ENDPOINT_ID, gcs_bucket_name=GCS_BUCKET_NAME, local_dir=LOCAL_VECTOR_DIR,
+                                             embeddings=VECTOR_EMBEDDINGS, embedding_cache=embedding_cache)
 
 
 # --- Data Model Definitions ---
@@ -96,6 +74,12 @@ class ModifiedQuery(BaseModel):
     """Represents a modified query for vector search."""
     modified_query: str  # Modified query string optimized for vector search
 
+
+class HistoricalSearchPlan(BaseModel):
+    """Represents the modified query and filter of a historical question, produced by one structured-output call."""
+    modified_query: str  # Modified query string optimized for vector search
+    filter: VectorSearchFilter  # Filter for the vector search; an empty key means no filter
+
 class GeminiVisionOutput(BaseModel):
     """Represents Gemini Vision output."""
     query: str  # User's query
@@ -113,23 +97,104 @@ class SearchOutput(BaseModel):
     answer: str  # Answer from web search
     citations: str  # Citations for the answer
 
+
+def search_vector_db(query, filters, top_k=10):
+    """
+    Retrieves the chunks most relevant to query from the vector index, restricted by filters.
+
+    Args:
+        query (str): The query to be passed to the vector DB.
+        filters (dict | list): A VectorSearchFilter-shaped dict or a list of them (all must match), or an
+            empty dict for no filter.
+        top_k (int): Number of chunks to retrieve.
+
+    Returns:
+        list: Chunk dicts with "id", "text", "score" and "metadata".
+    """
+    print(f"\nFetching content from the {VECTOR_BACKEND} vector index...")
+    print(f"Filters: {filters}")
+    print(f"Query: {query}")
+    with stage("vector.search", backend=VECTOR_BACKEND, top_k=top_k) as span:
+        results = vertex_connections.retriever().search(query, filters, top_k=top_k)
+        span.set_attribute("vector.results", len(results))
+    for chunk in results:
+        print(f"  Text: {chunk['text']}")
+        print(f"  Score: {chunk['score']:.3f}")
+        print(f"  Metadata: {chunk['metadata']}")
+    print(f"  Retrieved {len(results)} chunks.")
+    return results
+
+
+LATEST_PATTERN = re.compile(r"\b(latest|last|recent|recently|most recent)\b", re.IGNORECASE)
+
+
+def post_filter_chunks(chunks, query, current_time):
+    """
+    Drops chunks from after the viewer's current time and, for "latest"-style questions, orders the rest
+    by recency — the post-processing the vector search task otherwise asks the retrieval agent to do.
+    """
+    try:
+        now = float(current_time)
+    except (TypeError, ValueError):
+        now = None
+
+    def chunk_time(chunk):
+        try:
+            return float(chunk["metadata"].get("time"))
+        except (TypeError, ValueError, AttributeError):
+            return None
+
+    if now is not None:
+        chunks = [chunk for chunk in chunks if chunk_time(chunk) is None or chunk_time(chunk) <= now]
+    if LATEST_PATTERN.search(query or ""):
+        chunks = sorted(chunks, key=lambda chunk: chunk_time(chunk) or 0.0, reverse=True)
+    return chunks
+
+
 # --- Baseball Analysis Service Class ---
 class BaseballAnalysisService():
-    def __init__(self):
-        """Initializes the Baseball Analysis Service with LLM, Vector DB, and agents/tasks."""
+    def __init__(self, preprocessor=None, clip_cutter=None, clip_seconds=10.0, alignment=None, answer_cache=None, game_id=None,
+                 router=None, crew_pool_size=1, crew_pool_max_size=None, historical_fast_path=True):
+        """
+        Initializes the Baseball Analysis Service with LLM, Vector DB, and agents/tasks.
+
+        Args:
+            preprocessor (SegmentTranscoder, optional): Transcodes videos to a smaller, model-friendly profile before upload.
+            clip_cutter (ClipCutter, optional): When set, real-time questions analyze only the last clip_seconds
+                before the viewer's current_time instead of the whole segment.
+            clip_seconds (float): Length of the clip analyzed for real-time questions.
+            alignment (PlayAlignment, optional): Maps the analyzed segment to its play for the past game summary context.
+            answer_cache (SemanticAnswerCache, optional): Returns answers to near-identical questions asked in the same
+                segment or time window without running the crews again.
+            game_id (str, optional): Identifies the game in answer cache keys.
+            router (QueryRouter, optional): Classifies confident cases locally; the classifier crew only runs
+                for the rest and its answers are fed back to the router.
+            crew_pool_size (int): Number of crew bundles built up front, i.e. chat requests that can run concurrently
+                without waiting or building crews.
+            crew_pool_max_size (int, optional): Number of bundles the pool may grow to under load.
+            historical_fast_path (bool): Answers historical questions with two structured-output Gemini calls and
+                direct retrieval instead of the two historical crews, which remain the fallback.
+        """
         try:
             # Initialize Gemini LLM
-            self.llm = LLM(model="gemini/gemini-2.0-flash-exp", api_key=os.environ["GEMINI_API_KEY"])
-            self.client = genai.Client(api_key=GOOGLE_API_KEY)
-
-            self.init_agents()
-            self.init_tasks()
+            self.llm = crew_llm("gemini/gemini-2.0-flash-exp", os.environ.get("GEMINI_API_KEY"))
+            self.client = genai_client(GOOGLE_API_KEY)
+            self.preprocessor = preprocessor
+            self.clip_cutter = clip_cutter
+            self.clip_seconds = clip_seconds
+            self.alignment = alignment
+            self.answer_cache = answer_cache
+            self.game_id = game_id
+            self.router = router
+            self.historical_fast_path = historical_fast_path
+
+            self.crew_pool = CrewPool(self.build_crews, size=crew_pool_size, max_size=crew_pool_max_size)
         except Exception as e:
             print(f"Error initializing BaseballAnalysisService: {e}")
             raise
 
-    def init_agents(self):
-        """Initializes and configures the agents with their respective roles and tools."""
+    def init_agents(self, target):
+        """Initializes and configures the agents with their respective roles and tools as attributes of target."""
 
         @tool()
         def analyze_video(query: str, video: str) -> str:
@@ -148,14 +213,12 @@ class BaseballAnalysisService():
             print(f"  Video: {video}")
 
             try:
-                segment_name = video.split("/")[-1]
-                with open("sync.json", "r") as f:
-                    sync_data = json.load(f)
-                index_number = sync_data[segment_name]
-                with open("cache/past_game_summary.json", "r") as f:
+                segment_name = (self.clip_cutter and self.clip_cutter.source_segment(video)) or video.split("/")[-1]
+                index_number = self.alignment.play_index_for_segment(segment_name) if self.alignment else None
+                with stage("chat.load_context"), open("cache/past_game_summary.json", "r") as f:
                     past_game_summary = json.load(f)
 
-                previous_context_summary = past_game_summary.get(index_number, None)
+                previous_context_summary = past_game_summary.get(str(index_number), None)
                 previous_context_summary_prompt = f"""
                 Here is the summary of whatever has happened so far and so consider this as the context as reference and also by analyzing the video answer the provided  query :
 
@@ -166,11 +229,14 @@ class BaseballAnalysisService():
                 """
                 system_prompt = SYSTEM_PROMPT + "\n"
                 system_prompt += previous_context_summary_prompt
-                file_upload = self.client.files.upload(path=video)
+                with stage("video.preprocess", enabled=bool(self.preprocessor)):
+                    upload_path = self.preprocessor.prepare(video) if self.preprocessor else video
+                file_upload = self.client.files.upload(path=upload_path)
                 print("processing")
-                while file_upload.state == "PROCESSING":
-                    time.sleep(10)
-                    file_upload = self.client.files.get(name=file_upload.name)
+                with stage("gemini.processing_wait"):
+                    while file_upload.state == "PROCESSING":
+                        time.sleep(10)
+                        file_upload = self.client.files.get(name=file_upload.name)
 
                 if file_upload.state == "FAILED":
                     print("  File upload failed.")
@@ -201,14 +267,14 @@ class BaseballAnalysisService():
                 return None
 
         # Agent Definitions
-        self.query_optimization_agent = Agent(
+        target.query_optimization_agent = Agent(
             role="Query Optimization and Analysis Expert",
             goal="Optimize user queries for the best response and determine if they are real-time or historical, extracting any time references.",
             backstory="A highly skilled expert in both understanding and optimizing user queries. This agent is adept at discerning the nature of a user's information request (real-time vs. historical) and identifying time-related components within the query. Furthermore, they utilize their optimization expertise to rephrase queries in a manner that maximizes the quality of the response.",
             llm=self.llm
         )
 
-        self.realtime_analysis_agent = Agent(
+        target.realtime_analysis_agent = Agent(
             role="Real-Time Analyst",
             goal="You are an Expert at answering the user query against a given video by making use of 'analyze_video' tool.",
             backstory="An expert at providing answer to a given user query against a real-time video feeds.",
@@ -216,30 +282,30 @@ class BaseballAnalysisService():
             llm=self.llm
         )
 
-        self.query_optimizer_agent = Agent(
+        target.query_optimizer_agent = Agent(
             role="Baseball Query and Metadatafilter",
             goal="You are an expert at converting the user query to a query that can fetch better chunks from vector database and also at extracting metadata from the given query",
             backstory="An expert at optimizing query and extracting meta data from the query",
             llm=self.llm
         )
 
-        self.retrieval_agent = Agent(
+        target.retrieval_agent = Agent(
             role="Baseball RAG Analyst",
             goal="Provide answers to user questions by retrieving information from vector db transcripts using RAG.",
             backstory="An expert at using retrieval augmented generation to analyze baseball game transcripts.",
             llm=self.llm
         )
 
-        self.mlb_information_agent = Agent(
+        target.mlb_information_agent = Agent(
             role="MLB Information Gatherer",
             goal="Gather all possible information related to the user's MLB query from various sources, including web searches and website content. Provide a comprehensive collection of relevant data.",
             backstory="""An expert MLB researcher specializing in gathering detailed and comprehensive information on any topic related to Major League Baseball. This agent excels at scouring the internet, identifying valuable sources, and extracting key details from websites and documents. Their primary focus is on information retrieval, ensuring all relevant data is captured, rather than analysis or interpretation.""",
-            tools=[search_tool, scrape_web],
+            tools=vertex_connections.web_tools(),
             llm=self.llm
         )
 
-    def init_tasks(self):
-        """Initializes and configures the tasks for the agents."""
+    def init_tasks(self, target):
+        """Initializes and configures the tasks for the agents created by init_agents(target) as attributes of target."""
 
         class VectorDBSearchTool(BaseTool):
             name: str = "search_vector_db"
@@ -247,59 +313,16 @@ class BaseballAnalysisService():
 
             def _run(self, query: str, filters: dict) -> str:
                 """Runs the VectorDB search and returns results."""
-                print("\nFetching content from LlamaIndex with retriever...")
-                print(f"Filters: {filters}")
-                print(f"Query: {query}")
                 try:
-                    if filters:
-                        if filters["key"] == 'time':
-                            v = float(filters['value'])
-                            print(v)
-                            operator_str = filters["operator"]
-                            if operator_str == "LT":
-                                op = FilterOperator.LT
-                            elif operator_str == "GT":
-                                op = FilterOperator.GT
-                            elif operator_str == "EQ":
-                                op = FilterOperator.EQ
-                            elif operator_str == "NE":
-                                op = FilterOperator.NE
-                            elif operator_str == "LE":
-                                op = FilterOperator.LE
-                            elif operator_str == "GE":
-                                op = FilterOperator.GE
-                            else:
-                                print("Enter a valid operator")
-                                return "Invalid operator"
-
-                            metadata_filters = MetadataFilters(filters=[MetadataFilter(key=filters["key"], value=v, operator=op)])
-                        else:
-                            v = str(filters['value'])
-                            print(filters["key"])
-                            print(v)
-                            metadata_filters = MetadataFilters(filters=[MetadataFilter(key=filters["key"], value=v)])
-                    else:
-                        metadata_filters = []
-
-                    retriever = index.as_retriever(filters=metadata_filters, similarity_top_k=10)
-                    response = retriever.retrieve(query)
-                    results = []
-
-                    for row in response:
-                        chunk_data = {"id": str(uuid.uuid4()), "text": row.get_text(), "score": row.get_score(), "metadata": row.metadata}
-                        print(f"  Text: {row.get_text()}")
-                        print(f"  Score: {row.get_score():.3f}")
-                        print(f"  Metadata: {row.metadata}")
-                        results.append(chunk_data)
-
-                    print(f"  Retrieved {len(results)} chunks.")
-
-                    return json.dumps(results)  # Return results as a JSON string
+                    return json.dumps(search_vector_db(query, filters))  # Return results as a JSON string
+                except ValueError as e:
+                    print(e)
+                    return "Invalid operator"
                 except Exception as e:
                     print(f"Error during VectorDB search: {e}")
                     return str({"error": f"Error during VectorDB search: {e}"})
 
-        self.query_analysis_task = Task(
+        target.query_analysis_task = Task(
             description=dedent(
                 """
             You are an expert sports query analyzer and optimizer. Your task is to analyze a user's query about a sports game and generate two outputs: a JSON object describing the temporal aspect of the query and an optimized version of the query.
@@ -504,11 +527,11 @@ class BaseballAnalysisService():
         """
             ),
             expected_output='A JSON object string containing the analysis of the sports game query with keys "type" and "time_reference", and an optimized query string, Example: {{"type": "realtime"|"historical"|"search", "time_reference": "optional time string"|null, "optimized_query": "An optimized query string..."}}',
-            agent=self.query_optimization_agent,
+            agent=target.query_optimization_agent,
             output_json=QueryAnalysis,
         )
 
-        self.realtime_video_analysis_task = Task(
+        target.realtime_video_analysis_task = Task(
             description=dedent("""
             You are provided with a real-time video feed {video} and a single question {question} related to its content.
             Your goal is to use the 'analyze_video' tool to process the video stream and
@@ -525,11 +548,11 @@ class BaseballAnalysisService():
                 "response": "<answer from video analysis include only the answer to the user query it should just be a string do not add any extra field and include only the answer>"
             }}
             """),
-            agent=self.realtime_analysis_agent,
+            agent=target.realtime_analysis_agent,
             output_json=GeminiVisionOutput,
         )
 
-        self.vector_search_filter_task = Task(
+        target.vector_search_filter_task = Task(
             description=dedent("""
                 **Task:** Generate Filters for Vector Search
 
@@ -598,11 +621,11 @@ class BaseballAnalysisService():
                     User Query: "Show me all the out", Current time: "50 seconds", Output: {{"key":"out", "value": "1", "operator": ""}}
 
             """),
-            agent=self.query_optimizer_agent,
+            agent=target.query_optimizer_agent,
             output_json=VectorSearchFilter
         )
 
-        self.query_modification_task = Task(
+        target.query_modification_task = Task(
             description=dedent("""
                 **Task:** Modify Queries for Vector Search
 
@@ -668,11 +691,11 @@ class BaseballAnalysisService():
                     User Query: "provide me homerrun that happened x time back", Output: {{"modified_query":"homerun"}}
                     User Query: "provide me all major events happen", Output: {{"modified_query":""}}
             """),
-            agent=self.query_optimizer_agent,
+            agent=target.query_optimizer_agent,
             output_json=ModifiedQuery,
         )
 
-        self.vector_search_task = Task(
+        target.vector_search_task = Task(
             description=dedent("""
                 **Task:** Retrieve, Filter, and Sort Chunks from the Vector Database Based on "Latest" Queries
 
@@ -708,11 +731,11 @@ class BaseballAnalysisService():
             expected_output=dedent("""
                 **Output:** A list of chunks that have been filtered according to the filter expression and the time-based constraints of the user query, further filtered based on query or context, and then sorted by relevance to the query and then recency or by recency if user asks for events based on latest. The output should be a list of raw chunks as found in the database (no summarization)
             """),
-            agent=self.retrieval_agent,
+            agent=target.retrieval_agent,
             tools=[VectorDBSearchTool()],
         )
 
-        self.mlb_information_gathering_task = Task(
+        target.mlb_information_gathering_task = Task(
             description=dedent("""
                 You are provided with a user query: {query}.
                 Your goal is to use the 'search_tool' to find relevant URLs and then use the 'scrape_web' tool to gather information which can help answer the user query {query}. As soon as you know the answer just return it and dont go for further use of search and scrape web tool.
@@ -722,11 +745,11 @@ class BaseballAnalysisService():
             expected_output=dedent("""
                 The output should answer the user query {query} and should also include citation. It should be a json with answer and citations.
                 """),
-            agent=self.mlb_information_agent,
+            agent=target.mlb_information_agent,
             output_json=SearchOutput,
         )
 
-        self.answer_generation_task = Task(
+        target.answer_generation_task = Task(
             description=dedent("""
                 You are provided with a user query: {query} and a list of relevant text chunks.
                 The current time is: {current_time}
@@ -742,11 +765,54 @@ class BaseballAnalysisService():
             expected_output=dedent("""
                 A JSON formatted string containing the answer to the user's query {query} based on the provided chunks. The output will contain keys: "answer", "query" and "citations", where citations is an array of filenames. If the information is not available, then respond with an appropriate message in the "answer" key. Only use those information from the chunks which is required to answer the {query} dont add additional unwanted information from the chunk. See to it that the answer as logical flow and use the time metadata to make the answer better.
                 """),
-            agent=self.retrieval_agent,
-            context=[self.vector_search_task],
+            agent=target.retrieval_agent,
+            context=[target.vector_search_task],
             output_json=HistoricalOutput,
         )
 
+    def build_crews(self):
+        """
+        Builds one bundle of agents, tasks and a crew per route. Bundles are handed out by the crew pool to
+        one request at a time, so task outputs and interpolated inputs are never shared between requests.
+        """
+        bundle = SimpleNamespace()
+        self.init_agents(bundle)
+        self.init_tasks(bundle)
+        routes = {
+            "classify": ([bundle.query_optimization_agent], [bundle.query_analysis_task]),
+            "realtime": ([bundle.realtime_analysis_agent], [bundle.realtime_video_analysis_task]),
+            "historical_query": ([bundle.query_optimizer_agent], [bundle.query_modification_task, bundle.vector_search_filter_task]),
+            "historical_answer": ([bundle.retrieval_agent], [bundle.vector_search_task, bundle.answer_generation_task]),
+            "search": ([bundle.mlb_information_agent], [bundle.mlb_information_gathering_task]),
+        }
+        # Prompts of the historical tasks before kickoff() interpolates inputs into them, for the fast path
+        bundle.prompt_templates = {
+            name: (task.description, task.expected_output)
+            for name, task in (("query_modification", bundle.query_modification_task),
+                               ("vector_search_filter", bundle.vector_search_filter_task),
+                               ("answer_generation", bundle.answer_generation_task))
+        }
+        bundle.crews = {route: Crew(agents=agents, tasks=tasks, verbose=True, process=Process.sequential)
+                        for route, (agents, tasks) in routes.items()}
+        return bundle
+
+    def cache_windows(self, video, current_time):
+        """
+        Returns the answer cache window of a question for each query type: real-time answers depend on the
+        clip being watched, historical ones on the current time (to the segment) and search ones on neither.
+        """
+        try:
+            seconds = float(current_time)
+        except (TypeError, ValueError):
+            seconds = 0.0
+        segment_name = os.path.basename(str(video))
+        bucket = max(self.clip_seconds, 1.0)
+        return {
+            "realtime": f"{segment_name}@{int(seconds // bucket)}",
+            "historical": f"t{int(seconds // 30)}",
+            "search": "any",
+        }
+
     def run(self, query, video, current_time):
         """
         Executes the baseball analysis workflow based on the user query type.
@@ -763,30 +829,119 @@ class BaseballAnalysisService():
         print(f"  User Query: {query}")
         print(f"  Current Time: {current_time}")
 
+        cache_windows = self.cache_windows(video, current_time)
+        cache_generation = self.answer_cache.generation(self.game_id) if self.answer_cache else None
+        if self.answer_cache:
+            cached_result = self.answer_cache.lookup_raw(self.game_id, cache_windows, query)
+            if cached_result:
+                print("  Answered from cache (same question).")
+                return json.dumps(cached_result)
+
+        def remember(query_type, optimized_query, final_result):
+            """Caches a successful answer; error results and empty answers are never cached."""
+            if self.answer_cache and final_result.get("result"):
+                self.answer_cache.store(self.game_id, cache_windows[query_type], query_type, query, optimized_query,
+                                        final_result, generation=cache_generation)
+
+        try:
+            with self.crew_pool.acquire() as bundle:
+                return self._run_routes(bundle, query, video, current_time, cache_windows, remember)
+        except Exception as e:
+            print(f"  An unexpected error occurred: {e}")
+            return str({"error": f"An unexpected error occurred: {e}"})
+
+    def _historical_fast_path(self, bundle, optimized_query, current_time):
+        """
+        Answers a historical question without the agent chains: one structured-output call produces the modified
+        query and the filter together, retrieval and the time post-filtering run in code, and one more
+        structured-output call writes the answer from the retrieved chunks.
+
+        Returns:
+            dict: The answer shaped like HistoricalOutput.
+        """
+        templates = bundle.prompt_templates
+        inputs = {"query": optimized_query, "current_time": current_time}
+        plan_prompt = "\n\n".join([
+            "Produce both results below for the same user query as one JSON object with keys \"modified_query\" and \"filter\". "
+            "When no filter applies, return a filter with an empty key.",
+            "## Modified query\n" + "\n".join(templates["query_modification"]).format(**inputs),
+            "## Filter\n" + "\n".join(templates["vector_search_filter"]).format(**inputs),
+        ])
+        response = self.client.models.generate_content(
+            model=MODEL_ID,
+            contents=plan_prompt,
+            config=types.GenerateContentConfig(response_mime_type="application/json", response_schema=HistoricalSearchPlan),
+        )
+        plan = getattr(response, "parsed", None) or HistoricalSearchPlan.model_validate_json(response.text)
+        search_filter = plan.filter.model_dump() if plan.filter.key else {}
+        print(f"  Fast path plan: query={plan.modified_query!r} filter={search_filter}")
+
+        # Time references parsed from the question are exact; they replace the model's time filter
+        filters = query_filters(optimized_query, current_time)
+        exact_time = any(item["key"] == "time" and item["operator"] != "LE" for item in filters)
+        if search_filter and not (exact_time and search_filter["key"] == "time"):
+            filters.append(search_filter)
+        chunks = search_vector_db(plan.modified_query, filters)
+        if not chunks and filters:
+            chunks = search_vector_db(plan.modified_query, search_filter)  # e.g. chunks ingested without inning metadata
+        chunks = post_filter_chunks(chunks, optimized_query, current_time)
+        answer_prompt = "\n".join(templates["answer_generation"]).format(**inputs) + "\n\nText chunks:\n" + json.dumps(chunks)
+        response = self.client.models.generate_content(
+            model=MODEL_ID,
+            contents=answer_prompt,
+            config=types.GenerateContentConfig(response_mime_type="application/json", response_schema=HistoricalOutput),
+        )
+        answer = getattr(response, "parsed", None) or HistoricalOutput.model_validate_json(response.text)
+        return answer.model_dump()
+
+    @staticmethod
+    def _kickoff(bundle, name, inputs):
+        """Runs one of the bundle's crews as a telemetry stage that records the crew's token usage."""
+        with stage(f"crew.{name}"):
+            output = bundle.crews[name].kickoff(inputs=inputs)
+            record_usage(getattr(output, "token_usage", None))
+            return output
+
+    def _run_routes(self, bundle, query, video, current_time, cache_windows, remember):
+        """Classifies the query and runs the matching route on a crew bundle held exclusively by this request."""
         try:
             # Initial setup with combined query agent
             data_dict = {"query": query}
-            crew = Crew(
-                agents=[self.query_optimization_agent],
-                tasks=[self.query_analysis_task],
-                verbose=True,
-                process=Process.sequential,
-            )
-            query_analysis_result = crew.kickoff(inputs=data_dict)
+            with stage("chat.route") as span:
+                query_analysis_result = self.router.route(query) if self.router else None  # Skips the classifier round trip when confident
+                if self.router:
+                    record_cache("router", hits=int(query_analysis_result is not None), misses=int(query_analysis_result is None))
+                if query_analysis_result is None:
+                    query_analysis_result = self._kickoff(bundle, "classify", data_dict).to_dict()
+                    if self.router:
+                        self.router.learn(query, query_analysis_result['type'])
+                # Both paths strip filler the same way, so cache keys and downstream prompts do not depend on the path
+                query_analysis_result['optimized_query'] = clean_question(query_analysis_result.get('optimized_query') or query)
+                span.set_attribute("chat.query_type", str(query_analysis_result['type']))
 
             print(f"  Query Analysis Result: {query_analysis_result}")
 
+            if self.answer_cache:
+                query_type = query_analysis_result['type'] if query_analysis_result['type'] in cache_windows else "search"
+                cached_result = self.answer_cache.lookup(self.game_id, cache_windows[query_type], query_type,
+                                                         query_analysis_result['optimized_query'])
+                if cached_result:
+                    print("  Answered from cache (same optimized query).")
+                    return json.dumps(cached_result)
+
             # Check the type of query and proceed accordingly
             if query_analysis_result['type'] == "realtime":
                 try:
                     print("\n  Processing as a Real-Time Query...")
                     # Real-time video analysis
+                    if self.clip_cutter:
+                        with stage("video.clip"):
+                            video = self.clip_cutter.clip_for_query(video, current_time, self.clip_seconds)  # Analyze only "what just happened"
                     data_dict = {"question": query_analysis_result['optimized_query'], "video": video}
-                    crew.tasks = [self.realtime_video_analysis_task]
-                    crew.agents = [self.realtime_analysis_agent]
-                    realtime_result = crew.kickoff(inputs=data_dict).json_dict
+                    realtime_result = self._kickoff(bundle, "realtime", data_dict).json_dict
                     final_result = {"result": realtime_result, "type": "realtime"}
                     print(f"  Real-Time Analysis Result: {final_result}")
+                    remember("realtime", query_analysis_result['optimized_query'], final_result)
                     return json.dumps(final_result)
                 except Exception as e:
                     print(f"  Error during real-time processing: {e}")
@@ -795,24 +950,34 @@ class BaseballAnalysisService():
             elif query_analysis_result['type'] == "historical":
                 try:
                     print("\n  Processing as a Historical Query...")
+                    historical_result = None
+                    if self.historical_fast_path:
+                        try:
+                            with stage("chat.historical_fast_path"):
+                                historical_result = self._historical_fast_path(bundle, query_analysis_result['optimized_query'], current_time)
+                        except Exception as e:
+                            print(f"  Historical fast path failed, falling back to the crews: {e}")
+                    if historical_result is not None:
+                        final_result = {"result": historical_result, "type": "historical"}
+                        print(f"  Historical Analysis Result (fast path): {final_result}")
+                        remember("historical", query_analysis_result['optimized_query'], final_result)
+                        return json.dumps(final_result)
+
                     # Historical data retrieval and RAG
                     data_dict = {"query": query_analysis_result['optimized_query'], "current_time": current_time}
-                    crew.tasks = [self.query_modification_task, self.vector_search_filter_task]
-                    crew.agents = [self.query_optimizer_agent]
-                    filter_and_modified_query_results = crew.kickoff(inputs=data_dict)
+                    filter_and_modified_query_results = self._kickoff(bundle, "historical_query", data_dict)
 
-                    modified_query = self.query_modification_task.output.json_dict["modified_query"]
-                    filter_key = self.vector_search_filter_task.output.json_dict["key"]
-                    filter_value = self.vector_search_filter_task.output.json_dict["value"]
-                    filter_operator = self.vector_search_filter_task.output.json_dict["operator"]
+                    modified_query = bundle.query_modification_task.output.json_dict["modified_query"]
+                    filter_key = bundle.vector_search_filter_task.output.json_dict["key"]
+                    filter_value = bundle.vector_search_filter_task.output.json_dict["value"]
+                    filter_operator = bundle.vector_search_filter_task.output.json_dict["operator"]
 
                     data_dict = {"vector_query": modified_query, "filter": str({"key": filter_key, "value": filter_value, "operator": filter_operator}),
                                  "query": query_analysis_result['optimized_query'], "current_time": current_time}
-                    crew.tasks = [self.vector_search_task, self.answer_generation_task]
-                    crew.agents = [self.retrieval_agent]
-                    historical_result = crew.kickoff(inputs=data_dict).json_dict
+                    historical_result = self._kickoff(bundle, "historical_answer", data_dict).json_dict
                     final_result = {"result": historical_result, "type": "historical"}
                     print(f"  Historical Analysis Result: {final_result}")
+                    remember("historical", query_analysis_result['optimized_query'], final_result)
                     return json.dumps(final_result)
                 except Exception as e:
                     print(f"  Error during historical processing: {e}")
@@ -823,11 +988,10 @@ class BaseballAnalysisService():
                     print("\n  Processing as a Search Query...")
                     # General information gathering
                     data_dict = {"query": query_analysis_result['optimized_query']}
-                    crew.tasks = [self.mlb_information_gathering_task]
-                    crew.agents = [self.mlb_information_agent]
-                    search_result = crew.kickoff(inputs=data_dict).json_dict
+                    search_result = self._kickoff(bundle, "search", data_dict).json_dict
                     final_result = {"result": search_result, "type": "search"}
                     print(f"  Search Query Result: {final_result}")
+                    remember("search", query_analysis_result['optimized_query'], final_result)
                     return json.dumps(final_result)
                 except Exception as e:
                     print(f"  Error during search processing: {e}")
@@ -0,0 +1,74 @@
+"""
+Benchmark for batched, concurrent embedding during ingestion (vector_backends.embed_in_batches).
+
+Runs against a simulated embedding model with a fixed per-call latency, a per-text cost and random
+batch failures, so it needs no credentials: one call per record (the previous ingestion loop) is
+compared with batched calls at several batch sizes and concurrency levels. Failed batches are
+retried and every record must come back embedded.
+
+Usage (from backend_python/):
+    python benchmarks/bench_ingest.py
+    python benchmarks/bench_ingest.py --records 600 --call-latency 0.15 --failure-rate 0.1
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_embeddings import HashingEmbedder
+from vector_backends import embed_in_batches
+
+
+class FakeEmbedding:
+    """Embeds locally with a HashingEmbedder but sleeps like a remote embedding API and fails at random."""
+    def __init__(self, call_latency, text_latency, failure_rate, seed=0):
+        self.embedder = HashingEmbedder(dim=768)
+        self.call_latency = call_latency
+        self.text_latency = text_latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_text_embedding_batch(self, texts):
+        with self._lock:
+            self.calls += 1
+            fail = self.random.random() < self.failure_rate
+        time.sleep(self.call_latency + self.text_latency * len(texts))
+        if fail:
+            raise RuntimeError("simulated 503")
+        return [self.embedder.embed(text).tolist() for text in texts]
+
+
+def run(texts, args, batch_size, workers):
+    model = FakeEmbedding(args.call_latency, args.text_latency, args.failure_rate, args.seed)
+    start = time.perf_counter()
+    embeddings = embed_in_batches(model, texts, batch_size=batch_size, max_workers=workers, max_retries=args.retries, retry_wait=0.0)
+    elapsed = time.perf_counter() - start
+    missing = sum(embedding is None for embedding in embeddings)
+    print(f"batch={batch_size:<4} workers={workers:<3} {elapsed:7.2f}s  {len(texts) / elapsed:8.1f} records/s  "
+          f"calls={model.calls:<5} missing={missing}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=300, help="Number of simulated segment records")
+    parser.add_argument("--call-latency", type=float, default=0.1, help="Seconds per embedding call")
+    parser.add_argument("--text-latency", type=float, default=0.002, help="Additional seconds per text in a call")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="Probability that a call fails")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = [f"Segment {i}: pitch, swing and a miss, runner holds at first. time: {(i + 1) * 30}t" for i in range(args.records)]
+    run(texts, args, batch_size=1, workers=1)  # One call per record, as before
+    for batch_size, workers in ((32, 1), (32, 4), (64, 8)):
+        run(texts, args, batch_size, workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark for the optional segment preprocessing stage (video_preprocessor.SegmentTranscoder).
+
+Compares the original segments in segments/ against their transcoded versions:
+bytes that would be uploaded, transcode time (cold and cached) and, with --upload,
+end-to-end VideoAnalyzer latency (upload + processing + generation) for both.
+
+Usage (from backend_python/):
+    python benchmarks/bench_segment_preprocessing.py --limit 10
+    python benchmarks/bench_segment_preprocessing.py --limit 5 --upload   # needs GOOGLE_API_KEY
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_utils import segment_sort_key
+from video_preprocessor import SegmentTranscoder, TRANSCODE_PROFILES
+
+
+def list_segments(segment_dir, limit):
+    names = sorted((name for name in os.listdir(segment_dir) if name.endswith(".mp4")),
+                   key=segment_sort_key)
+    return [os.path.join(segment_dir, name) for name in names[:limit]]
+
+
+def bench_transcode(segments, profile, cache_dir):
+    transcoder = SegmentTranscoder(cache_dir=cache_dir, profile=profile)
+    rows = []
+    for path in segments:
+        start = time.perf_counter()
+        prepared = transcoder.prepare(path)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        transcoder.prepare(path)
+        cached = time.perf_counter() - start
+        rows.append({
+            "segment": os.path.basename(path),
+            "original_bytes": os.path.getsize(path),
+            "upload_bytes": os.path.getsize(prepared),
+            "cold_seconds": cold,
+            "cached_seconds": cached,
+        })
+    return transcoder, rows
+
+
+def bench_upload(segments, transcoder):
+    from dotenv import load_dotenv
+    from video_analyzer import VideoAnalyzer, DETAILED_GAME_ANALYSIS_PROMPT
+
+    load_dotenv()
+    api_key = os.environ["GOOGLE_API_KEY"]
+    model_id = os.environ.get("MODEL_ID", "gemini-2.0-flash-exp")
+    timings = {"original": [], "transcoded": []}
+    for label, analyzer in (("original", VideoAnalyzer(api_key, model_id)),
+                            ("transcoded", VideoAnalyzer(api_key, model_id, preprocessor=transcoder))):
+        for path in segments:
+            start = time.perf_counter()
+            analyzer.analyze_baseball_video(path, DETAILED_GAME_ANALYSIS_PROMPT)
+            timings[label].append(time.perf_counter() - start)
+    return timings
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segment-dir", default="segments")
+    parser.add_argument("--limit", type=int, default=10, help="Number of segments to benchmark")
+    parser.add_argument("--profile", default="model", choices=sorted(TRANSCODE_PROFILES))
+    parser.add_argument("--upload", action="store_true", help="Also measure end-to-end Gemini latency (uses quota)")
+    args = parser.parse_args()
+
+    segments = list_segments(args.segment_dir, args.limit)
+    if not segments:
+        print(f"No segments found in {args.segment_dir}")
+        return
+
+    cache_dir = tempfile.mkdtemp(prefix="transcode-bench-")
+    try:
+        transcoder, rows = bench_transcode(segments, args.profile, cache_dir)
+        print(f"{'segment':<28}{'original':>12}{'upload':>12}{'ratio':>8}{'cold s':>9}{'cached s':>10}")
+        for row in rows:
+            print(f"{row['segment']:<28}{row['original_bytes']:>12}{row['upload_bytes']:>12}"
+                  f"{row['upload_bytes'] / row['original_bytes']:>8.2f}{row['cold_seconds']:>9.2f}{row['cached_seconds']:>10.4f}")
+        original_total = sum(row["original_bytes"] for row in rows)
+        upload_total = sum(row["upload_bytes"] for row in rows)
+        print(f"\nTotal bytes: original={original_total} upload={upload_total} "
+              f"({100.0 * (1 - upload_total / original_total):.1f}% smaller)")
+        print(f"Transcode: mean cold={statistics.mean(row['cold_seconds'] for row in rows):.2f}s "
+              f"mean cached={statistics.mean(row['cached_seconds'] for row in rows):.4f}s")
+
+        if args.upload:
+            timings = bench_upload(segments, transcoder)
+            for label, values in timings.items():
+                print(f"End-to-end {label:<11} p50={percentile(values, 50):.2f}s p95={percentile(values, 95):.2f}s "
+                      f"mean={statistics.mean(values):.2f}s")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
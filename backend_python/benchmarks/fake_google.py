@@ -0,0 +1,303 @@
+"""
+Local stand-in for the Google services the backend calls, for load testing without quota.
+
+It speaks the wire protocols the clients in llm_clients.py use, so the production code paths run unchanged:
+
+- Gemini REST (google-genai and google.generativeai): resumable file uploads, file polling, generateContent.
+- Vertex AI text embeddings (:predict), served by FakeServiceEmbedding with deterministic hashing vectors.
+- OpenAI-compatible chat completions for the CrewAI agents (through LiteLLM).
+
+Every call sleeps for a latency drawn from a configurable distribution, uploaded files stay PROCESSING for a
+while, and calls are rejected with 429 RESOURCE_EXHAUSTED at random or when a requests-per-minute quota is
+exceeded. Responses are canned: structured-output requests get an instance of the requested schema, filled
+with plausible baseball values. The query classifier's answer is derived from the question with the
+QueryRouter rules, so mixed question sets exercise the realtime, historical and search routes.
+
+Each call draws its latency and 429 decision from a generator seeded with (seed, kind, call number), so the
+n-th call of a kind always gets the same draw. Under concurrency, which request is the n-th still depends
+on arrival order, so per-request timings are not reproducible across runs.
+
+Latency specs: "fixed:S", "uniform:LOW,HIGH", "normal:MEAN,STD" or "lognormal:MEDIAN,SIGMA" (seconds).
+
+Usage (from backend_python/):
+    python benchmarks/fake_google.py --port 8089 --generate-latency lognormal:1.5,0.4 --error-rate 0.02
+    FAKE_GOOGLE_URL=http://localhost:8089 VECTOR_BACKEND=local python backend_server.py
+    python benchmarks/load_test.py --fake-url http://localhost:8089
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+from flask import Flask, Response, jsonify, request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_router import QueryRouter
+from text_embeddings import HashingEmbedder
+
+CANNED_TEXT = ("The pitcher works ahead 0-2 with a sinker on the outer edge, then gets the batter to chase a slider in the "
+               "dirt for the strikeout. The defense shifts toward the pull side and the runner holds at first.")
+CANNED_VALUES = {  # Field name -> canned value for the structured outputs the backend requests
+    "play_by_play": CANNED_TEXT,
+    "major_events": "3-8: Strikeout swinging; 21-27: Single to left field",
+    "is_major": "1",
+    "homerun": "0",
+    "out": "1",
+    "strategies": "Infield shift to the pull side; Pitching backwards to a fastball hitter",
+    "type": "realtime",
+    "time_reference": "None",
+    "optimized_query": "strikeout with runner on first",
+    "modified_query": "strikeout with runner on first",
+    "key": "",
+    "operator": "EQ",
+    "answer": CANNED_TEXT,
+    "citations": "https://www.mlb.com/gameday",
+}
+QUESTION_PATTERN = re.compile(r"Actual Input:\**\s*Query:\s*(.+)")  # The user's question in the classifier prompt
+FORMAT_PATTERN = re.compile(r"(?:following format|follow this schema)\s*:?\s*(\{.*?\n\})", re.DOTALL)
+FIELD_PATTERN = re.compile(r'"(\w+)"\s*:\s*([\w\[\]., ]+)')
+
+
+class Latency:
+    """A latency distribution parsed from a spec such as "lognormal:1.5,0.4"."""
+    def __init__(self, spec):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise argparse.ArgumentTypeError(f"Unknown latency distribution: {spec}")
+
+    def sample(self, rng):
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(*self.params))
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma)
+
+
+class Simulator:
+    """Draws latencies and decides which calls are rate limited; counts calls per kind."""
+    def __init__(self, args):
+        self.args = args
+        self.latencies = {"generate": args.generate_latency, "chat": args.chat_latency, "embed": args.embed_latency,
+                          "upload": args.upload_latency, "files": Latency("fixed:0.02")}
+        self.recent = deque()  # Admission times within the last minute, for the RPM quota
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def admit(self, kind):
+        """Returns the seconds to sleep before answering, or None if the call is rejected with 429."""
+        with self._lock:
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            stats = self.counts.setdefault(kind, {"calls": 0, "rate_limited": 0})
+            stats["calls"] += 1
+            rng = random.Random(f"{self.args.seed}:{kind}:{stats['calls']}")  # Independent of other threads' draws
+            if kind != "files" and ((self.args.rpm and len(self.recent) >= self.args.rpm) or rng.random() < self.args.error_rate):
+                stats["rate_limited"] += 1
+                return None
+            if kind != "files":
+                self.recent.append(now)
+            return self.latencies[kind].sample(rng)
+
+
+def schema_instance(schema, name=""):
+    """Returns an instance of a JSON schema (OpenAPI or Gemini Schema casing) filled with canned values."""
+    options = schema.get("anyOf") or schema.get("any_of")
+    if options:
+        schema = next((option for option in options if str(option.get("type", "")).lower() != "null"), options[0])
+    kind = str(schema.get("type", "object" if "properties" in schema else "string")).lower()
+    if kind == "object":
+        return {key: schema_instance(value, key) for key, value in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [schema_instance(schema.get("items", {}), name)]
+    if schema.get("enum"):
+        return schema["enum"][0]
+    return typed_value(kind, name)
+
+
+def typed_value(kind, name):
+    """Returns the canned value of a field of the given type ("string", "integer", "str", "int", ...)."""
+    if kind in ("integer", "int"):
+        return 0
+    if kind in ("number", "float"):
+        return 0.0
+    if kind in ("boolean", "bool"):
+        return False
+    if kind.startswith("list"):
+        return [CANNED_VALUES.get(name, f"Simulated {name.replace('_', ' ')}")]
+    if kind.startswith("dict"):
+        return {}
+    return CANNED_VALUES.get(name, f"Simulated {name.replace('_', ' ')}.")
+
+
+def prompt_format_instance(text):
+    """
+    Returns an instance of the output format a CrewAI prompt asks for, or None. CrewAI describes pydantic outputs
+    either as a JSON schema or as '"field": type' lines.
+    """
+    match = FORMAT_PATTERN.search(text)
+    if not match:
+        return None
+    try:
+        schema = json.loads(match.group(1))
+        if isinstance(schema, dict) and "properties" in schema:
+            return schema_instance(schema)
+    except ValueError:
+        pass
+    return {name: typed_value(kind.strip().lower(), name) for name, kind in FIELD_PATTERN.findall(match.group(1))}
+
+
+def token_count(text):
+    return max(1, len(text) // 4)
+
+
+def create_app(args):
+    app = Flask(__name__)
+    simulator = Simulator(args)
+    embedder = HashingEmbedder(dim=768)
+    router = QueryRouter(log_path=None, min_confidence=0.0, min_knn_evidence=0.0)  # Rules and seed examples only; always answers
+    files = {}  # File id -> {"file": file json, "ready_at": monotonic time}
+    files_lock = threading.Lock()
+
+    def rate_limited():
+        time.sleep(0.02)
+        return jsonify({"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                                  "status": "RESOURCE_EXHAUSTED"}}), 429
+
+    def simulate(kind):
+        delay = simulator.admit(kind)
+        if delay is None:
+            return False
+        time.sleep(delay)
+        return True
+
+    @app.route("/upload/v1beta/files", methods=["POST"])
+    def upload():
+        upload_id = request.args.get("upload_id")
+        if upload_id is None:  # Start of a resumable upload
+            if not simulate("files"):
+                return rate_limited()
+            upload_id = uuid.uuid4().hex
+            metadata = (request.get_json(silent=True) or {}).get("file", {})
+            with files_lock:
+                files[upload_id] = {"file": {"name": f"files/{upload_id}", "displayName": metadata.get("displayName", upload_id),
+                                             "mimeType": request.headers.get("X-Goog-Upload-Header-Content-Type", "video/mp4"),
+                                             "sizeBytes": request.headers.get("X-Goog-Upload-Header-Content-Length", "0"),
+                                             "uri": f"{request.host_url}v1beta/files/{upload_id}", "state": "PROCESSING"},
+                                    "received": 0, "ready_at": None}
+            response = Response("{}", mimetype="application/json")
+            response.headers["X-Goog-Upload-URL"] = f"{request.host_url}upload/v1beta/files?upload_id={upload_id}"
+            response.headers["X-Goog-Upload-Status"] = "active"
+            return response
+        with files_lock:
+            entry = files.get(upload_id)
+        if entry is None:
+            return jsonify({"error": {"code": 404, "message": "Upload not found.", "status": "NOT_FOUND"}}), 404
+        entry["received"] += len(request.get_data())
+        final = "finalize" in request.headers.get("X-Goog-Upload-Command", "")
+        if final:
+            simulate("upload")  # Upload transfer time; the upload itself is never rate limited
+            entry["ready_at"] = time.monotonic() + args.processing_seconds
+        response = Response(json.dumps({"file": entry["file"]}) if final else "{}", mimetype="application/json")
+        response.headers["X-Goog-Upload-Status"] = "final" if final else "active"
+        return response
+
+    @app.route("/v1beta/files/<file_id>", methods=["GET"])
+    def get_file(file_id):
+        if not simulate("files"):
+            return rate_limited()
+        with files_lock:
+            entry = files.get(file_id)
+        if entry is None:
+            return jsonify({"error": {"code": 404, "message": "File not found.", "status": "NOT_FOUND"}}), 404
+        ready = entry["ready_at"] is not None and time.monotonic() >= entry["ready_at"]
+        return jsonify(dict(entry["file"], state="ACTIVE" if ready else "PROCESSING"))
+
+    @app.route("/v1beta/models/<path:target>", methods=["POST"])
+    def generate_content(target):
+        if not target.endswith(":generateContent"):
+            return jsonify({"error": {"code": 404, "message": f"Unsupported method {target}.", "status": "NOT_FOUND"}}), 404
+        if not simulate("generate"):
+            return rate_limited()
+        body = request.get_json(silent=True) or {}
+        config = body.get("generationConfig") or body.get("generation_config") or {}
+        schema = config.get("responseSchema") or config.get("response_schema")
+        text = json.dumps(schema_instance(schema)) if schema else CANNED_TEXT
+        prompt = json.dumps(body.get("contents", ""))
+        return jsonify({"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+                        "usageMetadata": {"promptTokenCount": token_count(prompt), "candidatesTokenCount": token_count(text),
+                                          "totalTokenCount": token_count(prompt) + token_count(text)},
+                        "modelVersion": target.split(":")[0]})
+
+    @app.route("/v1/chat/completions", methods=["POST"])
+    def chat_completions():
+        if not simulate("chat"):
+            return jsonify({"error": {"message": "Rate limit reached.", "type": "rate_limit_error", "code": 429}}), 429
+        body = request.get_json(silent=True) or {}
+        messages = body.get("messages", [])
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        structured = prompt_format_instance(prompt)
+        question = QUESTION_PATTERN.search(prompt)
+        if isinstance(structured, dict) and "type" in structured and question:  # The query classifier
+            routed = router.route(question.group(1).strip())
+            structured.update({key: routed[key] for key in ("type", "time_reference", "optimized_query") if key in structured})
+        answer = json.dumps(structured) if structured is not None else CANNED_TEXT
+        if "Final Answer:" in prompt:  # A CrewAI agent turn: answer directly, without tool calls
+            answer = f"Thought: I now can give a great answer\nFinal Answer: {answer}"
+        return jsonify({"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()),
+                        "model": body.get("model", "fake"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": token_count(prompt), "completion_tokens": token_count(answer),
+                                  "total_tokens": token_count(prompt) + token_count(answer)}})
+
+    @app.route("/v1/projects/<path:target>", methods=["POST"])
+    def predict(target):
+        if not target.endswith(":predict"):
+            return jsonify({"error": {"code": 404, "message": f"Unsupported method {target}.", "status": "NOT_FOUND"}}), 404
+        if not simulate("embed"):
+            return rate_limited()
+        instances = (request.get_json(silent=True) or {}).get("instances", [])
+        return jsonify({"predictions": [{"embeddings": {"values": embedder.embed(instance.get("content", "")).tolist(),
+                                                        "statistics": {"token_count": token_count(instance.get("content", ""))}}}
+                                        for instance in instances]})
+
+    @app.route("/stats", methods=["GET", "DELETE"])
+    def stats():
+        with simulator._lock:
+            if request.method == "DELETE":
+                simulator.counts.clear()
+            return jsonify(simulator.counts)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--generate-latency", type=Latency, default=Latency("lognormal:1.5,0.4"), help="Gemini generateContent latency")
+    parser.add_argument("--chat-latency", type=Latency, default=Latency("lognormal:0.8,0.4"), help="Crew (chat completions) latency")
+    parser.add_argument("--embed-latency", type=Latency, default=Latency("lognormal:0.08,0.3"), help="Embedding call latency")
+    parser.add_argument("--upload-latency", type=Latency, default=Latency("uniform:0.2,0.6"), help="File upload transfer time")
+    parser.add_argument("--processing-seconds", type=float, default=2.0, help="Seconds an uploaded file stays PROCESSING")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability that a call is rejected with 429")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before calls are rejected with 429 (0: unlimited)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    create_app(args).run(host="0.0.0.0", port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
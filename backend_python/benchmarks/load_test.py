@@ -0,0 +1,155 @@
+"""
+Load test for the chat, live insight and batch analysis endpoints.
+
+Drives /analyze, /match-overview and /analyze_rag of a running backend with a fixed number of concurrent
+clients and reports, per endpoint, the latency percentiles (p50/p95/p99), throughput and error counts.
+/analyze_rag is asynchronous: its latency is measured from submission until the job reaches a final state.
+Each job writes to its own directory under <--rag-output-root>/<run id>/ on the server (relative to the
+backend's working directory), so every segment is analyzed. Those analyses are left behind and the highlight
+builder picks them up as a source until the directory is deleted; the script prints it at the end.
+
+Run the backend against the local stand-in (benchmarks/fake_google.py) to load test without quota; the
+stand-in's own call and 429 counts are printed when --fake-url is given.
+
+Usage (from backend_python/):
+    python benchmarks/fake_google.py --port 8089 &
+    FAKE_GOOGLE_URL=http://localhost:8089 VECTOR_BACKEND=local python backend_server.py &
+    python benchmarks/load_test.py --fake-url http://localhost:8089
+    python benchmarks/load_test.py --endpoints analyze --requests 200 --concurrency 16
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+QUERIES = [
+    "What pitch did he just throw?",
+    "Who is batting right now?",
+    "What happened 2 minutes ago?",
+    "Were there any home runs in the 3rd inning?",
+    "What was the last strikeout?",
+    "What is Shohei Ohtani's batting average this season?",
+]
+FINAL_STATES = ("completed", "failed", "cancelled")
+
+
+class Client:
+    """One load-test client; each thread gets its own session so connections are kept alive."""
+    local = threading.local()
+
+    def __init__(self, args):
+        self.args = args
+
+    @property
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def analyze(self, i):
+        payload = {"query": QUERIES[i % len(QUERIES)], "video": self.args.video, "current_time": self.args.current_time}
+        return self.session.post(f"{self.args.server}/analyze", json=payload, timeout=self.args.timeout)
+
+    def match_overview(self, i):
+        return self.session.post(f"{self.args.server}/match-overview", json={"chunk_number": self.args.chunk_number}, timeout=self.args.timeout)
+
+    def analyze_rag(self, i):
+        output_dir = f"{self.args.rag_output_root}/{self.args.run_id}/job_{i:04d}"  # Server-side, fresh per job
+        response = self.session.post(f"{self.args.server}/analyze_rag", timeout=self.args.timeout,
+                                     data={"video_dir": self.args.video_dir, "output_dir": output_dir, "max_workers": self.args.rag_workers})
+        if response.status_code != 202:
+            return response
+        status_url = f"{self.args.server}{response.json()['status_url']}"
+        deadline = time.monotonic() + self.args.timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.args.poll_seconds)
+            response = self.session.get(status_url, timeout=self.args.timeout)
+            if response.status_code != 200 or response.json().get("status") in FINAL_STATES:
+                return response
+        raise TimeoutError(f"Job did not finish within {self.args.timeout}s")
+
+
+def run_endpoint(name, call, args):
+    """Sends args.requests calls with args.concurrency clients; returns latencies and outcome counts."""
+    latencies, outcomes = [], {}
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            response = call(i)
+            outcome = response.status_code
+            if outcome == 200 and name == "analyze_rag":
+                outcome = response.json().get("status")
+            ok = outcome in (200, "completed")
+        except Exception as e:
+            outcome, ok = type(e).__name__, False
+        elapsed = time.perf_counter() - start
+        with lock:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            if ok:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(one, range(args.requests)))
+    return summarize(name, latencies, outcomes, time.perf_counter() - start)
+
+
+def summarize(name, latencies, outcomes, wall):
+    latencies = np.array(latencies)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (float("nan"),) * 3
+    return {"endpoint": name, "requests": sum(outcomes.values()), "ok": len(latencies), "outcomes": {str(k): v for k, v in outcomes.items()},
+            "p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3),
+            "mean": round(float(latencies.mean()), 3) if len(latencies) else None,
+            "throughput": round(len(latencies) / wall, 2), "wall_seconds": round(wall, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", default="http://localhost:7770", help="Backend base URL")
+    parser.add_argument("--endpoints", nargs="+", default=["analyze", "match-overview", "analyze_rag"],
+                        choices=["analyze", "match-overview", "analyze_rag"])
+    parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint (jobs for analyze_rag)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--video", default="baseball_segment_001.mp4", help="Segment /analyze questions refer to")
+    parser.add_argument("--current-time", type=float, default=45.0, help="Viewer time sent with /analyze questions")
+    parser.add_argument("--chunk-number", type=int, default=1, help="Segment /match-overview describes")
+    parser.add_argument("--video-dir", default="segments", help="Segments /analyze_rag jobs analyze (on the server)")
+    parser.add_argument("--rag-output-root", default="cache/load_test", help="Server directory /analyze_rag jobs write under")
+    parser.add_argument("--rag-workers", type=int, default=4)
+    parser.add_argument("--poll-seconds", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--fake-url", help="Local stand-in URL; its call and 429 counts are reported")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    args.run_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+    client = Client(args)
+    calls = {"analyze": client.analyze, "match-overview": client.match_overview, "analyze_rag": client.analyze_rag}
+    if args.fake_url:
+        requests.delete(f"{args.fake_url}/stats")
+    results = []
+    for name in args.endpoints:
+        result = run_endpoint(name, calls[name], args)
+        results.append(result)
+        print(f"{name:<15} ok={result['ok']}/{result['requests']:<5} p50={result['p50']:7.3f}s  p95={result['p95']:7.3f}s  "
+              f"p99={result['p99']:7.3f}s  {result['throughput']:7.2f} req/s  outcomes={result['outcomes']}")
+    if "analyze_rag" in args.endpoints:
+        print(f"analyze_rag outputs left on the server in {args.rag_output_root}/{args.run_id} (delete it after the run)")
+    report = {"concurrency": args.concurrency, "results": results}
+    if args.fake_url:
+        report["upstream"] = requests.get(f"{args.fake_url}/stats").json()
+        print(f"upstream calls: {json.dumps(report['upstream'])}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+
+class CrewPool:
+    """
+    A fixed set of pre-built crew bundles handed out to one request at a time.
+
+    CrewAI tasks keep their last output on the Task object, and kickoff() interpolates inputs into the
+    agents and tasks it runs, so a crew must not be shared by concurrent requests. The pool builds
+    `size` bundles up front (each with its own agents, tasks and one crew per route), grows lazily up to
+    `max_size` under load, and otherwise makes callers wait for a free bundle — so concurrent chat
+    requests run in parallel on isolated state without paying construction cost per request.
+    """
+    def __init__(self, factory, size=1, max_size=None):
+        """
+        Initializes the CrewPool.
+
+        Args:
+            factory (callable): Builds one bundle; called `size` times up front.
+            size (int): Number of bundles built at start-up.
+            max_size (int, optional): Upper bound when growing under load. Defaults to `size`.
+        """
+        self.factory = factory
+        self.max_size = max(size, max_size or size)
+        self._idle = queue.LifoQueue()  # The most recently used bundle is reused first
+        self._created = 0
+        self._lock = threading.Lock()
+        self.waits = 0
+        for _ in range(size):
+            self._idle.put(self._create())
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """
+        Yields a bundle for exclusive use and returns it to the pool afterwards.
+
+        Raises:
+            TimeoutError: If no bundle became free within `timeout` seconds.
+        """
+        bundle = self._take(timeout)
+        try:
+            yield bundle
+        finally:
+            self._idle.put(bundle)
+
+    def stats(self):
+        """Returns the number of bundles built, currently idle, and how often callers had to wait."""
+        return {"created": self._created, "idle": self._idle.qsize(), "max_size": self.max_size, "waits": self.waits}
+
+    def _take(self, timeout):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            grow = self._created < self.max_size
+            if grow:
+                self._created += 1  # Reserve the slot before building outside the lock
+            else:
+                self.waits += 1
+        if grow:
+            try:
+                return self.factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("No crew available")
+
+    def _create(self):
+        bundle = self.factory()
+        with self._lock:
+            self._created += 1
+        return bundle
@@ -1,36 +1,54 @@
 from google.cloud import aiplatform
 import glob
 import os
-import re
 from llama_index.core import (
     StorageContext,
     Settings,
     VectorStoreIndex,
     SimpleDirectoryReader,
 )
-from llama_index.core.schema import TextNode
+from llama_index.core.schema import TextNode, NodeRelationship, RelatedNodeInfo
 from llama_index.core.vector_stores.types import (
     MetadataFilters,
     MetadataFilter,
     FilterOperator,
 )
 from llama_index.llms.vertex import Vertex
-from llama_index.embeddings.vertex import VertexTextEmbedding
 from llama_index.vector_stores.vertexaivectorsearch import VertexAIVectorStore
 import os
-from google.oauth2 import service_account
 import json
+import hashlib
+import itertools
 import logging
+import time
+import uuid
 from dotenv import load_dotenv
 
+from vector_backends import embed_in_batches
+from embedding_cache import CachedEmbedding
+from llm_clients import text_embedding
+from telemetry import stage
+from segment_analysis import parse_segment_analysis
+from media_utils import extract_segment_number, segment_sort_key
+
 # Load environment variables from .env file
 load_dotenv()
 
+SEGMENT_SECONDS = 30  # Length of a video segment; segment N ends at (N + 1) * SEGMENT_SECONDS
+INGEST_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "curveball-nexus/ingest")  # Namespace of the stable node ids
+
+
+def stable_node_id(game_id, segment_key, content_hash):
+    """Returns the node id of a segment's content; the same (game, segment, content) always maps to the same id."""
+    return str(uuid.uuid5(INGEST_NAMESPACE, f"{game_id}/{segment_key}/{content_hash}"))
+
 class DataProcessor:
     """
     A class for processing and ingesting data from text files into a Vertex AI Vector Search index.
     """
-    def __init__(self, directory_path, db_path="first-test", collection_name="Baseball-historical-events", model_name="textembedding-gecko@003"):
+    def __init__(self, directory_path, db_path="first-test", collection_name="Baseball-historical-events", model_name="textembedding-gecko@003", vector_backend=None, inning_at=None,
+                 embed_batch_size=32, embed_workers=4, embed_retries=3, upsert_batch_size=500, game_id="game", ledger_path=None,
+                 embedding_cache=None, connections=None):
         """
         Initializes the DataProcessor.
 
@@ -39,6 +57,22 @@ class DataProcessor:
             db_path (str, optional): Path to the ChromaDB database (not used in this version with Vertex AI). Defaults to "first-test".
             collection_name (str, optional): Name of the collection (not used in this version with Vertex AI). Defaults to "Baseball-historical-events".
             model_name (str, optional): Name of the embedding model. Defaults to "textembedding-gecko@003".
+            vector_backend (LocalVectorBackend, optional): When set, records are embedded with the backend's embedder
+                and stored in the local index instead of Vertex AI Vector Search.
+            inning_at (callable, optional): inning_at(segment_name, seconds) returns the inning shown in a segment;
+                stored as "inning" metadata so questions about an inning can be pre-filtered.
+            embed_batch_size (int, optional): Records per embedding call. Defaults to 32.
+            embed_workers (int, optional): Embedding calls in flight at once. Defaults to 4.
+            embed_retries (int, optional): Retries of a failed embedding batch. Defaults to 3.
+            upsert_batch_size (int, optional): Records read, embedded and upserted per chunk. Defaults to 500.
+            game_id (str, optional): Game the segments belong to; part of the stable node ids. Defaults to "game".
+            ledger_path (str, optional): JSON file recording the node id and content hash ingested for each segment, so
+                re-ingestion only embeds new or changed segments and deletes removed ones. Defaults to
+                cache/ingest_ledger.json.
+            embedding_cache (EmbeddingCache, optional): Persistent embedding cache for the Vertex embedding model, so
+                texts embedded before (e.g. segments re-ingested after a ledger reset) are not sent again.
+            connections (VertexConnectionManager, optional): Shared connections to the index; its vector backend (for
+                the local index) or Vertex AI Vector Store is resolved on the first ingestion, not at construction.
         """
         self.directory_path = directory_path
         self.PROJECT_ID = os.getenv("PROJECT_ID")
@@ -51,9 +85,16 @@ class DataProcessor:
         self.INDEX_ID = os.getenv("INDEX_ID")  # Define as instance variable
         self.ENDPOINT_ID = os.getenv("ENDPOINT_ID")  # Define as instance variable
         self.MODEL_NAME = model_name
-        aiplatform.init(project=self.PROJECT_ID, location=self.REGION) # Initialize Vertex AI SDK
-        self.vs_index = aiplatform.MatchingEngineIndex(index_name=self.INDEX_ID) # Retrieve the index by its name.
-        self.vs_endpoint = aiplatform.MatchingEngineIndexEndpoint(index_endpoint_name= self.ENDPOINT_ID) # Retrieve the endpoint by its name.
+        self.vector_backend = vector_backend
+        self.inning_at = inning_at
+        self.embed_batch_size = embed_batch_size
+        self.embed_workers = embed_workers
+        self.embed_retries = embed_retries
+        self.upsert_batch_size = upsert_batch_size
+        self.game_id = game_id
+        self.ledger_path = ledger_path or os.path.join("cache", "ingest_ledger.json")
+        self.embedding_cache = embedding_cache
+        self.connections = connections
 
         # Set up logging
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -69,37 +110,93 @@ class DataProcessor:
         Returns:
             dict: A dictionary containing the extracted text (play_by_play, major_events, etc.) or None if extraction fails.
         """
-        json_string = json_string.replace("```json", "").replace("```", "").strip() # Remove backticks and whitespace
-
+        data = parse_segment_analysis(json_string) # orjson + schema validation, json_repair for malformed responses
+        if data is None:
+            logging.warning("Segment analysis could not be parsed. No data extracted.")
+        return data
+
+    def inning_at_segment(self, filename):
+        """Returns the inning shown halfway through the segment an analysis file belongs to, or None if unknown."""
+        if not self.inning_at:
+            return None
+        segment_name = os.path.splitext(os.path.basename(filename))[0] + ".mp4"
         try:
-            # Attempt to parse the string as JSON. This is the preferred method.
-            data = json.loads(json_string)
-            return data
-        except json.JSONDecodeError as e:
-            logging.warning(f"JSONDecodeError: {e}. Attempting regex extraction as fallback.")
-
-            # If JSON parsing fails (due to malformed JSON), use regex as a fallback.
-            pattern = r'"play_by_play": "(.*?)".*"major_events": "(.*?)".*"is_major": "(.*?)".*"homerun": "(.*?)".*"out": "(.*?)".*"strategies": "(.*?)"'
-            match = re.search(pattern, json_string, re.DOTALL)
-            if match:
-                return {
-                    "play_by_play": match.group(1).strip(),
-                    "major_events": match.group(2).strip(),
-                    "is_major": match.group(3).strip(),
-                    "homerun": match.group(4).strip(),
-                    "out": match.group(5).strip(),
-                    "strategies": match.group(6).strip(),
-                }
-            else:
-                logging.warning("Regex extraction failed. No data extracted.")
-                return None
+            return self.inning_at(segment_name, 15)
+        except Exception as e:
+            logging.warning(f"Could not determine the inning of {segment_name}: {e}")
+            return None
+
+    def segment_time(self, filename, position):
+        """
+        Returns the game time (seconds) at the end of a segment: segment N covers [N * 30, (N + 1) * 30]. Files
+        without a segment number fall back to their position in the sorted directory listing.
+        """
+        number = extract_segment_number(filename)
+        return ((number if number is not None else position) + 1) * SEGMENT_SECONDS
 
-    def extract_segment_number(self, filename):
-        """Extracts the numerical segment number from the filename for sorting purposes."""
-        match = re.search(r'segment_(\d+)\.txt', filename)
-        if match:
-            return int(match.group(1))
-        return float('inf') # Puts files that don't match at the end
+    def iter_records(self, start_after=None):
+        """
+        Yields one processed record per analysis file in segment order, reading a single file at a time so
+        memory stays bounded however large the directory is.
+
+        Args:
+            start_after (int, optional): Skip segments numbered up to and including this one (to resume).
+
+        Yields:
+            dict: The description to embed and the segment's metadata.
+        """
+        try:
+            # Sort the file names based on the segment number; only the names are held in memory
+            files = sorted((entry.path for entry in os.scandir(self.directory_path) if entry.is_file()), key=segment_sort_key)
+        except FileNotFoundError:
+            logging.error(f"FileNotFoundError: Directory not found: {self.directory_path}")
+            return
+        if not files:
+            logging.warning(f"No files found in directory: {self.directory_path}")
+            return
+
+        for position, filename in enumerate(files):
+            number = extract_segment_number(filename)
+            if start_after is not None and number is not None and number <= start_after:
+                continue
+            logging.info(f"Processing file: {filename}")
+            try:
+                with open(filename, 'r') as f:
+                    processed = self.extract_text_from_json_string(f.read()) #Extracts information from the file
+            except UnicodeDecodeError:
+                logging.error(f"UnicodeDecodeError: Unable to decode file content in {filename}.  Skipping file.")
+                continue
+            except Exception as e:
+                logging.exception(f"An error occurred while processing {filename}: {e}") # Use exception to log the whole stack trace
+                continue
+            if not processed:
+                logging.warning(f"No text to process in file: {filename}")
+                continue
+            try:
+                yield self.build_record(processed, filename, self.segment_time(filename, position))
+            except (KeyError, TypeError) as e:
+                logging.error(f"Missing field {e} in {filename}. Skipping file.")
+
+    def build_record(self, processed, filename, time):
+        """Builds the record of one segment: the description to embed and its metadata."""
+        dt = {} #Store all the information and metadata associated with it for a single segment
+        description_parts = [processed["play_by_play"]] #Start building the description
+        if processed["major_events"]:
+            description_parts.append(f'Major_events: {processed["major_events"]}')  # Add major events if available
+        if processed["strategies"]:
+            description_parts.append(f'Strategies in the game: {processed["strategies"]}') #Add game strategies if available
+        description_parts.append(f'time: {time}t') # Append the time
+        dt["description"] = "\n".join(description_parts) #Join all parts of the description
+
+        dt["time"] = time  #Stores the time at the end of the segment
+        dt["filename"] = filename  #Stores the filename for the data segment
+        dt["is_major"] = processed["is_major"] #Records whether a major event occured in this segment
+        dt["homerun"] = processed["homerun"] #Records whether a home run occured in this segment
+        dt["out"] = processed["out"] #Records whether an out occured in this segment
+        inning = self.inning_at_segment(filename)
+        if inning is not None:
+            dt["inning"] = inning #Records the inning shown in this segment
+        return dt
 
     def load_and_process_data(self):
         """
@@ -108,103 +205,160 @@ class DataProcessor:
         Returns:
             list: A list of dictionaries, where each dictionary contains the processed data from a file, or None in case of error.
         """
-        records=[] # Stores processed records
-        time=0  #Keeps track of the time in the game
+        records = list(self.iter_records())
+        return records or None
 
+    def load_ledger(self):
+        """Returns the ingestion ledger: segment key -> {"id", "hash", "filename"}."""
+        if not os.path.exists(self.ledger_path):
+            return {}
         try:
-            # Sort the files based on the segment number in their filename.
-            files = sorted([entry.path for entry in os.scandir(self.directory_path) if entry.is_file()], key=self.extract_segment_number)
-            if not files:
-                logging.warning(f"No files found in directory: {self.directory_path}")
-                return None
+            with open(self.ledger_path, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Could not read ingestion ledger {self.ledger_path}, re-ingesting everything: {e}")
+            return {}
+
+    def save_ledger(self, ledger):
+        """Writes the ingestion ledger atomically."""
+        os.makedirs(os.path.dirname(self.ledger_path) or ".", exist_ok=True)
+        with open(self.ledger_path + ".tmp", "w") as f:
+            json.dump(ledger, f, indent=2, sort_keys=True)
+        os.replace(self.ledger_path + ".tmp", self.ledger_path)
+
+    def segment_key(self, filename):
+        """Returns the ledger key of a segment: the game and the segment number (or file name if it has none)."""
+        number = extract_segment_number(filename)
+        return f"{self.game_id}/{number if number is not None else os.path.basename(filename)}"
+
+    def ingest_data(self, start_after=None):
+        """
+        Ingests new and changed segments into the local vector index, or the Vertex AI Vector Search index.
 
-            for filename in files:
-                logging.info(f"Processing file: {filename}")
-                try:
-                    with open(filename, 'r') as f:
-                        file_content = f.read()
-
-                        processed = self.extract_text_from_json_string(file_content) #Extracts information from the file
-                        if processed:
-                            dt = {} #Store all the information and metadata associated with it for a single segment
-
-                            time = time + 30  #Increment time by 30 seconds
-                            description_parts = [processed["play_by_play"]] #Start building the description
-                            if processed["major_events"]:
-                                description_parts.append(f'Major_events: {processed["major_events"]}')  # Add major events if available
-                            if processed["strategies"]:
-                                description_parts.append(f'Strategies in the game: {processed["strategies"]}') #Add game strategies if available
-                            description_parts.append(f'time: {time}t') # Append the time
-                            dt["description"] = "\n".join(description_parts) #Join all parts of the description
-
-                            dt["time"] = time  #Stores the current time
-                            dt["filename"] = filename  #Stores the filename for the data segment
-                            dt["is_major"] = processed["is_major"] #Records whether a major event occured in this segment
-                            dt["homerun"] = processed["homerun"] #Records whether a home run occured in this segment
-                            dt["out"] = processed["out"] #Records whether an out occured in this segment
-                            records.append(dt) #Append this record to the overall list of records
-
-
-                        else:
-                            logging.warning(f"No text to process in file: {filename}")
-
-                except UnicodeDecodeError:
-                    logging.error(f"UnicodeDecodeError: Unable to decode file content in {filename}.  Skipping file.")
-                except Exception as e:
-                    logging.exception(f"An error occurred while processing {filename}: {e}") # Use exception to log the whole stack trace
-
-            return records
-        except FileNotFoundError:
-            logging.error(f"FileNotFoundError: Directory not found: {self.directory_path}")
-            return None
-        except Exception as e:
-            logging.exception(f"An error occurred: {e}")
-            return None
+        Every segment gets a stable node id derived from (game, segment number, content hash) and is recorded in
+        the ledger, so unchanged segments are neither embedded nor upserted again; a changed segment replaces its
+        previous node, and segments whose files were removed are deleted from the index.
 
-    def ingest_data(self):
-        """
-        Ingests the processed data into the Vertex AI Vector Search index.
-        """
-        records = self.load_and_process_data()
+        Files are streamed: records are read, embedded (in batches, several batches at a time) and upserted in
+        chunks of upsert_batch_size, and the ledger is saved after every chunk, so memory stays bounded and an
+        interrupted run resumes where it stopped. Records whose batch still fails after the retries are skipped
+        and picked up by the next ingestion.
 
-        if records:
-            #Initialize the Vertex AI Vector Store
-            vector_store = VertexAIVectorStore(project_id=self.PROJECT_ID,region=self.REGION,index_id=self.vs_index.resource_name,endpoint_id=self.vs_endpoint.resource_name,gcs_bucket_name=self.GCS_BUCKET_NAME)
-            storage_context = StorageContext.from_defaults(vector_store=vector_store) #Create storage context
-            key_path = "1.json" #Service account key file
+        Args:
+            start_after (int, optional): Skip segments numbered up to and including this one.
+
+        Returns:
+            dict: Number of records processed, ingested, unchanged, deleted and failed, and the elapsed seconds, or
+                None if nothing was ingested.
+        """
+        records = self.iter_records(start_after)
+        first = next(records, None)
+        if first is None:
+            logging.warning("Data processing failed. No data ingested.")
+            return None
 
+        vector_backend = self.vector_backend
+        if vector_backend is None and self.connections is not None and self.connections.backend_name == "local":
+            vector_backend = self.connections.backend()
+        if vector_backend is not None:
+            embed_model = vector_backend.embedder
+            upsert = lambda batch: vector_backend.add(
+                {"id": node_id, "text": text, "embedding": embedding, "metadata": metadata} for node_id, text, embedding, metadata in batch)
+            delete = vector_backend.delete
+        else:
             try:
-                # Load the credentials from the key file
-                credentials = service_account.Credentials.from_service_account_file(key_path)
-                # configure embedding model
-                embed_model = VertexTextEmbedding(model_name=self.MODEL_NAME,project=self.PROJECT_ID,location=self.REGION,credentials=credentials) # initialize the embeddings model
+                #Initialize the Vertex AI Vector Store, shared with retrieval when connections are given
+                vector_store = self.connections.vector_store() if self.connections is not None else self.connect_vector_store()
+                # configure embedding model with the service account key file (a stand-in when FAKE_GOOGLE_URL is set)
+                embed_model = text_embedding(self.MODEL_NAME, self.PROJECT_ID, self.REGION, "1.json",
+                                             embed_batch_size=self.embed_batch_size) # initialize the embeddings model
                 Settings.embed_model = embed_model #Set the default embeddings model in LlamaIndex
+                if self.embedding_cache is not None:
+                    embed_model = CachedEmbedding(embed_model, self.embedding_cache)
             except Exception as e:
-                logging.error(f"Error loading credentials or configuring embedding model: {e}")
-                return
-
-
-            nodes = []
-            for record in records:
-                text = record.pop("description") #Extract the text to be embedded
-                try:
-                    embedding = embed_model.get_text_embedding(text) #Generate embeddings
-                except Exception as e:
-                     logging.error(f"Error generating embedding for text: {text}. Skipping record. Error: {e}")
-                     continue
-
-                metadata = {**record} #Stores the metadata
-                print(text)
-                print(metadata)
-
-                nodes.append(TextNode(text=text, embedding=embedding, metadata=metadata)) #Create the text nodes that will be added
-
+                logging.error(f"Error connecting to Vector Search or configuring embedding model: {e}")
+                return None
+            # Each node is its own source document, so it can be deleted by id through the ref_doc_id restrict
+            upsert = lambda batch: vector_store.add(
+                [TextNode(id_=node_id, text=text, embedding=embedding, metadata=metadata,
+                          relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=node_id)})
+                 for node_id, text, embedding, metadata in batch])
+            delete = lambda node_ids: [vector_store.delete(node_id) for node_id in node_ids]
+
+        start = time.time()
+        ledger = self.load_ledger()
+        counts = {"records": 0, "ingested": 0, "unchanged": 0, "deleted": 0, "failed": 0}
+        stream = itertools.chain([first], records)
+        while True:
+            with stage("ingest.read"):
+                chunk = list(itertools.islice(stream, self.upsert_batch_size))
+            if not chunk:
+                break
+            self.ingest_chunk(chunk, ledger, embed_model, upsert, delete, counts)
+
+        # Segments whose analysis files are gone are removed from the index (unparseable files are kept)
+        removed = [key for key, entry in ledger.items() if key.startswith(f"{self.game_id}/") and not os.path.exists(entry["filename"])]
+        if removed:
             try:
-                vector_store.add(nodes) # Add the nodes to the Vertex AI Vector Search Index
-                logging.info("Data ingested successfully!")
+                delete([ledger[key]["id"] for key in removed])
+                for key in removed:
+                    del ledger[key]
+                counts["deleted"] = len(removed)
+                self.save_ledger(ledger)
             except Exception as e:
-                logging.error(f"Error adding nodes to vector store: {e}")
+                logging.error(f"Error deleting removed segments from vector store: {e}")
 
+        summary = {**counts, "seconds": round(time.time() - start, 2)}
+        logging.info(f"Data ingested: {summary}")
+        return summary
 
-        else:
-            logging.warning("Data processing failed. No data ingested.")
\ No newline at end of file
+    def connect_vector_store(self):
+        """Connects to the Vertex AI Vector Store of the configured index and endpoint."""
+        aiplatform.init(project=self.PROJECT_ID, location=self.REGION) # Initialize Vertex AI SDK
+        vs_index = aiplatform.MatchingEngineIndex(index_name=self.INDEX_ID) # Retrieve the index by its name.
+        vs_endpoint = aiplatform.MatchingEngineIndexEndpoint(index_endpoint_name= self.ENDPOINT_ID) # Retrieve the endpoint by its name.
+        return VertexAIVectorStore(project_id=self.PROJECT_ID,region=self.REGION,index_id=vs_index.resource_name,endpoint_id=vs_endpoint.resource_name,gcs_bucket_name=self.GCS_BUCKET_NAME)
+
+    def ingest_chunk(self, records, ledger, embed_model, upsert, delete, counts):
+        """Embeds and upserts the new or changed records of one chunk, then records them in the ledger."""
+        pending = []  # (segment key, node id, content hash, text, metadata) of new or changed segments
+        for record in records:
+            text = record.pop("description") #Extract the text to be embedded
+            metadata = {**record} #Stores the metadata
+            content_hash = hashlib.sha256(json.dumps([text, metadata], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+            key = self.segment_key(record["filename"])
+            if ledger.get(key, {}).get("hash") != content_hash:
+                pending.append((key, stable_node_id(self.game_id, key, content_hash), content_hash, text, metadata))
+        counts["records"] += len(records)
+        counts["unchanged"] += len(records) - len(pending)
+        if not pending:
+            return
+
+        with stage("ingest.embed", records=len(pending)):
+            embeddings = embed_in_batches(embed_model, [item[3] for item in pending], batch_size=self.embed_batch_size,
+                                          max_workers=self.embed_workers, max_retries=self.embed_retries)
+        batch = [(item, embedding) for item, embedding in zip(pending, embeddings) if embedding is not None]
+        if len(batch) < len(pending):
+            logging.error(f"Skipping {len(pending) - len(batch)} record(s) whose embeddings failed after {self.embed_retries} retries.")
+            counts["failed"] += len(pending) - len(batch)
+        if not batch:
+            return
+        try:
+            with stage("ingest.upsert", nodes=len(batch)):
+                upsert([(node_id, text, embedding, metadata) for (_, node_id, _, text, metadata), embedding in batch]) # Add the nodes to the vector index
+        except Exception as e:
+            logging.error(f"Error adding {len(batch)} nodes to vector store: {e}")
+            counts["failed"] += len(batch)
+            return
+        replaced = [ledger[key]["id"] for (key, *_), _ in batch if key in ledger]
+        for (key, node_id, content_hash, _, metadata), _ in batch:
+            ledger[key] = {"id": node_id, "hash": content_hash, "filename": metadata["filename"]}
+        counts["ingested"] += len(batch)
+        try:
+            if replaced:
+                with stage("ingest.delete", nodes=len(replaced)):
+                    delete(replaced) # Previous versions of changed segments
+        except Exception as e:
+            logging.error(f"Error deleting replaced nodes from vector store: {e}")
+        with stage("ingest.ledger_save"):
+            self.save_ledger(ledger)
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from telemetry import record_cache
+
+
+class EmbeddingStore:
+    """
+    Append-only embeddings of one model on disk: vectors.f32 holds the float32 rows back to back and is read
+    through a memory map, keys.txt holds one key per line, the line number being the row (the offset index).
+    Vectors are written before their key, so a crash can at worst leave rows without a key, which are
+    truncated on load.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.keys_path = os.path.join(directory, "keys.txt")
+        self.dim = None
+        self.rows = {}  # Key -> row
+        self._map = None
+        self._load()
+
+    def get(self, key):
+        """Returns a copy of the vector stored under key, or None."""
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        if self._map is None or row >= len(self._map):
+            self._map = np.memmap(self.vectors_path, dtype=np.float32, mode="r").reshape(-1, self.dim)
+        return np.array(self._map[row])
+
+    def put_many(self, items):
+        """Appends (key, vector) pairs whose keys are not stored yet."""
+        items = [(key, np.asarray(vector, dtype=np.float32)) for key, vector in items if key not in self.rows]
+        if not items:
+            return
+        if self.dim is None:
+            self.dim = len(items[0][1])
+            with open(os.path.join(self.directory, "meta.json"), "w") as f:
+                json.dump({"dim": self.dim}, f)
+        items = [(key, vector) for key, vector in items if len(vector) == self.dim]
+        if not items:
+            return
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.stack([vector for _, vector in items]).tobytes())
+        with open(self.keys_path, "a") as f:
+            f.write("".join(f"{key}\n" for key, _ in items))
+        for key, _ in items:
+            self.rows[key] = len(self.rows)
+
+    def _load(self):
+        meta_path = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(meta_path) or not os.path.exists(self.keys_path):
+            return
+        with open(meta_path, "r") as f:
+            self.dim = json.load(f)["dim"]
+        with open(self.keys_path, "r") as f:
+            keys = [line.strip() for line in f if line.strip()]
+        stored = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        keys = keys[:stored]
+        if stored > len(keys):  # Vectors of an interrupted append have no key; drop them so rows stay aligned
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(len(keys) * 4 * self.dim)
+        self.rows = {key: row for row, key in enumerate(keys)}
+
+
+class EmbeddingCache:
+    """
+    A persistent, content-addressed cache of embeddings shared by ingestion and the chat path.
+
+    Vectors are keyed by (model name, embedding kind, SHA-256 of the text) — query and document embeddings
+    of the same text differ for retrieval models — and each model's vectors live in their own memory-mapped
+    EmbeddingStore under `directory`. Repeated texts and repeated chat queries are served from disk instead
+    of calling the embedding API again.
+    """
+    def __init__(self, directory):
+        """
+        Initializes the EmbeddingCache.
+
+        Args:
+            directory (str): Directory holding one store per model.
+        """
+        self.directory = directory
+        self._stores = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model_name, kind, texts):
+        """Returns the cached vector (or None) for each text."""
+        with self._lock:
+            store = self._store(model_name)
+            vectors = [store.get(self.key(kind, text)) for text in texts]
+            found = sum(vector is not None for vector in vectors)
+            self.hits += found
+            self.misses += len(vectors) - found
+        record_cache("embedding", hits=found, misses=len(vectors) - found)
+        return vectors
+
+    def put_many(self, model_name, kind, texts, vectors):
+        """Stores the vectors of texts."""
+        with self._lock:
+            self._store(model_name).put_many((self.key(kind, text), vector) for text, vector in zip(texts, vectors))
+
+    def stats(self):
+        """Returns hit/miss counters and the number of cached vectors per model."""
+        with self._lock:
+            entries = {name: len(store.rows) for name, store in self._stores.items()}
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": entries}
+
+    @staticmethod
+    def key(kind, text):
+        return f"{kind}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def _store(self, model_name):
+        """Returns the store of a model, opening it on first use. Caller holds the lock."""
+        if model_name not in self._stores:
+            self._stores[model_name] = EmbeddingStore(os.path.join(self.directory, re.sub(r"[^A-Za-z0-9._-]", "_", model_name)))
+        return self._stores[model_name]
+
+
+class CachedEmbedding:
+    """
+    Wraps an embedding model (a LlamaIndex embedding such as VertexTextEmbedding, or a local embedder with
+    embed()/embed_many()) so that every embedding goes through an EmbeddingCache. Only the texts missing
+    from the cache are sent to the wrapped model, in one batch.
+    """
+    def __init__(self, model, cache, model_name=None):
+        """
+        Initializes the CachedEmbedding.
+
+        Args:
+            model (object): The embedding model to wrap.
+            cache (EmbeddingCache): Where vectors are looked up and stored.
+            model_name (str, optional): Cache namespace; defaults to the model's model_name attribute.
+        """
+        self.model = model
+        self.cache = cache
+        self.model_name = model_name or getattr(model, "model_name", None) or type(model).__name__
+
+    def get_query_embedding(self, query):
+        return self._embed("query", [query])[0]
+
+    def get_text_embedding(self, text):
+        return self._embed("text", [text])[0]
+
+    def get_text_embedding_batch(self, texts, **kwargs):
+        return self._embed("text", list(texts))
+
+    def _embed(self, kind, texts):
+        vectors = self.cache.get_many(self.model_name, kind, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self._call_model(kind, [texts[i] for i in missing])
+            self.cache.put_many(self.model_name, kind, [texts[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return [list(map(float, vector)) for vector in vectors]
+
+    def _call_model(self, kind, texts):
+        if hasattr(self.model, "get_text_embedding_batch"):
+            if kind == "query":
+                return [self.model.get_query_embedding(text) for text in texts]
+            return self.model.get_text_embedding_batch(texts)
+        return list(self.model.embed_many(texts))
@@ -0,0 +1,219 @@
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from media_utils import probe_duration, segment_sort_key
+from segment_analysis import parse_segment_analysis
+from video_clips import ClipCutter
+
+HIGHLIGHTS_MANIFEST = "highlights.json"
+FULL_GAME_REEL = "highlights_full_game.mp4"
+
+# "15-17: Stolen base; 5-7: Single" as produced by DETAILED_GAME_ANALYSIS_PROMPT; "0:15-0:17" is accepted too
+MAJOR_EVENT_PATTERN = re.compile(r'(\d+(?::\d+)?)\s*-\s*(\d+(?::\d+)?)\s*:\s*([^;\n]+)')
+
+
+def _seconds(value):
+    seconds = 0
+    for part in value.split(":"):
+        seconds = seconds * 60 + int(part)
+    return float(seconds)
+
+
+def parse_major_events(text):
+    """
+    Parses a "major_events" string into (start, end, description) tuples in in-segment seconds,
+    ordered by start.
+    """
+    events = []
+    for start, end, description in MAJOR_EVENT_PATTERN.findall(text or ""):
+        start, end = _seconds(start), _seconds(end)
+        if end < start:
+            start, end = end, start
+        events.append((start, end, description.strip()))
+    return sorted(events)
+
+
+def load_segment_analysis(path):
+    """Reads a segment analysis file written by VideoAnalyzer, or returns None if it holds no usable analysis."""
+    with open(path, "r") as f:
+        return parse_segment_analysis(f.read())
+
+
+def _flag(value):
+    return str(value).strip() == "1"
+
+
+def merge_ranges(ranges):
+    """Merges overlapping or touching (start, end) ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class HighlightBuilder:
+    """
+    Builds highlight reels from the per-segment analysis files.
+
+    Segments flagged is_major, homerun or out contribute the ranges listed in their major_events, padded
+    a little on both sides. Each range is cut from segments/ with stream copy, and the clips are joined
+    (also stream copy) into one reel per inning plus a full-game reel. A manifest records what every
+    analysis file contributed and which clips each reel was built from, so an update only cuts clips
+    for new or changed analyses and only rewrites the reels whose clip list changed.
+
+    Analyses can come from more than one directory (batch jobs write to their own output_dir), so the
+    builder keeps a list of (analysis_dir, segment_dir) sources in the manifest. When a segment has been
+    analyzed in several of them, the most recently written analysis is used.
+    """
+    def __init__(self, analysis_dir, segment_dir, output_dir="highlights", cache_dir="cache/highlights",
+                 inning_at=None, padding_before=2.0, padding_after=2.0):
+        """
+        Initializes the HighlightBuilder.
+
+        Args:
+            analysis_dir (str): Directory with the <segment>.txt analysis files (the "event" directory).
+            segment_dir (str): Directory with the video segments.
+            output_dir (str): Directory the reels and the manifest are written to.
+            cache_dir (str): Directory for the individual event clips.
+            inning_at (callable, optional): inning_at(segment_name, seconds) returns the inning shown at that
+                point of the segment, or None. Without it every clip goes into the full-game reel only.
+            padding_before (float): Seconds of lead-in added before each event.
+            padding_after (float): Seconds added after each event.
+        """
+        self.analysis_dir = os.path.abspath(analysis_dir)
+        self.segment_dir = os.path.abspath(segment_dir)
+        self.output_dir = output_dir
+        self.inning_at = inning_at
+        self.padding_before = padding_before
+        self.padding_after = padding_after
+        self.cutter = ClipCutter(cache_dir=cache_dir)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="highlights")
+        self._pending = None
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+        self.sources = [(self.analysis_dir, self.segment_dir)]
+        for analysis_dir, segment_dir in self.manifest.get("sources", []):
+            if (analysis_dir, segment_dir) not in self.sources:
+                self.sources.append((analysis_dir, segment_dir))
+
+    def add_source(self, analysis_dir, segment_dir):
+        """Adds a directory of analysis files, and the directory of the segments they describe, to the reels."""
+        source = (os.path.abspath(analysis_dir), os.path.abspath(segment_dir))
+        with self._lock:
+            if source not in self.sources:
+                self.sources.append(source)
+
+    def request_update(self, analysis_dir=None, segment_dir=None):
+        """
+        Queues an update in the background; requests arriving while one is queued are folded into it.
+        Passing analysis_dir (and segment_dir, defaulting to the builder's) adds that source first.
+        """
+        if analysis_dir:
+            self.add_source(analysis_dir, segment_dir or self.segment_dir)
+        with self._lock:
+            if self._pending is None or self._pending.running() or self._pending.done():
+                self._pending = self._executor.submit(self._safe_update)
+            return self._pending
+
+    def update(self):
+        """
+        Cuts clips for new or changed analysis files and rebuilds the reels that changed.
+
+        Returns:
+            dict: The manifest.
+        """
+        analyses = dict(self.manifest["analyses"])  # Readers keep seeing the previous manifest until the swap below
+        with self._lock:
+            # Sources whose directory is gone (e.g. a temporary job output) are dropped, except the builder's own
+            self.sources = [source for i, source in enumerate(self.sources) if i == 0 or os.path.isdir(source[0])]
+            sources = list(self.sources)
+        latest = {}  # Analysis name -> (mtime_ns, analysis path, segment dir) of its newest version
+        for analysis_dir, segment_dir in sources:
+            if not os.path.isdir(analysis_dir):
+                continue
+            for entry in os.scandir(analysis_dir):
+                if entry.name.endswith(".txt"):
+                    mtime_ns = entry.stat().st_mtime_ns
+                    if entry.name not in latest or mtime_ns > latest[entry.name][0]:
+                        latest[entry.name] = (mtime_ns, entry.path, segment_dir)
+        for name in set(analyses) - set(latest):
+            del analyses[name]
+        for name in sorted(latest, key=segment_sort_key):
+            mtime_ns, path, segment_dir = latest[name]
+            if analyses.get(name, {}).get("mtime_ns") != mtime_ns or analyses[name].get("path") != path:
+                analyses[name] = {"mtime_ns": mtime_ns, "path": path, "events": self._cut_events(path, segment_dir)}
+
+        reels = {}
+        for name in sorted(analyses, key=segment_sort_key):
+            for event in analyses[name]["events"]:
+                reels.setdefault(FULL_GAME_REEL, []).append(event["clip"])
+                if event.get("inning") is not None:
+                    reels.setdefault(f"highlights_inning_{int(event['inning']):02d}.mp4", []).append(event["clip"])
+        for reel, clips in reels.items():
+            reel_path = os.path.join(self.output_dir, reel)
+            if self.manifest["reels"].get(reel) != clips or not os.path.exists(reel_path):
+                self.cutter.join(clips, reel_path)
+                print(f"Built highlight reel {reel} from {len(clips)} clips")
+        for reel in set(self.manifest["reels"]) - set(reels):
+            if os.path.exists(os.path.join(self.output_dir, reel)):
+                os.remove(os.path.join(self.output_dir, reel))
+        self.manifest = {"analyses": analyses, "reels": reels, "sources": [list(source) for source in sources]}
+        self._save_manifest()
+        return self.manifest
+
+    def _safe_update(self):
+        try:
+            return self.update()
+        except Exception as e:
+            print(f"Error updating highlights: {e}")
+
+    def _cut_events(self, analysis_path, segment_dir):
+        """Cuts the clips for one analysis file, from its segment in segment_dir, and returns its events."""
+        analysis = load_segment_analysis(analysis_path)
+        if not analysis or not any(_flag(analysis.get(key)) for key in ("is_major", "homerun", "out")):
+            return []
+        segment_name = os.path.splitext(os.path.basename(analysis_path))[0] + ".mp4"
+        segment_path = os.path.join(segment_dir, segment_name)
+        if not os.path.exists(segment_path):
+            print(f"Segment {segment_name} for highlights not found")
+            return []
+        duration = probe_duration(segment_path)
+        events = parse_major_events(analysis.get("major_events"))
+        ranges = merge_ranges((max(0.0, start - self.padding_before),
+                               min(end + self.padding_after, duration) if duration else end + self.padding_after)
+                              for start, end, _ in events)
+        results = []
+        for start, end in ranges:
+            if end <= start:
+                continue
+            clip = self.cutter.cut_range(segment_path, start, end)
+            results.append({
+                "segment": segment_name,
+                "start": start,
+                "end": end,
+                "descriptions": [description for event_start, event_end, description in events
+                                 if event_start < end and event_end > start],
+                "inning": self.inning_at(segment_name, start) if self.inning_at else None,
+                "clip": clip,
+            })
+        return results
+
+    def _load_manifest(self):
+        path = os.path.join(self.output_dir, HIGHLIGHTS_MANIFEST)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                return json.load(f)
+        return {"analyses": {}, "reels": {}}
+
+    def _save_manifest(self):
+        path = os.path.join(self.output_dir, HIGHLIGHTS_MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.manifest, f, indent=4)
+        os.replace(path + ".tmp", path)
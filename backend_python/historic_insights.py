@@ -4,7 +4,7 @@ import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import json
-import google.generativeai as genai
+from llm_clients import generative_model
 import requests
 import os
 load_dotenv()
@@ -223,8 +223,7 @@ class BaseballDataProcessor:
  
 class BaseballStrategyAnalyzer:
     def __init__(self, api_key: str):
-        genai.configure(api_key=api_key)
-        self.llm_client = genai.GenerativeModel('gemini-1.5-flash')
+        self.llm_client = generative_model('gemini-1.5-flash', api_key)
         
         
     def generate_matchup_prompt(self, matchup_data: Dict) -> str:
@@ -0,0 +1,170 @@
+import math
+import re
+import threading
+
+import numpy as np
+
+from text_embeddings import normalize_text
+from vector_backends import embed_query
+
+SEGMENT_SECONDS = 30  # Chunk length; a chunk's "time" metadata is the end of its 30-second segment
+ORDINALS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6, "seventh": 7, "eighth": 8, "ninth": 9}
+UNIT_SECONDS = {"s": 1, "sec": 1, "secs": 1, "second": 1, "seconds": 1, "min": 60, "mins": 60, "minute": 60, "minutes": 60}
+_UNIT = r"(s|secs?|seconds?|mins?|minutes?)"
+AGO_PATTERN = re.compile(rf"\b(\d+) {_UNIT} (ago|back|before)\b")
+SINCE_PATTERN = re.compile(rf"\b(last|past) (\d+) {_UNIT}\b")
+INNING_PATTERN = re.compile(r"\b(\d+)(?:st|nd|rd|th)? inning\b|\b(" + "|".join(ORDINALS) + r") inning\b")
+
+
+def query_filters(query, current_time=None):
+    """
+    Derives exact metadata filters from the time references in a question, so time-bounded questions are
+    answered from the right chunks instead of relying on an LLM to re-filter retrieved ones.
+
+    "X seconds/minutes ago" selects the segment containing that moment, "last X seconds/minutes" every
+    segment since then, and "Nth inning" that inning. Nothing after current_time is ever returned.
+
+    Returns:
+        list: VectorSearchFilter-shaped dicts, all of which must match.
+    """
+    text = normalize_text(query)
+    try:
+        now = float(current_time)
+    except (TypeError, ValueError):
+        now = None
+    filters = []
+    if now is not None:
+        match = AGO_PATTERN.search(text)
+        if match:
+            moment = now - int(match.group(1)) * UNIT_SECONDS[match.group(2)]
+            filters += [{"key": "time", "value": moment, "operator": "GE"},
+                        {"key": "time", "value": moment + SEGMENT_SECONDS, "operator": "LT"}]
+        match = SINCE_PATTERN.search(text)
+        if match:
+            filters.append({"key": "time", "value": now - int(match.group(2)) * UNIT_SECONDS[match.group(3)], "operator": "GT"})
+        filters.append({"key": "time", "value": now, "operator": "LE"})
+    match = INNING_PATTERN.search(text)
+    if match:
+        filters.append({"key": "inning", "value": int(match.group(1)) if match.group(1) else ORDINALS[match.group(2)], "operator": "EQ"})
+    return filters
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuses ranked lists of ids: each list contributes 1 / (k + rank) to an id's score.
+
+    Returns:
+        dict: id -> fused score.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+class BM25Index:
+    """Okapi BM25 over normalized word tokens, with postings kept as NumPy arrays for vectorized scoring."""
+    def __init__(self, texts, k1=1.5, b=0.75):
+        """
+        Builds the index.
+
+        Args:
+            texts (list): Document texts; document i is row i.
+            k1 (float): Term frequency saturation.
+            b (float): Document length normalization.
+        """
+        self.size = len(texts)
+        documents = [normalize_text(text).split() for text in texts]
+        lengths = np.array([len(tokens) for tokens in documents], dtype=np.float32)
+        average = float(lengths.mean()) if self.size and lengths.sum() else 1.0
+        postings = {}
+        for row, tokens in enumerate(documents):
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(row)
+                postings[token][1].append(count)
+        self._postings = {}
+        for token, (rows, counts) in postings.items():
+            rows, tf = np.array(rows), np.array(counts, dtype=np.float32)
+            idf = math.log(1.0 + (self.size - len(rows) + 0.5) / (len(rows) + 0.5))
+            self._postings[token] = (rows, idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[rows] / average)))
+
+    def scores(self, query):
+        """Returns the BM25 score of every document for a query."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for token in set(normalize_text(query).split()):
+            if token in self._postings:
+                rows, weights = self._postings[token]
+                scores[rows] += weights
+        return scores
+
+
+class HybridRetriever:
+    """
+    Retrieval over a LocalVectorBackend that combines metadata pre-filters, dense similarity and BM25.
+
+    Filters (any number, all of which must match) select the candidate chunks exactly through the backend's
+    precomputed sorted arrays and bitmaps. Candidates are then ranked twice — by embedding similarity and by
+    BM25 over the chunk text (the play-by-play) — and the two rankings are merged with reciprocal rank
+    fusion, so exact player names and play terms count as much as paraphrases. Questions without search
+    terms (the '*' query of time-only questions) return the candidates most recent first.
+    """
+    def __init__(self, backend, rrf_k=60, depth=50):
+        """
+        Initializes the HybridRetriever.
+
+        Args:
+            backend (LocalVectorBackend): Holds the chunks, their embeddings and metadata indexes.
+            rrf_k (int): Reciprocal rank fusion constant.
+            depth (int): Number of chunks taken from each ranking before fusion.
+        """
+        self.backend = backend
+        self.rrf_k = rrf_k
+        self.depth = depth
+        self._bm25 = (None, None)  # (backend version, BM25Index)
+        self._lock = threading.Lock()
+
+    def search(self, query, filters=None, top_k=10):
+        """
+        Returns the top_k chunks for query among those matching filters.
+
+        Returns:
+            list: Chunk dicts with "id", "text", "score" (fused) and "metadata".
+        """
+        records, matrix, rows, version = self.backend.snapshot(filters)
+        if not len(rows):
+            return []
+        if not normalize_text(query):
+            times = np.array([_time(records[row]) for row in rows])
+            ranked = [(rows[i], 1.0) for i in np.argsort(-times, kind="stable")[:top_k]]
+        else:
+            dense = self.backend.dense_scores(matrix, rows, embed_query(self.backend.embedder, query))
+            keyword = self._index(records, version).scores(query)[rows]
+            depth = min(self.depth, len(rows))
+            rankings = [rows[np.argsort(-dense)[:depth]]]
+            keyword_order = np.argsort(-keyword)[:depth]
+            rankings.append(rows[keyword_order[keyword[keyword_order] > 0]])  # Chunks sharing no term are not ranked
+            fused = reciprocal_rank_fusion([ranking.tolist() for ranking in rankings], k=self.rrf_k)
+            ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [{"id": records[row]["id"], "text": records[row]["text"], "score": float(score),
+                 "metadata": records[row]["metadata"]} for row, score in ranked]
+
+    def _index(self, records, version):
+        """Returns the BM25 index for a backend version, rebuilding it after the backend changed."""
+        with self._lock:
+            built_version, index = self._bm25
+            if built_version != version or index is None or index.size != len(records):
+                index = BM25Index([record["text"] for record in records])
+                self._bm25 = (version, index)
+            return index
+
+
+def _time(record):
+    try:
+        return float(record["metadata"].get("time"))
+    except (TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,225 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    """Priority classes understood by the JobScheduler. Lower values run first."""
+    INTERACTIVE = 0  # Chat queries coming from /analyze
+    LIVE = 1  # Live insights such as /match-overview
+    BATCH = 2  # Backfill and whole-game segment analysis (/analyze_rag)
+
+
+class JobRejected(Exception):
+    """Raised (through the job's Future) when a job is refused or shed by the scheduler."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised (through the job's Future) when a job's deadline passed before a worker picked it up."""
+
+
+DEFAULT_QUEUE_LIMITS = {
+    Priority.INTERACTIVE: 64,
+    Priority.LIVE: 32,
+    Priority.BATCH: 512,
+}
+
+
+class _Job:
+    """A unit of work queued inside the JobScheduler."""
+    def __init__(self, priority, fn, args, kwargs, deadline):
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline  # Absolute time.monotonic() value, or None for no deadline
+        self.enqueued_at = time.monotonic()
+        self.future = Future()
+
+
+class JobScheduler:
+    """
+    A central, priority-aware job scheduler shared by every endpoint that talks to Gemini.
+
+    All model-bound work (chat, live insights, batch segment analysis) goes through one bounded
+    pool of worker threads so that batch processing cannot starve interactive requests. Jobs are
+    picked strictly by priority class, each class has a bounded queue, jobs may carry a deadline,
+    and low priority work is shed when the backlog grows too large.
+    """
+    def __init__(self, num_workers=4, queue_limits=None, batch_max_running=None, shed_threshold=None):
+        """
+        Initializes the JobScheduler and starts its worker threads.
+
+        Args:
+            num_workers (int): Number of worker threads (i.e. concurrent Gemini calls).
+            queue_limits (dict, optional): Maximum queued jobs per Priority. Defaults to DEFAULT_QUEUE_LIMITS.
+            batch_max_running (int, optional): Maximum workers BATCH jobs may occupy at once. Defaults to
+                num_workers - 1 so that at least one worker is always free for interactive work.
+            shed_threshold (int, optional): Number of queued INTERACTIVE and LIVE jobs above which queued BATCH
+                jobs are shed, since the scheduler is overloaded. Defaults to twice the number of workers.
+        """
+        self.num_workers = num_workers
+        self.queue_limits = {**DEFAULT_QUEUE_LIMITS, **(queue_limits or {})}
+        self.batch_max_running = batch_max_running if batch_max_running is not None else max(1, num_workers - 1)
+        self.shed_threshold = shed_threshold if shed_threshold is not None else 2 * num_workers
+
+        self._heap = []  # Entries are (priority, sequence, job)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._queued = {priority: 0 for priority in Priority}
+        self._running = {priority: 0 for priority in Priority}
+        self._stats = {priority: {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "shed": 0, "expired": 0, "wait_seconds": 0.0}
+                       for priority in Priority}
+        self._shutdown = False
+
+        self._workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"job-scheduler-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, priority, fn, *args, deadline=None, **kwargs):
+        """
+        Queues a job and returns a Future for its result.
+
+        Args:
+            priority (Priority): Priority class of the job.
+            fn (callable): The function to run on a worker thread.
+            *args: Positional arguments for fn.
+            deadline (float, optional): Seconds from now after which the job is dropped if it has not started.
+            **kwargs: Keyword arguments for fn.
+
+        Returns:
+            Future: Resolves with fn's return value, or with JobRejected / DeadlineExceeded.
+        """
+        priority = Priority(priority)
+        job = _Job(priority, fn, args, kwargs, time.monotonic() + deadline if deadline is not None else None)
+        with self._condition:
+            self._stats[priority]["submitted"] += 1
+            if self._shutdown:
+                self._reject(job, JobRejected("Scheduler is shut down"))
+                return job.future
+            if priority != Priority.BATCH and self._queued[Priority.INTERACTIVE] + self._queued[Priority.LIVE] >= self.shed_threshold:
+                self._shed_lowest()
+            if self._queued[priority] >= self.queue_limits[priority]:
+                self._reject(job, JobRejected(f"{priority.name} queue is full ({self.queue_limits[priority]} jobs)"))
+                return job.future
+            heapq.heappush(self._heap, (priority, next(self._sequence), job))
+            self._queued[priority] += 1
+            self._condition.notify()
+        return job.future
+
+    def run(self, priority, fn, *args, deadline=None, timeout=None, **kwargs):
+        """
+        Submits a job and blocks until it finishes. Convenience wrapper used by the request handlers.
+
+        Args:
+            priority (Priority): Priority class of the job.
+            fn (callable): The function to run.
+            deadline (float, optional): Queueing deadline in seconds (see submit).
+            timeout (float, optional): Maximum seconds to wait for the result.
+
+        Returns:
+            The return value of fn.
+        """
+        return self.submit(priority, fn, *args, deadline=deadline, **kwargs).result(timeout=timeout)
+
+    def metrics(self):
+        """Returns queue depths, running counts and per-priority counters as a JSON-serializable dict."""
+        with self._condition:
+            metrics = {"workers": self.num_workers, "queue_depth": self._total_queued(), "priorities": {}}
+            for priority in Priority:
+                stats = self._stats[priority]
+                started = stats["completed"] + stats["failed"]
+                metrics["priorities"][priority.name.lower()] = {
+                    "queued": self._queued[priority],
+                    "running": self._running[priority],
+                    "queue_limit": self.queue_limits[priority],
+                    **{key: value for key, value in stats.items() if key != "wait_seconds"},
+                    "avg_wait_seconds": round(stats["wait_seconds"] / started, 4) if started else 0.0,
+                }
+            return metrics
+
+    def shutdown(self, wait=True):
+        """Stops accepting jobs, rejects queued jobs and stops the workers."""
+        with self._condition:
+            self._shutdown = True
+            while self._heap:
+                _, _, job = heapq.heappop(self._heap)
+                self._queued[job.priority] -= 1
+                self._reject(job, JobRejected("Scheduler is shut down"))
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _total_queued(self):
+        return sum(self._queued.values())
+
+    def _reject(self, job, error, counter="rejected"):
+        """Fails a job's future. Must be called with the condition held."""
+        self._stats[job.priority][counter] += 1
+        if job.future.set_running_or_notify_cancel():  # Skip futures the caller already cancelled
+            job.future.set_exception(error)
+
+    def _shed_lowest(self):
+        """Drops the newest queued BATCH job to make room for higher priority work. Caller holds the lock."""
+        batch_entries = [entry for entry in self._heap if entry[0] == Priority.BATCH]
+        if not batch_entries:
+            return
+        victim = max(batch_entries, key=lambda entry: entry[1])
+        self._heap.remove(victim)
+        heapq.heapify(self._heap)
+        self._queued[Priority.BATCH] -= 1
+        self._reject(victim[2], JobRejected("Shed to make room for higher priority work"), counter="shed")
+
+    def _next_job(self):
+        """Pops the highest priority runnable job. Caller holds the lock."""
+        deferred = []
+        job = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            candidate = entry[2]
+            if candidate.priority == Priority.BATCH and self._running[Priority.BATCH] >= self.batch_max_running:
+                deferred.append(entry)  # Keep a worker free for interactive work
+                continue
+            self._queued[candidate.priority] -= 1
+            if candidate.deadline is not None and time.monotonic() > candidate.deadline:
+                self._reject(candidate, DeadlineExceeded("Job deadline passed while queued"), counter="expired")
+                continue
+            job = candidate
+            break
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+        return job
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    if self._shutdown:
+                        return
+                    self._condition.wait(timeout=1.0)
+                    job = self._next_job()
+                self._running[job.priority] += 1
+                self._stats[job.priority]["wait_seconds"] += time.monotonic() - job.enqueued_at
+
+            if not job.future.set_running_or_notify_cancel():
+                outcome = None  # Cancelled by the caller before it started
+            else:
+                try:
+                    job.future.set_result(job.fn(*job.args, **job.kwargs))
+                    outcome = "completed"
+                except BaseException as e:
+                    job.future.set_exception(e)
+                    outcome = "failed"
+
+            with self._condition:
+                self._running[job.priority] -= 1
+                if outcome:
+                    self._stats[job.priority][outcome] += 1
+                self._condition.notify_all()  # A BATCH slot may have opened up
@@ -0,0 +1,123 @@
+import os
+
+import requests
+
+from telemetry import TracedCalls
+
+FAKE_GOOGLE_URL = os.environ.get("FAKE_GOOGLE_URL")  # Base URL of the local stand-in (benchmarks/fake_google.py); unset talks to Google
+
+
+def fake_url(path=""):
+    """Returns the URL of path on the local stand-in, or None when the real Google services are used."""
+    if not FAKE_GOOGLE_URL:
+        return None
+    return FAKE_GOOGLE_URL.rstrip("/") + "/" + path.lstrip("/")
+
+
+def genai_client(api_key):
+    """
+    Returns a google-genai Client (Gemini models and the Files API).
+
+    With FAKE_GOOGLE_URL set, the client sends the same REST requests (uploads, file polling, generateContent)
+    to the local stand-in instead of Google. Model calls, uploads and file polls are recorded as telemetry stages.
+    """
+    from google import genai
+
+    if FAKE_GOOGLE_URL:
+        return TracedGenaiClient(genai.Client(api_key=api_key or "fake", http_options={"base_url": fake_url()}))
+    return TracedGenaiClient(genai.Client(api_key=api_key))
+
+
+def generative_model(model_name, api_key):
+    """
+    Returns a google.generativeai GenerativeModel, served by the local stand-in when FAKE_GOOGLE_URL is set, whose
+    generate_content calls are recorded as telemetry stages.
+    """
+    import google.generativeai as generativeai
+
+    if FAKE_GOOGLE_URL:
+        generativeai.configure(api_key=api_key or "fake", transport="rest", client_options={"api_endpoint": FAKE_GOOGLE_URL.rstrip("/")})
+    else:
+        generativeai.configure(api_key=api_key)
+    return TracedCalls(generativeai.GenerativeModel(model_name), {"generate_content": "gemini.generate"})
+
+
+def crew_llm(model, api_key):
+    """
+    Returns the CrewAI LLM the agents run on.
+
+    The stand-in exposes an OpenAI-compatible chat completions endpoint for the crews, so with FAKE_GOOGLE_URL set
+    the model is addressed through LiteLLM's OpenAI provider under the same model name.
+    """
+    from crewai import LLM
+
+    if FAKE_GOOGLE_URL:
+        return LLM(model=f"openai/{model.split('/')[-1]}", base_url=fake_url("v1"), api_key="fake")
+    return LLM(model=model, api_key=api_key)
+
+
+def text_embedding(model_name, project, location, credentials_path="1.json", **kwargs):
+    """
+    Returns the text embedding model: VertexTextEmbedding with the service account credentials, or a
+    FakeServiceEmbedding (no credentials needed) when FAKE_GOOGLE_URL is set.
+
+    Args:
+        model_name (str): Vertex AI text embedding model.
+        project (str): Google Cloud project ID.
+        location (str): Region of the embedding model.
+        credentials_path (str): Service account key file.
+        **kwargs: Passed on to VertexTextEmbedding (e.g. embed_batch_size).
+    """
+    if FAKE_GOOGLE_URL:
+        return FakeServiceEmbedding(model_name)
+    from google.oauth2 import service_account
+    from llama_index.embeddings.vertex import VertexTextEmbedding
+
+    credentials = service_account.Credentials.from_service_account_file(credentials_path)  # Load credentials from service account file
+    return VertexTextEmbedding(model_name=model_name, project=project, location=location, credentials=credentials, **kwargs)
+
+
+class TracedGenaiClient:
+    """A google-genai Client whose model calls, uploads and file polls run as telemetry stages with token counts."""
+    def __init__(self, client):
+        self.client = client
+        self.models = TracedCalls(client.models, {"generate_content": "gemini.generate"})
+        self.files = TracedCalls(client.files, {"upload": "gemini.upload", "get": "gemini.file_status"})
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+class FakeServiceEmbedding:
+    """
+    An embedding model served by the local stand-in's Vertex-style :predict endpoint. It exposes the LlamaIndex
+    embedding methods the rest of the code calls, so ingestion, the embedding cache and retrieval run unchanged
+    against simulated latency and rate limits.
+    """
+    def __init__(self, model_name, timeout=60):
+        """
+        Initializes the FakeServiceEmbedding.
+
+        Args:
+            model_name (str): Model name reported to the stand-in and used as the embedding cache namespace.
+            timeout (float): Seconds to wait for a response.
+        """
+        self.model_name = model_name
+        self.timeout = timeout
+        self.session = requests.Session()  # Keeps connections to the stand-in alive across calls
+
+    def get_query_embedding(self, query):
+        return self._predict([query], "RETRIEVAL_QUERY")[0]
+
+    def get_text_embedding(self, text):
+        return self._predict([text], "RETRIEVAL_DOCUMENT")[0]
+
+    def get_text_embedding_batch(self, texts, **kwargs):
+        return self._predict(list(texts), "RETRIEVAL_DOCUMENT")
+
+    def _predict(self, texts, task_type):
+        url = fake_url(f"v1/projects/fake/locations/fake/publishers/google/models/{self.model_name}:predict")
+        response = self.session.post(url, json={"instances": [{"content": text, "task_type": task_type} for text in texts]},
+                                     timeout=self.timeout)
+        response.raise_for_status()  # 429s surface as HTTPError, as quota errors do from the real service
+        return [prediction["embeddings"]["values"] for prediction in response.json()["predictions"]]
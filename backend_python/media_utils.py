@@ -0,0 +1,79 @@
+import hashlib
+import os
+import re
+import threading
+
+import ffmpeg
+
+_hash_cache = {}  # (path, size, mtime_ns) -> sha256 hex digest
+_duration_cache = {}  # (path, size, mtime_ns) -> duration in seconds
+_cache_lock = threading.Lock()
+
+
+def _file_key(path):
+    """Returns a cache key that changes whenever the file is rewritten."""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Computes the SHA-256 of a file's content, reading it in chunks.
+    Results are memoized per (path, size, mtime) so unchanged files are hashed only once.
+
+    Args:
+        path (str): Path to the file.
+        chunk_size (int): Number of bytes read per chunk.
+
+    Returns:
+        str: The hex digest.
+    """
+    key = _file_key(path)
+    with _cache_lock:
+        if key in _hash_cache:
+            return _hash_cache[key]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    with _cache_lock:
+        _hash_cache[key] = digest.hexdigest()
+    return _hash_cache[key]
+
+
+def probe_duration(path):
+    """
+    Returns the container duration of a media file in seconds using ffprobe, or None if it cannot be read.
+    Results are memoized per (path, size, mtime).
+    """
+    key = _file_key(path)
+    with _cache_lock:
+        if key in _duration_cache:
+            return _duration_cache[key]
+    try:
+        duration = float(ffmpeg.probe(path)["format"]["duration"])
+    except (ffmpeg.Error, KeyError, ValueError) as e:
+        print(f"Could not probe duration of {path}: {e}")
+        duration = None
+    with _cache_lock:
+        _duration_cache[key] = duration
+    return duration
+
+
+def extract_segment_number(filename):
+    """
+    Extracts the numerical segment number from names such as "baseball_segment_007.mp4" or "segment_007.txt".
+
+    Returns:
+        int: The segment number, or None if the name does not contain one.
+    """
+    match = re.search(r'segment_(\d+)\.\w+$', os.path.basename(filename))
+    if match:
+        return int(match.group(1))
+    return None
+
+
+def segment_sort_key(filename):
+    """Sort key that orders files by segment number, with names that have none at the end."""
+    number = extract_segment_number(filename)
+    return (number is None, number or 0)
@@ -0,0 +1,304 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+from media_utils import extract_segment_number
+
+
+class _Node:
+    __slots__ = ("start", "end", "key", "payload", "max_end", "height", "left", "right")
+
+    def __init__(self, start, end, key, payload):
+        self.start = start
+        self.end = end
+        self.key = key  # (start, tiebreak) so equal starts are kept apart
+        self.payload = payload
+        self.max_end = end
+        self.height = 1
+        self.left = None
+        self.right = None
+
+
+class IntervalTree:
+    """
+    An AVL tree of closed intervals ordered by start, augmented with the maximum end of each subtree.
+
+    Insertion is O(log n) and overlap queries are O(log n + k) for k results, so the index can be grown
+    one play at a time while a game is in progress.
+    """
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def insert(self, start, end, tiebreak, payload):
+        """Inserts the interval [start, end] with the given payload."""
+        self.root = self._insert(self.root, _Node(start, end, (start, tiebreak), payload))
+        self.size += 1
+
+    def overlapping(self, low, high):
+        """Returns the payloads of all intervals overlapping [low, high], ordered by start."""
+        results = []
+        self._collect(self.root, low, high, results)
+        return results
+
+    def floor(self, point):
+        """Returns the payload of the interval with the greatest start <= point, or None."""
+        node, best = self.root, None
+        while node:
+            if node.start <= point:
+                best, node = node, node.right
+            else:
+                node = node.left
+        return best.payload if best else None
+
+    def _collect(self, node, low, high, results):
+        if node is None or node.max_end < low:
+            return  # Nothing in this subtree ends late enough
+        self._collect(node.left, low, high, results)
+        if node.start <= high:
+            if node.end >= low:
+                results.append(node.payload)
+            self._collect(node.right, low, high, results)
+
+    @staticmethod
+    def _height(node):
+        return node.height if node else 0
+
+    def _update(self, node):
+        node.height = 1 + max(self._height(node.left), self._height(node.right))
+        node.max_end = max(node.end,
+                           node.left.max_end if node.left else node.end,
+                           node.right.max_end if node.right else node.end)
+
+    def _rotate_right(self, node):
+        pivot = node.left
+        node.left, pivot.right = pivot.right, node
+        self._update(node)
+        self._update(pivot)
+        return pivot
+
+    def _rotate_left(self, node):
+        pivot = node.right
+        node.right, pivot.left = pivot.left, node
+        self._update(node)
+        self._update(pivot)
+        return pivot
+
+    def _insert(self, node, new):
+        if node is None:
+            return new
+        if new.key < node.key:
+            node.left = self._insert(node.left, new)
+        else:
+            node.right = self._insert(node.right, new)
+        self._update(node)
+        balance = self._height(node.left) - self._height(node.right)
+        if balance > 1:
+            if new.key >= node.left.key:
+                node.left = self._rotate_left(node.left)
+            return self._rotate_right(node)
+        if balance < -1:
+            if new.key < node.right.key:
+                node.right = self._rotate_right(node.right)
+            return self._rotate_left(node)
+        return node
+
+
+def parse_timestamp(value):
+    """Parses a GUMBO ISO-8601 timestamp (e.g. "2024-09-29T19:10:34.123Z") into epoch seconds, or None."""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class PlayAlignment:
+    """
+    Maps video segments and video time to GUMBO plays and pitches.
+
+    Play intervals come from about.startTime/endTime and pitch intervals from playEvents[].startTime/endTime,
+    converted to video seconds relative to the wall-clock time at which the video starts. Segment intervals
+    come from the segment index written by the segmenter. A hand-calibrated sync map (segment -> play index),
+    where one exists, takes precedence over the timestamps for the segments it covers. Completed plays live in interval trees; the play
+    still in progress is kept aside until it completes so its growing end time never requires a re-insert.
+    """
+    def __init__(self, video_start=None, lead_in_seconds=90.0, segment_index=None, segment_seconds=30, sync_map=None):
+        """
+        Initializes the PlayAlignment.
+
+        Args:
+            video_start (str, optional): ISO timestamp of the wall-clock moment shown at video time 0.
+                When omitted it is derived from the first play's startTime minus lead_in_seconds.
+            lead_in_seconds (float): Seconds of video before the first play (pre-game footage).
+            segment_index (dict, optional): Segment index as written by segmenter.LiveSegmenter.
+            segment_seconds (float): Segment length used for segments missing from the index.
+            sync_map (dict, optional): Segment name (e.g. "segment_003.mp4") -> play index, as in sync.json.
+        """
+        self.video_start = parse_timestamp(video_start)
+        self.lead_in_seconds = lead_in_seconds
+        self.segment_seconds = segment_seconds
+        self._plays = IntervalTree()
+        self._pitches = IntervalTree()
+        self._added = set()  # Play indexes already in the trees
+        self._open_plays = {}  # Play index -> Play for plays still in progress
+        self._segments = {}  # Segment name -> (start, end) in video seconds
+        self._segments_by_number = {}
+        self._synced = {extract_segment_number(name): index for name, index in (sync_map or {}).items()
+                        if extract_segment_number(name) is not None}  # Segment number -> play index
+        self._lock = threading.RLock()
+        for name, entry in ((segment_index or {}).get("segments") or {}).items():
+            self.set_segment(name, entry)
+
+    def set_segment(self, name, entry):
+        """Records a segment's video interval; entry holds "start" and "end" seconds (segmenter on_segment hook)."""
+        with self._lock:
+            self._segments[name] = (entry["start"], entry["end"])
+            number = extract_segment_number(name)
+            if number is not None:
+                self._segments_by_number[number] = (entry["start"], entry["end"])
+
+    def update(self, plays):
+        """
+        Adds new or newly completed plays. Plays already indexed are skipped, so calling this with the
+        full allPlays list after every feed refresh only costs O(log n) per new play.
+
+        Args:
+            plays (list): GUMBO Play objects in allPlays order.
+
+        Returns:
+            int: Number of plays that appeared or completed since the last update.
+        """
+        with self._lock:
+            if self.video_start is None:
+                first_start = next((parse_timestamp(play.about.startTime) for play in plays
+                                    if play.about and play.about.startTime), None)
+                if first_start is None:
+                    return 0
+                self.video_start = first_start - self.lead_in_seconds
+            changed = 0
+            for index, play in enumerate(plays):
+                if index in self._added or not play.about or not play.about.startTime:
+                    continue
+                if play.about.isComplete and play.about.endTime:
+                    self._open_plays.pop(index, None)
+                    self._add_play(index, play)
+                    changed += 1
+                else:
+                    changed += index not in self._open_plays
+                    self._open_plays[index] = play
+            return changed
+
+    def segment_bounds(self, segment_name):
+        """Returns (start, end) video seconds of a segment, falling back to its number times the segment length."""
+        with self._lock:
+            if segment_name in self._segments:
+                return self._segments[segment_name]
+            number = extract_segment_number(segment_name)
+            if number is None:
+                raise ValueError(f"Cannot determine the position of segment {segment_name}")
+            if number in self._segments_by_number:
+                return self._segments_by_number[number]
+            return (number * self.segment_seconds, (number + 1) * self.segment_seconds)
+
+    def plays_between(self, start, end):
+        """Returns indexes of plays overlapping video time [start, end], in play order."""
+        with self._lock:
+            indexes = self._plays.overlapping(start, end)
+            low, high = self._to_wall(start), self._to_wall(end)
+            for index, play in self._open_plays.items():
+                play_start = parse_timestamp(play.about.startTime)
+                play_end = parse_timestamp(play.about.endTime) or float("inf")
+                if play_start <= high and play_end >= low:
+                    indexes.append(index)
+            return sorted(indexes)
+
+    def pitches_between(self, start, end):
+        """Returns (play index, playEvents index) pairs of pitches overlapping video time [start, end]."""
+        with self._lock:
+            pitches = self._pitches.overlapping(start, end)
+            low, high = self._to_wall(start), self._to_wall(end)
+            for index, play in self._open_plays.items():
+                for event_index, event in enumerate(play.playEvents):
+                    event_start = parse_timestamp(event.startTime)
+                    if event.isPitch and event_start is not None and event_start <= high and (parse_timestamp(event.endTime) or event_start) >= low:
+                        pitches.append((index, event_index))
+            return sorted(pitches)
+
+    def plays_for_segment(self, segment_name):
+        """Returns indexes of plays overlapping a segment."""
+        return self.plays_between(*self.segment_bounds(segment_name))
+
+    def pitches_for_segment(self, segment_name):
+        """Returns (play index, playEvents index) pairs of pitches overlapping a segment."""
+        return self.pitches_between(*self.segment_bounds(segment_name))
+
+    def play_index_at(self, video_time):
+        """
+        Returns the play shown at video_time: the latest play overlapping it, else the latest play that
+        started before it (e.g. during a pause between at-bats), else the first play.
+        """
+        with self._lock:
+            overlapping = self.plays_between(video_time, video_time)
+            if overlapping:
+                return overlapping[-1]
+            started = [index for index, play in self._open_plays.items() if parse_timestamp(play.about.startTime) <= self._to_wall(video_time)]
+            previous = self._plays.floor(video_time)
+            candidates = started + ([previous] if previous is not None else [])
+            return max(candidates) if candidates else 0
+
+    def play_index_for_segment(self, segment_name):
+        """
+        Returns the play a segment is about: its entry in the sync map, else the latest play overlapping it,
+        else the one in progress before it.
+        """
+        number = extract_segment_number(segment_name)
+        if number in self._synced:
+            return self._synced[number]
+        start, end = self.segment_bounds(segment_name)
+        overlapping = self.plays_between(start, end)
+        if overlapping:
+            return overlapping[-1]
+        return self.play_index_at(end)
+
+    def _to_video(self, timestamp):
+        return timestamp - self.video_start
+
+    def _to_wall(self, video_time):
+        return video_time + (self.video_start or 0.0)
+
+    def _add_play(self, index, play):
+        start = self._to_video(parse_timestamp(play.about.startTime))
+        end = self._to_video(parse_timestamp(play.about.endTime))
+        self._plays.insert(start, max(start, end), index, index)
+        for event_index, event in enumerate(play.playEvents):
+            event_start = parse_timestamp(event.startTime)
+            if not event.isPitch or event_start is None:
+                continue
+            event_end = parse_timestamp(event.endTime) or event_start
+            self._pitches.insert(self._to_video(event_start), self._to_video(max(event_start, event_end)),
+                                 (index, event_index), (index, event_index))
+        self._added.add(index)
+
+
+def load_sync_map(path):
+    """Returns the segment -> play index map stored at path (sync.json), or None if there is none."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def build_alignment(gumbo_utils, segment_index=None):
+    """
+    Builds a PlayAlignment for the current game from GUMBO data and the segment index.
+    VIDEO_START_TIME (ISO timestamp) and VIDEO_LEAD_IN_SECONDS in the environment override the anchor;
+    SYNC_FILE (default sync.json) names the hand-calibrated segment -> play map used when it exists.
+    """
+    alignment = PlayAlignment(
+        video_start=os.environ.get("VIDEO_START_TIME"),
+        lead_in_seconds=float(os.environ.get("VIDEO_LEAD_IN_SECONDS", 90)),
+        segment_index=segment_index,
+        sync_map=load_sync_map(os.environ.get("SYNC_FILE", "sync.json")),
+    )
+    alignment.update(gumbo_utils.get_all_plays())
+    return alignment
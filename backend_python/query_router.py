@@ -0,0 +1,206 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from text_embeddings import HashingEmbedder, normalize_text
+
+QUERY_TYPES = ("realtime", "historical", "search")
+
+# (pattern, query type, weight). Patterns run on normalize_text() output, so they see lower-case words only.
+ROUTING_RULES = [
+    (r"\b(right now|currently|at the moment|live|just now|this (pitch|play|at bat|batter)|that (pitch|play|swing|catch|throw))\b", "realtime", 2.0),
+    (r"\b(who is (batting|pitching|on (first|second|third|base))|what (was|is) that|is he|did he just|what just happened)\b", "realtime", 2.0),
+    (r"\b(now|current|currently|latest|any updates?|happening)\b", "realtime", 1.0),
+    (r"\b(\d+(st|nd|rd|th)|first|second|third|fourth|fifth|sixth|seventh|eighth|ninth) inning\b", "historical", 2.0),
+    (r"\b\d+ (seconds?|secs?|s|minutes?|mins?) (ago|back|before)\b", "historical", 2.5),
+    (r"\b(last|past|since) \d+ (seconds?|secs?|s|minutes?|mins?)\b", "historical", 2.5),
+    (r"\b(earlier|so far|in this game|highlights?|when did|how many times|last (homerun|home run|out|strikeout|walk|bunt|double play|stolen base))\b", "historical", 1.5),
+    (r"\b(home ?runs?|strikeouts?|bunts?|double plays?|stolen bases?|walks?|major events?)\b", "historical", 0.5),
+    (r"\b(yesterday|last (game|season|year|week|night)|this season|career|all time|history of|standings|schedule|contract|salary|trade|draft|injur(y|ed|ies))\b", "search", 2.5),
+    (r"\b(stats|statistics|average|era|ops|record|born|age|how old|who is the (manager|coach|owner))\b", "search", 1.5),
+]
+
+TIME_REFERENCE_PATTERN = re.compile(
+    r"\b(\d+(?:st|nd|rd|th)? inning|(?:first|second|third|fourth|fifth|sixth|seventh|eighth|ninth) inning|"
+    r"(?:last|past) \d+ (?:seconds?|secs?|minutes?|mins?|innings?)|\d+ (?:seconds?|secs?|minutes?|mins?) (?:ago|back))\b")
+
+# Politeness and lead-in words that carry no meaning for retrieval, video analysis or the answer cache
+FILLER_PATTERN = re.compile(
+    r"^(?:(?:hey|hi|hello|ok|okay|so|um+|uh+|yo|quick question|please)\b[\s,.!]*)+|"
+    r"\b(?:(?:can|could|would) you(?: please)? (?:tell|show|let) me|do you know|i (?:want|would like|wanna) to know|"
+    r"tell me)\b\s*|[\s,]*\b(?:please|for me|thanks|thank you)\W*$", re.IGNORECASE)
+# "Now" phrases only restate that a question is real-time; absolute references ("3rd inning", "2 minutes ago")
+# are kept because the historical filters read them from the optimized query
+LIVE_TIME_PATTERN = re.compile(r"[\s,]*\b(?:right now|just now|at the moment|currently)\b", re.IGNORECASE)
+
+
+def clean_question(question):
+    """
+    Strips filler and "right now"-style time phrases from a question, keeping its wording otherwise.
+    Both the router's and the classifier's optimized query go through it, so the answer cache, the historical
+    fast path and the crews see the same text whichever path classified the question.
+    """
+    collapsed = " ".join((question or "").split())
+    cleaned = LIVE_TIME_PATTERN.sub("", FILLER_PATTERN.sub("", collapsed)).strip(" ,")
+    return (cleaned[:1].upper() + cleaned[1:]) if cleaned.rstrip("?.! ") else collapsed
+
+
+# Seed examples (mirroring the classifier prompt) so the kNN classifier has neighbours before any query is logged
+SEED_EXAMPLES = [
+    ("What's the score of the game right now?", "realtime"),
+    ("Any score updates?", "realtime"),
+    ("Who scored last in the match?", "realtime"),
+    ("Are they winning", "realtime"),
+    ("Who is playing right now?", "realtime"),
+    ("Who is batting?", "realtime"),
+    ("What was that pitch?", "realtime"),
+    ("Was that a strike?", "realtime"),
+    ("What is the count?", "realtime"),
+    ("Show me the highlights from the game", "historical"),
+    ("What happened 20 minutes ago?", "historical"),
+    ("What was the score at the half?", "historical"),
+    ("What happened in the 7th inning?", "historical"),
+    ("When did the last home run happen?", "historical"),
+    ("Show me all the strikeouts", "historical"),
+    ("What happened 30 seconds back", "historical"),
+    ("What about the game yesterday", "search"),
+    ("How many home runs did they hit yesterday?", "search"),
+    ("Show me Ohtani stats", "search"),
+    ("Tell me about the history of the Dodgers", "search"),
+    ("What is Shohei Ohtani's batting average this season?", "search"),
+    ("Who is the manager of the Yankees?", "search"),
+]
+
+
+class QueryRouter:
+    """
+    Routes chat questions to the realtime, historical or search pipeline without an LLM call when it can.
+
+    Two signals are combined into one score per query type: hand-written rules over the normalized
+    text, and a similarity-weighted k-nearest-neighbour vote over logged queries embedded with the local
+    HashingEmbedder. The score share only says which type wins, not whether there is evidence at all (one
+    weak neighbour alone has a share of 1), so the router answers only when the winning type's share reaches
+    min_confidence and it has absolute evidence: a rule hit, or neighbours at evidence_similarity or more
+    whose similarities add up to min_knn_evidence (two fair matches, or one near-duplicate logged question). Otherwise route() returns None and the caller falls back to the LLM classifier, whose
+    answers are fed back with learn() so the kNN side improves as questions are logged.
+    """
+    def __init__(self, log_path="cache/query_log.jsonl", embedder=None, k=5, min_confidence=0.75,
+                 rule_weight=1.0, knn_weight=2.0, min_similarity=0.35, min_knn_evidence=0.9, evidence_similarity=0.5):
+        """
+        Initializes the QueryRouter and loads the logged queries.
+
+        Args:
+            log_path (str, optional): JSONL file of {"query", "type"} records; learn() appends to it.
+            embedder (object, optional): Object with embed(text) returning unit vectors (HashingEmbedder by default).
+            k (int): Number of neighbours that vote.
+            min_confidence (float): Minimum share of the combined score the winning type needs.
+            rule_weight (float): Weight of the rule scores.
+            knn_weight (float): Weight of the kNN vote (which sums to at most 1 before weighting).
+            min_similarity (float): Neighbours less similar than this do not vote.
+            min_knn_evidence (float): Summed similarity of the winning type's strong neighbours needed when no
+                rule for it fires (0 disables the evidence check, so every query is routed).
+            evidence_similarity (float): Similarity a neighbour needs to count as evidence.
+        """
+        self.log_path = log_path
+        self.embedder = embedder or HashingEmbedder()
+        self.k = k
+        self.min_confidence = min_confidence
+        self.rule_weight = rule_weight
+        self.knn_weight = knn_weight
+        self.min_similarity = min_similarity
+        self.min_knn_evidence = min_knn_evidence
+        self.evidence_similarity = evidence_similarity
+        self.rules = [(re.compile(pattern), query_type, weight) for pattern, query_type, weight in ROUTING_RULES]
+        self._lock = threading.Lock()
+        self._texts, self._labels = [], []
+        self._matrix = np.zeros((0, getattr(self.embedder, "dim", 0)), dtype=np.float32)
+        self.add_examples(SEED_EXAMPLES)
+        if log_path and os.path.exists(log_path):
+            with open(log_path, "r") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+            self.add_examples((record["query"], record["type"]) for record in records if record.get("type") in QUERY_TYPES)
+
+    def add_examples(self, examples):
+        """Adds labelled (query, type) examples to the kNN classifier without logging them."""
+        examples = [(text, label) for text, label in examples if label in QUERY_TYPES]
+        if not examples:
+            return
+        vectors = np.stack([self.embedder.embed(text) for text, _ in examples])
+        with self._lock:
+            self._texts += [text for text, _ in examples]
+            self._labels += [label for _, label in examples]
+            self._matrix = np.vstack([self._matrix, vectors]) if len(self._matrix) else vectors
+
+    def learn(self, query, query_type):
+        """Adds a query classified elsewhere (e.g. by the LLM) and appends it to the query log."""
+        if query_type not in QUERY_TYPES:
+            return
+        self.add_examples([(query, query_type)])
+        if self.log_path:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with self._lock, open(self.log_path, "a") as f:
+                f.write(json.dumps({"query": query, "type": query_type}) + "\n")
+
+    def scores(self, query):
+        """Returns the combined, normalized score per query type."""
+        return self._evidence(query)[0]
+
+    def _evidence(self, query):
+        """Returns (normalized score, rule hits, summed similarity of strong neighbours) per query type."""
+        text = normalize_text(query)
+        totals = dict.fromkeys(QUERY_TYPES, 0.0)
+        rule_hits = dict.fromkeys(QUERY_TYPES, 0)
+        for pattern, query_type, weight in self.rules:
+            if pattern.search(text):
+                totals[query_type] += self.rule_weight * weight
+                rule_hits[query_type] += 1
+        votes, strong = self._knn_votes(query)
+        for query_type, vote in votes.items():
+            totals[query_type] += self.knn_weight * vote
+        total = sum(totals.values())
+        return {query_type: (score / total if total else 0.0) for query_type, score in totals.items()}, rule_hits, strong
+
+    def route(self, query):
+        """
+        Classifies a query locally.
+
+        The router does not rewrite the question like the classifier does: "optimized_query" is the user's
+        question passed through clean_question(), which the caller also applies to the classifier's rewrite.
+
+        Returns:
+            dict: {"type", "time_reference", "optimized_query", "confidence", "source": "router"} shaped like the
+                classifier's QueryAnalysis output, or None when the router is not confident enough.
+        """
+        scores, rule_hits, strong = self._evidence(query)
+        query_type = max(scores, key=scores.get)
+        if scores[query_type] < self.min_confidence:
+            return None
+        if not rule_hits[query_type] and strong.get(query_type, 0.0) < self.min_knn_evidence:
+            return None  # A share without evidence, e.g. one loosely similar neighbour for an off-topic question
+        match = TIME_REFERENCE_PATTERN.search(normalize_text(query))
+        return {
+            "type": query_type,
+            "time_reference": match.group(0) if match else None,
+            "optimized_query": clean_question(query),
+            "confidence": round(scores[query_type], 3),
+            "source": "router",
+        }
+
+    def _knn_votes(self, query):
+        with self._lock:
+            matrix, labels = self._matrix, list(self._labels)
+        if not len(matrix):
+            return {}, {}
+        similarities = matrix @ self.embedder.embed(query)
+        nearest = np.argsort(-similarities)[:self.k]
+        votes, strong = {}, {}
+        for i in nearest:
+            if similarities[i] >= self.min_similarity:
+                votes[labels[i]] = votes.get(labels[i], 0.0) + float(similarities[i])
+            if similarities[i] >= self.evidence_similarity:
+                strong[labels[i]] = strong.get(labels[i], 0.0) + float(similarities[i])
+        total = sum(votes.values())
+        return ({label: vote / total for label, vote in votes.items()} if total else {}), strong
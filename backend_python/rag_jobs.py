@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from telemetry import stage
+
+ACTIVE_STATES = ("queued", "running", "cancelling")  # Jobs in these states are resumed after a restart
+FINAL_STATES = ("completed", "failed", "cancelled")
+
+
+class AnalysisJobManager:
+    """
+    Runs /analyze_rag segment analysis as background jobs with per-segment progress tracking.
+
+    Each job's state is persisted as a JSON file in jobs_dir so that status survives the HTTP request
+    and unfinished jobs can be resumed when the server restarts. Segment work itself is handed to the
+    shared JobScheduler as BATCH jobs; the manager's own pool only coordinates whole jobs.
+    """
+    def __init__(self, analyzer, scheduler=None, jobs_dir="cache/rag_jobs", max_concurrent_jobs=1, on_segment_done=None):
+        """
+        Initializes the AnalysisJobManager.
+
+        Args:
+            analyzer (VideoAnalyzer): The analyzer whose process_segments runs the job.
+            scheduler (JobScheduler, optional): Shared scheduler the segment analysis is queued on.
+            jobs_dir (str): Directory where job state files are stored.
+            max_concurrent_jobs (int): Number of jobs that may run at the same time.
+            on_segment_done (callable, optional): Called with the path of each analysis file as soon as it is written,
+                and the path of the segment it describes.
+        """
+        self.analyzer = analyzer
+        self.scheduler = scheduler
+        self.jobs_dir = jobs_dir
+        self.on_segment_done = on_segment_done
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="rag-job")
+        self._lock = threading.Lock()
+        self._jobs = {}  # job_id -> job state dict
+        self._cancel_events = {}  # job_id -> threading.Event
+        self._load_jobs()
+
+    def submit(self, video_dir, output_dir, max_workers=4, max_retries=3):
+        """
+        Creates a job for the given directories and queues it to run in the background.
+
+        Returns:
+            str: The id of the new job.
+        """
+        job_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "video_dir": video_dir,
+            "output_dir": output_dir,
+            "max_workers": max_workers,
+            "max_retries": max_retries,
+            "created_at": now,
+            "updated_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "segments": {},  # segment file name -> {"status": ..., "attempts": ..., "updated_at": ...}
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._cancel_events[job_id] = threading.Event()
+            self._save(job)
+        self._executor.submit(self._run_job, job_id, False)
+        return job_id
+
+    def status(self, job_id):
+        """
+        Returns the job state together with aggregated progress, or None if the job is unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = json.loads(json.dumps(job))  # Snapshot, so callers never see a half-updated state
+        job["progress"] = self._progress(job)
+        return job
+
+    def list_jobs(self):
+        """Returns a short summary of every known job, newest first."""
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda job: job["created_at"], reverse=True)
+            return [{"job_id": job["job_id"], "status": job["status"], "created_at": job["created_at"],
+                     "progress": self._progress(job)} for job in jobs]
+
+    def cancel(self, job_id):
+        """
+        Requests cancellation of a job. Segments already being analyzed finish; queued ones are dropped.
+
+        Returns:
+            bool: False if the job is unknown, True otherwise.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            if job["status"] in FINAL_STATES:
+                return True
+            self._cancel_events.setdefault(job_id, threading.Event()).set()
+            job["status"] = "cancelled" if job["status"] == "queued" else "cancelling"
+            self._touch(job)
+            self._save(job)
+        return True
+
+    def resume_pending(self):
+        """
+        Re-queues jobs that were queued or running when the server stopped. Segments that already
+        have an analysis file are skipped, so a resumed job only processes what is left.
+        """
+        with self._lock:
+            pending = [job_id for job_id, job in self._jobs.items() if job["status"] in ACTIVE_STATES]
+        for job_id in pending:
+            print(f"Resuming analysis job {job_id}")
+            self._executor.submit(self._run_job, job_id, True)
+        return pending
+
+    def _run_job(self, job_id, resume):
+        with self._lock:
+            job = self._jobs[job_id]
+            cancel_event = self._cancel_events.setdefault(job_id, threading.Event())
+            if job["status"] == "cancelling":
+                cancel_event.set()  # Cancel requested before the restart
+            if cancel_event.is_set():
+                job["status"] = "cancelled"
+                job["finished_at"] = datetime.now().isoformat()
+                self._touch(job)
+                self._save(job)
+                return
+            job["status"] = "running"
+            job["started_at"] = job["started_at"] or datetime.now().isoformat()
+            self._touch(job)
+            self._save(job)
+
+        try:
+            with stage("analyze_rag.job", job_id=job_id, resume=resume):
+                failed_files = self.analyzer.process_segments(
+                    job["video_dir"],
+                    job["output_dir"],
+                    job["max_workers"],
+                    job["max_retries"],
+                    scheduler=self.scheduler,
+                    progress_callback=lambda video_path, segment_status: self._on_progress(job_id, video_path, segment_status),
+                    cancel_event=cancel_event,
+                    skip_existing=resume,
+                )
+            final_status = "cancelled" if cancel_event.is_set() else ("failed" if failed_files else "completed")
+            error = f"{len(failed_files)} segment(s) failed after all retries" if failed_files and final_status == "failed" else None
+        except Exception as e:
+            print(f"Analysis job {job_id} failed: {e}")
+            final_status, error = "failed", str(e)
+
+        with self._lock:
+            job["status"] = final_status
+            job["error"] = error
+            job["finished_at"] = datetime.now().isoformat()
+            self._touch(job)
+            self._save(job)
+
+    def _on_progress(self, job_id, video_path, segment_status):
+        with self._lock:
+            job = self._jobs[job_id]
+            segment = job["segments"].setdefault(os.path.basename(video_path), {"status": "pending", "attempts": 0})
+            if segment_status == "processing":
+                segment["attempts"] += 1
+                segment["started_at"] = time.time()
+            elif segment_status in ("done", "failed") and segment.get("started_at"):
+                segment["seconds"] = round(time.time() - segment["started_at"], 2)
+            segment["status"] = segment_status
+            self._touch(job)
+            self._save(job)
+        if segment_status == "done" and self.on_segment_done:
+            segment_name = os.path.splitext(os.path.basename(video_path))[0]
+            try:
+                self.on_segment_done(os.path.join(job["output_dir"], "event", f"{segment_name}.txt"), video_path)
+            except Exception as e:
+                print(f"Segment listener failed for {video_path}: {e}")
+
+    @staticmethod
+    def _progress(job):
+        """Aggregates per-segment states into the counters tqdm used to print (done/total, rate, ETA)."""
+        counts = {}
+        for segment in job["segments"].values():
+            counts[segment["status"]] = counts.get(segment["status"], 0) + 1
+        total = len(job["segments"])
+        finished = counts.get("done", 0) + counts.get("skipped", 0)
+        progress = {"total": total, "finished": finished, "counts": counts,
+                    "percent": round(100.0 * finished / total, 1) if total else 0.0}
+        timings = [segment["seconds"] for segment in job["segments"].values() if "seconds" in segment]
+        if job["started_at"] and counts.get("done"):
+            elapsed = (datetime.fromisoformat(job["finished_at"] or datetime.now().isoformat())
+                       - datetime.fromisoformat(job["started_at"])).total_seconds()
+            rate = counts["done"] / elapsed if elapsed > 0 else 0.0
+            progress["elapsed_seconds"] = round(elapsed, 1)
+            progress["segments_per_second"] = round(rate, 4)
+            progress["eta_seconds"] = round((total - finished) / rate, 1) if rate and job["status"] == "running" else None
+        if timings:
+            progress["avg_segment_seconds"] = round(sum(timings) / len(timings), 2)
+        return progress
+
+    @staticmethod
+    def _touch(job):
+        job["updated_at"] = datetime.now().isoformat()
+
+    def _save(self, job):
+        """Atomically writes a job's state file. Caller holds the lock."""
+        path = os.path.join(self.jobs_dir, f"{job['job_id']}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f, indent=4)
+        os.replace(tmp_path, path)
+
+    def _load_jobs(self):
+        for entry in os.scandir(self.jobs_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, "r") as f:
+                    job = json.load(f)
+                self._jobs[job["job_id"]] = job
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Skipping unreadable job file {entry.path}: {e}")
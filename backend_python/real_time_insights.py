@@ -8,6 +8,7 @@ from GUMBO import *
 from dotenv import load_dotenv
 import google.generativeai as genai
 from historic_insights import BaseballDataProcessor, BaseballStrategyAnalyzer
+from telemetry import stage
 load_dotenv()
 import os,json
 
@@ -571,22 +572,23 @@ class BaseballInsightApp:
     async def process_game_update(self, historic_tool:BaseballStrategyAnalyzer,data_processor:BaseballDataProcessor) -> Dict[str, str]:
         """Process updates to the game and generate insights."""
         print("Processing game update...")
-        # Get past game summary
-        if os.path.exists("cache/past_game_summary.json"):
-            with open("cache/past_game_summary.json", "r") as file:
-                game_summary = json.load(file)
-        else:
-            with open("cache/past_game_summary.json", "w") as file:
-                json.dump({},file)
-            game_summary = {}
-        
-        if os.path.exists("cache/real_time_analysis.json"):
-            with open("cache/real_time_analysis.json", "r") as file:
-                real_time_insights = json.load(file)
-        else:
-            with open("cache/real_time_analysis.json", "w") as file:
-                json.dump({},file)
-            real_time_insights = {}
+        with stage("insights.load_cache"):
+            # Get past game summary
+            if os.path.exists("cache/past_game_summary.json"):
+                with open("cache/past_game_summary.json", "r") as file:
+                    game_summary = json.load(file)
+            else:
+                with open("cache/past_game_summary.json", "w") as file:
+                    json.dump({},file)
+                game_summary = {}
+
+            if os.path.exists("cache/real_time_analysis.json"):
+                with open("cache/real_time_analysis.json", "r") as file:
+                    real_time_insights = json.load(file)
+            else:
+                with open("cache/real_time_analysis.json", "w") as file:
+                    json.dump({},file)
+                real_time_insights = {}
         if self.index_number < len(real_time_insights):
             return real_time_insights[str(self.index_number)]
             
@@ -608,12 +610,14 @@ class BaseballInsightApp:
         
         past_game_summary = game_summary[str(self.index_number-1)] if self.index_number-1 >= 0  else ""
         # Get historical data for the matchup
-        historical_data = historic_tool.generate_game_plan(current_play.matchup.batter.id, current_play.matchup.pitcher.id, data_processor)['matchup_analysis']
+        with stage("insights.matchup_plan"):
+            historical_data = historic_tool.generate_game_plan(current_play.matchup.batter.id, current_play.matchup.pitcher.id, data_processor)['matchup_analysis']
         print(historical_data)
         # Get various types of analysis
         print("Getting current game context...")
-        current_game_context_task = asyncio.create_task(self.analyzer.generate_current_game_context(current_play))
-        current_game_context = await current_game_context_task
+        with stage("insights.game_context"):
+            current_game_context_task = asyncio.create_task(self.analyzer.generate_current_game_context(current_play))
+            current_game_context = await current_game_context_task
         
         print("Getting play analysis...")
         play_analysis_task = asyncio.create_task(self.analyzer.analyze_current_play(current_play,historical_data,past_game_summary,current_game_context))
@@ -622,9 +626,10 @@ class BaseballInsightApp:
         print("Getting strategic prediction...")
         strategic_prediction_task = asyncio.create_task(self.analyzer.get_strategic_prediction(past_game_summary,current_game_context))
 
-        play_analysis = await play_analysis_task
-        pattern_analysis = await pattern_analysis_task
-        strategic_prediction = await strategic_prediction_task
+        with stage("insights.analysis"):
+            play_analysis = await play_analysis_task
+            pattern_analysis = await pattern_analysis_task
+            strategic_prediction = await strategic_prediction_task
         print("got everything.......")
         current_game_context['batter'] = current_play.matchup.batter.fullName
         current_game_context['pitcher'] = current_play.matchup.pitcher.fullName 
@@ -640,14 +645,15 @@ class BaseballInsightApp:
         current_game_summary = game_summary[str(self.index_number)] if self.index_number >= 0 and self.index_number<len(game_summary) else ""
         print(current_game_summary)
         if current_game_summary == "":
-            game_summary_task = asyncio.create_task(self.analyzer.generate_entire_game_summary(real_time_insight,past_game_summary))
-            game_summary_task = await game_summary_task
+            with stage("insights.game_summary"):
+                game_summary_task = asyncio.create_task(self.analyzer.generate_entire_game_summary(real_time_insight,past_game_summary))
+                game_summary_task = await game_summary_task
             game_summary[str(self.index_number)] = game_summary_task['game_summary']
             with open("cache/past_game_summary.json", "w") as file:
                 json.dump(game_summary, file,indent=4)
         
         real_time_insights[self.index_number] = real_time_insight
-        with open("cache/real_time_analysis.json", "w") as file:
+        with stage("insights.save"), open("cache/real_time_analysis.json", "w") as file:
             json.dump(real_time_insights, file,indent=4)
                 
         
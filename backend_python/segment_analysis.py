@@ -0,0 +1,74 @@
+import re
+from typing import Any
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is optional; the standard library parser is slower but equivalent
+    import json
+    _loads = json.loads
+
+try:
+    import json_repair
+except ImportError:
+    json_repair = None
+
+CODE_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+FLAG_FIELDS = ("is_major", "homerun", "out")
+
+
+class SegmentAnalysis(BaseModel):
+    """The per-segment analysis VideoAnalyzer requests from Gemini (DETAILED_GAME_ANALYSIS_PROMPT)."""
+    play_by_play: str = ""  # Commentary-style description of the segment
+    major_events: str = ""  # "start-end: Event; ..." in in-segment seconds
+    is_major: str = "0"  # "1" if any major event occurs
+    homerun: str = "0"  # "1" if a home run occurs
+    out: str = "0"  # "1" if any batter is out
+    strategies: str = ""  # Strategies observed, separated by ";"
+
+    @field_validator(*FLAG_FIELDS, mode="before")
+    @classmethod
+    def _flag(cls, value: Any) -> str:
+        """Accepts 1/0, true/false and "1"/"0" and normalizes them to "1" or "0"."""
+        return "1" if str(value).strip().lower() in ("1", "true", "yes") else "0"
+
+    @field_validator("play_by_play", "major_events", "strategies", mode="before")
+    @classmethod
+    def _text(cls, value: Any) -> str:
+        """Joins lists (which the model sometimes returns for event lists) with "; " and maps null to ""."""
+        if value is None:
+            return ""
+        if isinstance(value, (list, tuple)):
+            return "; ".join(str(item) for item in value)
+        return str(value)
+
+
+def parse_segment_analysis(text):
+    """
+    Parses a segment analysis written by VideoAnalyzer.
+
+    Strict JSON (what Gemini returns in JSON mode) goes through orjson and the SegmentAnalysis model.
+    Older free-form responses — wrapped in code fences, with trailing commas or truncated — fall back to
+    json_repair, so keys in any order and missing optional keys no longer drop the segment.
+
+    Returns:
+        dict: The validated analysis fields, or None if the text holds no usable analysis.
+    """
+    text = CODE_FENCE_PATTERN.sub("", text or "")
+    try:
+        data = _loads(text)
+    except ValueError:
+        if json_repair is None:
+            return None
+        try:
+            data = json_repair.loads(text)
+        except Exception:
+            return None
+    if not isinstance(data, dict) or not data.get("play_by_play"):
+        return None
+    try:
+        return SegmentAnalysis.model_validate(data).model_dump()
+    except ValidationError:
+        return None
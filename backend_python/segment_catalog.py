@@ -0,0 +1,229 @@
+import bisect
+import os
+import threading
+
+from media_utils import extract_segment_number, file_sha256, probe_duration
+
+try:
+    import watchfiles
+except ImportError:  # Fall back to polling the directory
+    watchfiles = None
+
+
+def _order_key(name):
+    """Numbered segments first in numeric order, then everything else by name."""
+    number = extract_segment_number(name)
+    return (number is None, number if number is not None else 0, name)
+
+
+class SegmentCatalog:
+    """
+    An in-memory catalog of the video files in one directory, kept current by a filesystem watcher.
+
+    Each entry holds the name, numeric segment index, duration, size, SHA-256 and mtime of a file.
+    Entries are kept in two sorted lists (playback order and mtime order), so listing is served from a
+    cached snapshot, "latest" is the tail of the mtime list, and pages or segment-number ranges are found
+    with bisect instead of listing and stat-ing the directory on every request.
+
+    The initial scan only stats the files; hashes and durations are filled in by the watcher thread, and
+    are None until then. Changes are picked up with watchfiles when it is installed and by polling otherwise.
+    """
+    def __init__(self, directory, extensions=(".mp4",), segment_index=None, poll_seconds=2.0):
+        """
+        Initializes the SegmentCatalog and scans the directory.
+
+        Args:
+            directory (str): Directory to catalog.
+            extensions (tuple): File extensions to include.
+            segment_index (dict, optional): Segment index as written by segmenter.LiveSegmenter; its durations
+                are used instead of probing the files.
+            poll_seconds (float): Rescan interval when watchfiles is not available.
+        """
+        self.directory = directory
+        self.extensions = tuple(extensions)
+        self.poll_seconds = poll_seconds
+        self._durations = {name: entry.get("duration") for name, entry in ((segment_index or {}).get("segments") or {}).items()}
+        self._entries = {}  # name -> entry dict
+        self._by_order = []  # sorted _order_key(name) tuples
+        self._by_mtime = []  # sorted (mtime_ns, name) tuples
+        self._snapshot = None  # cached list of names in playback order
+        self.version = 0  # bumped on every change, usable as a listing ETag
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(self.directory, exist_ok=True)
+        self._scan()
+
+    def start(self):
+        """Starts the background thread that fills in hashes and durations and then watches the directory."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"catalog-{os.path.basename(self.directory)}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the watcher thread."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def names(self):
+        """Returns all file names in playback order."""
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = [key[2] for key in self._by_order]
+            return self._snapshot
+
+    def get(self, name):
+        """Returns a copy of the entry for `name`, or None."""
+        with self._lock:
+            entry = self._entries.get(name)
+            return dict(entry) if entry else None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def latest(self):
+        """Returns the entry of the most recently modified file, or None when the directory is empty."""
+        with self._lock:
+            return dict(self._entries[self._by_mtime[-1][1]]) if self._by_mtime else None
+
+    def page(self, offset=0, limit=None):
+        """Returns entries [offset, offset + limit) in playback order."""
+        with self._lock:
+            end = len(self._by_order) if limit is None else offset + limit
+            return [dict(self._entries[key[2]]) for key in self._by_order[offset:end]]
+
+    def segment_range(self, first, last):
+        """Returns entries of numbered segments with first <= index <= last, in order."""
+        with self._lock:
+            low = bisect.bisect_left(self._by_order, (False, first, ""))
+            high = bisect.bisect_right(self._by_order, (False, last, "\uffff"))
+            return [dict(self._entries[key[2]]) for key in self._by_order[low:high]]
+
+    def refresh(self, name, describe=True):
+        """
+        Re-reads one file and updates (or removes) its entry. Call it after writing a file so the catalog
+        does not wait for the watcher; with describe=False the hash and duration are left to the watcher.
+        """
+        path = os.path.join(self.directory, os.path.basename(name))
+        if not self._included(path):
+            return None
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._remove(os.path.basename(path))
+            return None
+        entry = self._upsert(os.path.basename(path), stat)
+        if describe and entry["sha256"] is None:
+            self._describe(entry["name"])
+        return self.get(os.path.basename(path))
+
+    def set_duration(self, name, duration):
+        """Records a duration known from elsewhere (e.g. the segmenter's on_segment hook)."""
+        with self._lock:
+            self._durations[name] = duration
+            if name in self._entries:
+                self._entries[name]["duration"] = duration
+
+    def _included(self, path):
+        name = os.path.basename(path)
+        return name.endswith(self.extensions) and not name.startswith(".") and ".tmp" not in name
+
+    def _scan(self):
+        """Stats every file in the directory and reconciles the catalog with it."""
+        seen = set()
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if item.is_file() and self._included(item.path):
+                    seen.add(item.name)
+                    self._upsert(item.name, item.stat())
+        for name in set(self._entries) - seen:
+            self._remove(name)
+
+    def _upsert(self, name, stat):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                return entry
+            if entry:
+                self._by_mtime.pop(bisect.bisect_left(self._by_mtime, (entry["mtime_ns"], name)))
+            else:
+                bisect.insort(self._by_order, _order_key(name))
+                self._snapshot = None
+            bisect.insort(self._by_mtime, (stat.st_mtime_ns, name))
+            entry = {
+                "name": name,
+                "index": extract_segment_number(name),
+                "duration": self._durations.get(name),
+                "size": stat.st_size,
+                "sha256": None,  # Filled in by _describe once the content is known
+                "mtime": stat.st_mtime,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+            self._entries[name] = entry
+            self.version += 1
+            return entry
+
+    def _remove(self, name):
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry is None:
+                return
+            self._by_order.pop(bisect.bisect_left(self._by_order, _order_key(name)))
+            self._by_mtime.pop(bisect.bisect_left(self._by_mtime, (entry["mtime_ns"], name)))
+            self._snapshot = None
+            self.version += 1
+
+    def _describe(self, name):
+        """Computes the hash (and duration when unknown) of one entry outside the lock."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return
+            mtime_ns, needs_duration = entry["mtime_ns"], entry["duration"] is None
+        path = os.path.join(self.directory, name)
+        try:
+            sha256 = file_sha256(path)
+            duration = probe_duration(path) if needs_duration else None
+        except OSError:
+            return  # Removed or replaced meanwhile; the watcher will catch up
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry["mtime_ns"] != mtime_ns:
+                return
+            entry["sha256"] = sha256
+            if needs_duration and entry["duration"] is None:
+                entry["duration"] = duration
+
+    def _run(self):
+        for name in list(self.names()):
+            if self._stop.is_set():
+                return
+            self._describe(name)
+        if watchfiles is not None:
+            self._watch()
+        else:
+            self._poll()
+
+    def _watch(self):
+        try:
+            for changes in watchfiles.watch(self.directory, stop_event=self._stop, recursive=False):
+                for change, path in changes:
+                    if self._included(path):
+                        self.refresh(path)
+        except Exception as e:
+            print(f"Watcher for {self.directory} failed, polling instead: {e}")
+            self._poll()
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self._scan()
+                for name in [name for name, entry in list(self._entries.items()) if entry["sha256"] is None]:
+                    self._describe(name)
+            except Exception as e:
+                print(f"Error rescanning {self.directory}: {e}")
@@ -0,0 +1,43 @@
+import os
+
+from flask import send_file
+from werkzeug.utils import safe_join
+
+from media_utils import file_sha256
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # Finished segments never change once written
+
+
+def resolve_segment(directory, name):
+    """Returns the path of `name` inside `directory`, or None if it escapes the directory or does not exist."""
+    path = safe_join(directory, name)
+    if path is None or not os.path.isfile(path):
+        return None
+    return path
+
+
+def send_segment(path, mimetype="video/mp4", immutable=True):
+    """
+    Sends a finished segment with caching and byte-range support.
+
+    The strong ETag is the SHA-256 of the content and the response is marked immutable, so browsers
+    and CDNs keep the file for a year and revalidation answers with 304. Files that may still change
+    (immutable=False), such as a segment ffmpeg is still writing or a reel that is rebuilt in place, keep
+    the ETag but must be revalidated on every use. conditional=True makes Flask
+    answer Range requests with 206 partial content, and the body is a file wrapper so WSGI servers
+    that support it (e.g. gunicorn) stream it with sendfile without copying it through Python.
+
+    Args:
+        path (str): Path of the segment file.
+        mimetype (str): Content type of the response.
+        immutable (bool): Whether the file is final and will never change.
+
+    Returns:
+        flask.Response: The response to return from the view.
+    """
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=file_sha256(path),
+                         max_age=IMMUTABLE_MAX_AGE if immutable else 0)
+    response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable" if immutable else "no-cache"
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
+
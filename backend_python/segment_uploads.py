@@ -0,0 +1,232 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured size limit."""
+
+
+class EmptyUpload(Exception):
+    """Raised when an upload contains no data."""
+
+
+class UploadOffsetMismatch(Exception):
+    """Raised when a resumable upload chunk does not start where the stored data ends."""
+
+    def __init__(self, expected):
+        super().__init__(f"Upload offset mismatch, expected {expected}")
+        self.expected = expected
+
+
+def new_clip_name(extension=".mp4"):
+    """Returns a fresh name for a saved clip."""
+    return f"video_segment_{uuid.uuid4()}{extension}"
+
+
+def copy_stream(stream, f, limit, written=0, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Copies a file-like stream into an open file chunk by chunk, so memory stays at one chunk
+    whatever the upload size.
+
+    Args:
+        stream: Readable binary stream (e.g. flask.request.stream).
+        f: Writable binary file.
+        limit (int): Maximum total number of bytes, including `written`.
+        written (int): Bytes already in the file.
+        chunk_size (int): Bytes read per chunk.
+
+    Returns:
+        int: Total bytes in the file after the copy.
+
+    Raises:
+        UploadTooLarge: If the stream would grow the file past `limit`.
+    """
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return written
+        written += len(chunk)
+        if written > limit:
+            raise UploadTooLarge(f"Upload exceeds {limit} bytes")
+        f.write(chunk)
+
+
+def save_stream(stream, target_dir, max_bytes, name=None):
+    """
+    Streams an upload to target_dir under a new clip name. The data goes to a temporary file that
+    is renamed into place only once complete, so readers never see a partial clip.
+
+    Returns:
+        str: The name of the saved clip.
+
+    Raises:
+        UploadTooLarge: If the stream is larger than max_bytes.
+        EmptyUpload: If the stream contains no data.
+    """
+    name = name or new_clip_name()
+    path = os.path.join(target_dir, name)
+    tmp_path = os.path.join(target_dir, f".{name}.part")
+    try:
+        with open(tmp_path, "wb") as f:
+            written = copy_stream(stream, f, max_bytes)
+        if not written:
+            raise EmptyUpload("Upload is empty")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return name
+
+
+class UploadSessionManager:
+    """
+    Resumable uploads in the style of the tus protocol: a session is created with an optional total
+    length, chunks are appended at the offset the server reports, and an interrupted client asks for
+    the current offset and continues from there. Session state lives next to the partial data on disk,
+    so sessions survive a server restart until they expire.
+    """
+    def __init__(self, upload_dir, target_dir, max_bytes, session_ttl=3600, on_complete=None):
+        """
+        Initializes the UploadSessionManager.
+
+        Args:
+            upload_dir (str): Directory for partial uploads and their session files.
+            target_dir (str): Directory finished clips are moved to.
+            max_bytes (int): Maximum size of one upload.
+            session_ttl (float): Seconds of inactivity after which a session is discarded.
+            on_complete (callable, optional): Called with the clip name once an upload is finished.
+        """
+        self.upload_dir = upload_dir
+        self.target_dir = target_dir
+        self.max_bytes = max_bytes
+        self.session_ttl = session_ttl
+        self.on_complete = on_complete
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(self.upload_dir, exist_ok=True)
+
+    def create(self, length=None):
+        """
+        Starts a session.
+
+        Args:
+            length (int, optional): Total upload size, when known. The upload completes automatically once
+                this many bytes have been received.
+
+        Returns:
+            dict: The session state (uploadId, offset, length).
+        """
+        if length is not None and length > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        session = {"uploadId": upload_id, "offset": 0, "length": length, "updated_at": time.time()}
+        open(self._data_path(upload_id), "wb").close()
+        self._save(session)
+        return session
+
+    def status(self, upload_id):
+        """Returns the session state, or None for unknown or expired sessions."""
+        return self._load(upload_id)
+
+    def append(self, upload_id, offset, stream):
+        """
+        Appends a chunk that starts at `offset`.
+
+        Returns:
+            dict: The updated session; it includes "clipId" once the upload is complete.
+
+        Raises:
+            KeyError: For unknown sessions.
+            UploadOffsetMismatch: If offset is not where the stored data ends.
+            UploadTooLarge: If the chunk goes past the declared length or the size limit.
+        """
+        with self._lock_for(upload_id):
+            session = self._load(upload_id)
+            if session is None:
+                raise KeyError(upload_id)
+            if offset != session["offset"]:
+                raise UploadOffsetMismatch(session["offset"])
+            limit = session["length"] if session["length"] is not None else self.max_bytes
+            with open(self._data_path(upload_id), "r+b") as f:
+                f.seek(offset)
+                f.truncate()  # Drop bytes of a chunk that was cut off before its offset was recorded
+                try:
+                    session["offset"] = copy_stream(stream, f, limit, written=offset)
+                except UploadTooLarge:
+                    f.truncate(offset)
+                    raise
+            session["updated_at"] = time.time()
+            self._save(session)
+            if session["length"] is not None and session["offset"] == session["length"]:
+                return self._finish(session)
+            return session
+
+    def complete(self, upload_id):
+        """Finishes a session whose length was not declared up front. Returns the session with "clipId"."""
+        with self._lock_for(upload_id):
+            session = self._load(upload_id)
+            if session is None:
+                raise KeyError(upload_id)
+            if session["length"] is not None and session["offset"] != session["length"]:
+                raise UploadOffsetMismatch(session["offset"])
+            return self._finish(session)
+
+    def expire(self):
+        """Deletes sessions that have been idle for longer than session_ttl."""
+        cutoff = time.time() - self.session_ttl
+        for name in os.listdir(self.upload_dir):
+            if name.endswith(".json"):
+                session = self._load(name[:-len(".json")], check_expiry=False)
+                if session and session["updated_at"] < cutoff:
+                    self._discard(session["uploadId"])
+
+    def _finish(self, session):
+        upload_id = session["uploadId"]
+        clip_name = new_clip_name()
+        os.replace(self._data_path(upload_id), os.path.join(self.target_dir, clip_name))
+        self._discard(upload_id)
+        if self.on_complete:
+            self.on_complete(clip_name)
+        return dict(session, clipId=clip_name)
+
+    def _discard(self, upload_id):
+        for path in (self._data_path(upload_id), self._session_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+
+    def _load(self, upload_id, check_expiry=True):
+        if not all(c in "0123456789abcdef" for c in upload_id):
+            return None  # Upload ids are uuid hex strings; anything else could escape upload_dir
+        try:
+            with open(self._session_path(upload_id), "r") as f:
+                session = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if check_expiry and session["updated_at"] < time.time() - self.session_ttl:
+            self._discard(upload_id)
+            return None
+        return session
+
+    def _save(self, session):
+        path = self._session_path(session["uploadId"])
+        with open(path + ".tmp", "w") as f:
+            json.dump(session, f)
+        os.replace(path + ".tmp", path)
+
+    def _data_path(self, upload_id):
+        return os.path.join(self.upload_dir, f"{upload_id}.part")
+
+    def _session_path(self, upload_id):
+        return os.path.join(self.upload_dir, f"{upload_id}.json")
+
+    def _lock_for(self, upload_id):
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())
@@ -0,0 +1,229 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import ffmpeg
+
+from media_utils import extract_segment_number, probe_duration
+
+SEGMENT_INDEX_FILE = "segment_index.json"
+
+
+def load_segment_index(segment_dir):
+    """
+    Loads the segment index written by LiveSegmenter (or index_existing_segments) for segment_dir.
+
+    Returns:
+        dict: The index, or None when the directory has no index yet.
+    """
+    path = os.path.join(segment_dir, SEGMENT_INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_segment_index(segment_dir, index):
+    """Atomically writes the segment index for segment_dir."""
+    path = os.path.join(segment_dir, SEGMENT_INDEX_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def index_existing_segments(segment_dir, segment_seconds=30):
+    """
+    Builds an index for a directory of segments that were produced elsewhere (e.g. the pre-populated
+    segments/ folder). Such segments were cut from the game every segment_seconds, so segment N starts at
+    N * segment_seconds of the game video (the timeline the frontend, the stored time metadata and the
+    GUMBO lead-in use); its probed duration only sets where it ends, since a file may be shorter than its slot.
+
+    Returns:
+        dict: The index that was written.
+    """
+    names = sorted((name for name in os.listdir(segment_dir)
+                    if name.endswith(".mp4") and extract_segment_number(name) is not None), key=extract_segment_number)
+    index = {"source": None, "segment_seconds": segment_seconds, "started_at": None, "layout": "grid", "segments": {}}
+    for name in names:
+        number = extract_segment_number(name)
+        duration = probe_duration(os.path.join(segment_dir, name)) or float(segment_seconds)
+        start = number * segment_seconds
+        index["segments"][name] = {"index": number, "start": float(start),
+                                   "end": round(start + duration, 3), "duration": round(duration, 3)}
+    save_segment_index(segment_dir, index)
+    return index
+
+
+def needs_reindex(index):
+    """
+    Returns whether a directory's index must be (re)built by index_existing_segments: it has none, or it has an
+    old one that chained probed durations instead of placing segments on the segment_seconds grid.
+    """
+    return index is None or (index.get("source") is None and index.get("layout") != "grid")
+
+
+class LiveSegmenter:
+    """
+    Splits an input file or live stream into baseball_segment_NNN.mp4 files with ffmpeg's segment muxer.
+
+    Streams are copied, not re-encoded, so cuts land on the first keyframe after each segment_seconds
+    boundary and the segmenter runs far faster than real time on a single core. Every finished segment
+    is recorded with its start and end offsets in segment_index.json inside the output directory, which
+    is what the rest of the backend uses to map segments to video time.
+    """
+    def __init__(self, source, output_dir="segments", segment_seconds=30, base_name="baseball_segment", on_segment=None):
+        """
+        Initializes the LiveSegmenter.
+
+        Args:
+            source (str): Input file path or stream URL (anything ffmpeg can read).
+            output_dir (str): Directory the segments and the index are written to.
+            segment_seconds (float): Target segment length in seconds.
+            base_name (str): Segment file name prefix.
+            on_segment (callable, optional): Called with (segment_name, entry) whenever a segment is finished.
+        """
+        self.source = source
+        self.output_dir = output_dir
+        self.segment_seconds = segment_seconds
+        self.base_name = base_name
+        self.on_segment = on_segment
+        self._list_path = os.path.join(output_dir, f".{base_name}_list.csv")
+        self._process = None
+        self._tail_thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        self.index = load_segment_index(self.output_dir) or {"segments": {}}
+        self.index.update({"source": source, "segment_seconds": segment_seconds})
+        self.index.setdefault("started_at", None)
+
+    def start(self):
+        """Starts ffmpeg and the thread that records finished segments. Returns immediately."""
+        existing = self.index["segments"].values()
+        start_number = max((entry["index"] for entry in existing), default=-1) + 1  # Continue numbering after a restart
+        self._time_offset = max((entry["end"] for entry in existing), default=0.0)
+        self.index["started_at"] = self.index["started_at"] or datetime.now(timezone.utc).isoformat()
+        if os.path.exists(self._list_path):
+            os.remove(self._list_path)
+
+        self._process = (
+            ffmpeg
+            .input(self.source)
+            .output(
+                os.path.join(self.output_dir, f"{self.base_name}_%03d.mp4"),
+                f="segment",
+                c="copy",
+                map="0",
+                segment_time=self.segment_seconds,
+                segment_start_number=start_number,
+                reset_timestamps=1,
+                segment_format_options="movflags=+faststart",
+                segment_list=self._list_path,
+                segment_list_type="csv",
+                segment_list_flags="+live",
+            )
+            .global_args("-loglevel", "error", "-nostats")
+            .overwrite_output()
+            .run_async(pipe_stdin=True)  # stdin stays open so stop() can send 'q'
+        )
+        self._stop.clear()
+        self._tail_thread = threading.Thread(target=self._tail_segment_list, name="segmenter-index", daemon=True)
+        self._tail_thread.start()
+        print(f"Segmenting {self.source} into {self.output_dir} from segment {start_number}")
+
+    def wait(self):
+        """Blocks until the input ends (or ffmpeg exits) and all segments are indexed."""
+        if self._process:
+            self._process.wait()
+        self._stop.set()
+        if self._tail_thread:
+            self._tail_thread.join()
+        return self.index
+
+    def is_running(self):
+        """Returns whether ffmpeg is still producing segments."""
+        return self._process is not None and self._process.poll() is None
+
+    def is_finished(self, name):
+        """Returns whether ffmpeg has finished writing segment `name` (it is recorded in the segment index)."""
+        with self._lock:
+            return name in self.index["segments"]
+
+    def stop(self):
+        """Stops ffmpeg gracefully, letting it finish the current segment."""
+        if self._process and self._process.poll() is None:
+            self._process.communicate(input=b"q")  # 'q' on stdin asks ffmpeg to finalize and exit
+        return self.wait()
+
+    def _tail_segment_list(self):
+        """Follows the CSV segment list ffmpeg appends to ("name,start,end" per finished segment)."""
+        position = 0
+        while True:
+            finished = self._stop.is_set()
+            if os.path.exists(self._list_path):
+                with open(self._list_path, "rb") as f:
+                    f.seek(position)
+                    data = f.read()
+                complete = data[:data.rfind(b"\n") + 1]  # Only consume whole lines
+                position += len(complete)
+                for row in csv.reader(complete.decode().splitlines()):
+                    if len(row) >= 3:
+                        self._record_segment(row[0], float(row[1]), float(row[2]))
+            if finished:
+                return
+            time.sleep(0.5)
+
+    def _record_segment(self, name, start, end):
+        entry = {
+            "index": extract_segment_number(name),
+            "start": round(self._time_offset + start, 3),
+            "end": round(self._time_offset + end, 3),
+            "duration": round(end - start, 3),
+        }
+        with self._lock:
+            self.index["segments"][name] = entry
+            save_segment_index(self.output_dir, self.index)
+        print(f"Segment ready: {name} ({entry['start']}s - {entry['end']}s)")
+        if self.on_segment:
+            try:
+                self.on_segment(name, entry)
+            except Exception as e:
+                print(f"Segment listener failed for {name}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a game video or live stream into indexed segments (stream copy).")
+    parser.add_argument("source", nargs="?", help="Input file or stream URL")
+    parser.add_argument("--output-dir", default="segments")
+    parser.add_argument("--segment-seconds", type=float, default=30)
+    parser.add_argument("--base-name", default="baseball_segment")
+    parser.add_argument("--index-only", action="store_true", help="Only (re)build the index for existing segments")
+    args = parser.parse_args()
+
+    if args.index_only:
+        index = index_existing_segments(args.output_dir, args.segment_seconds)
+        print(f"Indexed {len(index['segments'])} segments in {args.output_dir}")
+        return
+    if not args.source:
+        parser.error("source is required unless --index-only is given")
+    start = time.perf_counter()
+    segmenter = LiveSegmenter(args.source, args.output_dir, args.segment_seconds, args.base_name)
+    segmenter.start()
+    try:
+        index = segmenter.wait()
+    except KeyboardInterrupt:
+        index = segmenter.stop()
+    elapsed = time.perf_counter() - start
+    media_seconds = max((entry["end"] for entry in index["segments"].values()), default=0.0)
+    print(f"Wrote {len(index['segments'])} segments covering {media_seconds:.1f}s of video in {elapsed:.1f}s "
+          f"({media_seconds / elapsed if elapsed else 0:.1f}x real time)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from opentelemetry import context, metrics, trace
+
+SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "curveball-backend")
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)  # Stage duration buckets (seconds)
+
+STAGE_KEY = context.create_key("curveball.stage")  # Name of the innermost stage, carried in the trace context
+
+tracer = trace.get_tracer("curveball")
+meter = metrics.get_meter("curveball")
+
+
+class StageMetrics:
+    """
+    In-process stage histograms and counters, rendered in the Prometheus text format for /metrics.
+
+    The same observations are recorded on OpenTelemetry instruments, which export to an OTLP collector once
+    configure() has installed a meter provider (and are no-ops otherwise).
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}  # Stage -> [bucket counts..., +Inf count, sum]
+        self._counters = {}  # (metric, sorted label items) -> value
+        self._lock = threading.Lock()
+        self._duration = meter.create_histogram("curveball.stage.duration", unit="s", description="Duration of a request stage")
+        self._otel_counters = {}
+
+    def observe(self, stage, seconds):
+        """Records one duration of a stage."""
+        with self._lock:
+            histogram = self._histograms.setdefault(stage, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[len(self.buckets)] += 1
+            histogram[-1] += seconds
+        self._duration.record(seconds, {"stage": stage})
+
+    def increment(self, metric, value=1, **labels):
+        """Adds value to a counter, e.g. increment("llm_tokens", 120, stage="gemini.generate", kind="prompt")."""
+        if not value:
+            return
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            counter = self._otel_counters.get(metric)
+            if counter is None:
+                counter = self._otel_counters[metric] = meter.create_counter(f"curveball.{metric}")
+        counter.add(value, labels)
+
+    def render(self):
+        """Returns every histogram and counter in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {stage: list(values) for stage, values in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = ["# HELP curveball_stage_duration_seconds Duration of request stages.",
+                 "# TYPE curveball_stage_duration_seconds histogram"]
+        for stage, values in sorted(histograms.items()):
+            label = f'stage="{_escape(stage)}"'
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'curveball_stage_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'curveball_stage_duration_seconds_bucket{{{label},le="+Inf"}} {values[len(self.buckets)]}')
+            lines.append(f"curveball_stage_duration_seconds_sum{{{label}}} {values[-1]:.6f}")
+            lines.append(f"curveball_stage_duration_seconds_count{{{label}}} {values[len(self.buckets)]}")
+        for metric in sorted({metric for metric, _ in counters}):
+            lines.append(f"# TYPE curveball_{metric}_total counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    rendered = ",".join(f'{key}="{_escape(str(item))}"' for key, item in labels)
+                    lines.append(f"curveball_{metric}_total{{{rendered}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+stage_metrics = StageMetrics()
+
+
+def configure(service_name=SERVICE_NAME):
+    """
+    Installs the OpenTelemetry SDK providers, so spans are recorded. When OTEL_EXPORTER_OTLP_ENDPOINT is set
+    (e.g. http://localhost:4317 for a local collector), spans and the stage metrics are exported over OTLP.
+    """
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.metrics import MeterProvider
+
+    resource = Resource.create({"service.name": service_name})
+    tracer_provider = TracerProvider(resource=resource)
+    readers = []
+    if os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+
+        tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        readers.append(PeriodicExportingMetricReader(OTLPMetricExporter()))
+        print(f"Exporting traces and metrics to {os.environ['OTEL_EXPORTER_OTLP_ENDPOINT']}")
+    trace.set_tracer_provider(tracer_provider)
+    metrics.set_meter_provider(MeterProvider(resource=resource, metric_readers=readers))
+
+
+@contextmanager
+def stage(name, **attributes):
+    """
+    Runs a block as a span named after the stage and records its duration in the stage histogram. Exceptions
+    are recorded on the span and counted per stage, then re-raised.
+    """
+    start = time.perf_counter()
+    with tracer.start_as_current_span(name, attributes={key: value for key, value in attributes.items() if value is not None}) as span:
+        token = context.attach(context.set_value(STAGE_KEY, name))
+        try:
+            yield span
+        except BaseException:
+            stage_metrics.increment("stage_errors", stage=name)
+            raise
+        finally:
+            context.detach(token)
+            stage_metrics.observe(name, time.perf_counter() - start)
+
+
+def traced(name):
+    """Decorator form of stage()."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_usage(usage, span=None):
+    """
+    Adds LLM token counts to the current span and the token counters. Accepts Gemini usage metadata
+    (prompt_token_count, candidates_token_count), CrewAI UsageMetrics and LiteLLM usage (prompt_tokens,
+    completion_tokens), or None.
+    """
+    if usage is None:
+        return
+    span = span or trace.get_current_span()
+    prompt = getattr(usage, "prompt_token_count", None) or getattr(usage, "prompt_tokens", None) or 0
+    completion = getattr(usage, "candidates_token_count", None) or getattr(usage, "completion_tokens", None) or 0
+    name = context.get_value(STAGE_KEY) or "unknown"
+    span.set_attribute("llm.prompt_tokens", prompt)
+    span.set_attribute("llm.completion_tokens", completion)
+    stage_metrics.increment("llm_tokens", prompt, stage=name, kind="prompt")
+    stage_metrics.increment("llm_tokens", completion, stage=name, kind="completion")
+
+
+def record_cache(cache, hits=0, misses=0, span=None):
+    """Adds cache hit/miss counts to the current span and the cache counters."""
+    span = span or trace.get_current_span()
+    span.set_attribute(f"cache.{cache}.hits", hits)
+    span.set_attribute(f"cache.{cache}.misses", misses)
+    stage_metrics.increment("cache_requests", hits, cache=cache, result="hit")
+    stage_metrics.increment("cache_requests", misses, cache=cache, result="miss")
+
+
+def bind(function, wait_stage=None):
+    """
+    Returns function bound to the current trace context, for running it on another thread (the job scheduler,
+    asyncio.run), so its spans stay children of the request. With wait_stage, the time until the function
+    starts (its queue wait) is recorded under that stage.
+    """
+    parent = context.get_current()
+    submitted = time.perf_counter()
+
+    @wraps(function)
+    def run(*args, **kwargs):
+        if wait_stage:
+            stage_metrics.observe(wait_stage, time.perf_counter() - submitted)
+        token = context.attach(parent)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            context.detach(token)
+    return run
+
+
+class TracedCalls:
+    """Proxies an API object and runs the named methods as stages, recording token usage of their responses."""
+    def __init__(self, target, stages):
+        """
+        Initializes the TracedCalls.
+
+        Args:
+            target (object): The object to proxy, e.g. a google-genai Models or Files object.
+            stages (dict): Method name -> stage name.
+        """
+        self._target = target
+        self._stages = stages
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if name not in self._stages:
+            return attribute
+
+        @wraps(attribute)
+        def call(*args, **kwargs):
+            model = kwargs.get("model") or getattr(self._target, "model_name", None)
+            with stage(self._stages[name], **{"llm.model": model}) as span:
+                result = attribute(*args, **kwargs)
+                record_usage(getattr(result, "usage_metadata", None), span)
+                return result
+        return call
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
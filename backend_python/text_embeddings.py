@@ -0,0 +1,61 @@
+import re
+import zlib
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def normalize_text(text):
+    """Lower-cases text and collapses everything but words and numbers into single spaces."""
+    return " ".join(TOKEN_PATTERN.findall((text or "").lower()))
+
+
+class HashingEmbedder:
+    """
+    A local, dependency-light text embedder based on feature hashing.
+
+    Word unigrams, word bigrams and character trigrams are hashed into a fixed number of buckets
+    (crc32, so vectors are stable across processes) and the result is L2-normalized, so the dot product
+    of two vectors is their cosine similarity. It measures word and subword overlap only: paraphrases that
+    share few words ("who is batting?" / "who's batting now") score low, and questions that differ in the one
+    word that matters ("3rd inning" / "4th inning") score above 0.9. That is enough for the router's
+    nearest-neighbour vote and an offline index, but not for deciding that two questions have the same answer.
+    """
+    def __init__(self, dim=512, char_ngrams=3):
+        """
+        Initializes the HashingEmbedder.
+
+        Args:
+            dim (int): Number of hash buckets (vector size).
+            char_ngrams (int): Length of the character n-grams (0 disables them).
+        """
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+
+    def features(self, text):
+        """Returns the weighted string features of a text."""
+        words = normalize_text(text).split()
+        features = [(f"w:{word}", 1.0) for word in words]
+        features += [(f"b:{a} {b}", 1.0) for a, b in zip(words, words[1:])]
+        if self.char_ngrams:
+            for word in words:
+                padded = f"#{word}#"
+                features += [(f"c:{padded[i:i + self.char_ngrams]}", 0.5)
+                             for i in range(max(1, len(padded) - self.char_ngrams + 1))]
+        return features
+
+    def embed(self, text):
+        """Returns the float32 unit vector of a text (all zeros for empty text)."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self.features(text):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            vector[digest % self.dim] += weight if digest & 0x80000000 else -weight  # Signed hashing limits collision bias
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_many(self, texts):
+        """Returns a (len(texts), dim) float32 matrix of unit vectors."""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self.embed(text) for text in texts])
@@ -0,0 +1,372 @@
+import json
+import operator
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from telemetry import bind, stage
+
+TIME_OPERATORS = {
+    "LT": operator.lt,
+    "GT": operator.gt,
+    "EQ": operator.eq,
+    "NE": operator.ne,
+    "LE": operator.le,
+    "GE": operator.ge,
+}
+NUMERIC_KEYS = ("time", "inning")  # Compared with the filter operator; other keys match their string value
+
+
+def parse_filters(filters):
+    """
+    Normalizes a VectorSearchFilter-shaped dict (or a list of them, all of which must match) into
+    (key, operator, value) triples. Time and inning filters compare numerically with the given operator;
+    event-type filters (is_major, homerun, out) match the string value. Empty dicts and empty keys mean
+    no filter.
+
+    Raises:
+        ValueError: If a time or inning filter has an unknown operator.
+    """
+    if not filters:
+        return []
+    parsed = []
+    for item in filters if isinstance(filters, (list, tuple)) else [filters]:
+        if not item or not item.get("key"):
+            continue
+        if item["key"] in NUMERIC_KEYS:
+            operator_str = item.get("operator")
+            if operator_str not in TIME_OPERATORS:
+                raise ValueError(f"Invalid filter operator: {operator_str}")
+            parsed.append((item["key"], operator_str, float(item["value"])))
+        else:
+            parsed.append((item["key"], "EQ", str(item["value"])))
+    return parsed
+
+
+def embed_query(embedder, text):
+    """Embeds a query with a LlamaIndex embedding model or a local embedder exposing embed()."""
+    if hasattr(embedder, "get_query_embedding"):
+        return embedder.get_query_embedding(text)
+    return embedder.embed(text)
+
+
+def embed_texts(embedder, texts):
+    """Embeds documents with a LlamaIndex embedding model or a local embedder exposing embed_many()."""
+    if hasattr(embedder, "get_text_embedding_batch"):
+        return embedder.get_text_embedding_batch(list(texts))
+    return embedder.embed_many(list(texts))
+
+
+def embed_in_batches(embedder, texts, batch_size=32, max_workers=4, max_retries=3, retry_wait=2.0):
+    """
+    Embeds texts in batches, with up to max_workers batches in flight at once. Failed batches (and only
+    those) are retried up to max_retries times with exponential backoff.
+
+    Args:
+        embedder (object): LlamaIndex embedding model or local embedder (see embed_texts).
+        texts (list): Texts to embed.
+        batch_size (int): Texts per embedding call.
+        max_workers (int): Concurrent embedding calls.
+        max_retries (int): Retries of a failed batch.
+        retry_wait (float): Seconds before the first retry; doubled after every round.
+
+    Returns:
+        list: One embedding per text, or None for texts whose batch failed after all retries.
+    """
+    texts = list(texts)
+    embeddings = [None] * len(texts)
+    pending = [(start, texts[start:start + batch_size]) for start in range(0, len(texts), max(1, batch_size))]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for attempt in range(max_retries + 1):
+            if attempt:
+                print(f"Retrying {len(pending)} failed embedding batch(es), attempt {attempt}/{max_retries}...")
+                time.sleep(retry_wait * 2 ** (attempt - 1))
+            futures = [(start, batch, executor.submit(bind(_embed_batch), embedder, batch)) for start, batch in pending]
+            failed = []
+            for start, batch, future in futures:
+                try:
+                    vectors = future.result()
+                    if len(vectors) != len(batch):
+                        raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+                    embeddings[start:start + len(batch)] = vectors
+                except Exception as e:
+                    print(f"Embedding batch at record {start} failed: {e}")
+                    failed.append((start, batch))
+            pending = failed
+            if not pending:
+                break
+    return embeddings
+
+
+def _embed_batch(embedder, batch):
+    with stage("embedding.batch", texts=len(batch)):
+        return embed_texts(embedder, batch)
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class LocalVectorBackend:
+    """
+    An in-process vector index for a single game's chunks.
+
+    Embeddings are kept L2-normalized in one contiguous float32 matrix, so a search is a metadata pre-filter
+    followed by one matrix-vector product and a partial sort — a few hundred 30-second chunks are searched in
+    well under a millisecond, with no network round trip. Numeric keys (time, inning) are pre-filtered by
+    binary search over precomputed sorted arrays and event keys by precomputed per-value bitmaps; both are
+    rebuilt lazily after a change. Filters have the same semantics as the Vertex backend. The index is
+    persisted to `path` (vectors.npy and records.json) after every change and loaded from there at start-up.
+    """
+    def __init__(self, path, embedder):
+        """
+        Initializes the LocalVectorBackend and loads a persisted index.
+
+        Args:
+            path (str): Directory holding the persisted index; None keeps it in memory only.
+            embedder (object): LlamaIndex embedding model or local embedder (e.g. HashingEmbedder) used for
+                queries and for add_texts(). The same embedder must be used for ingestion and search.
+        """
+        self.path = path
+        self.embedder = embedder
+        self._lock = threading.Lock()
+        self._records = []  # {"id", "text", "metadata"} in matrix row order
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._columns = {}  # Metadata key -> sorted array or per-value bitmaps, built lazily for filtering
+        self.version = 0  # Bumped on every change so derived indexes (e.g. BM25) know when to rebuild
+        if path and os.path.exists(os.path.join(path, "records.json")):
+            self._load()
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, records):
+        """
+        Adds or replaces records.
+
+        Args:
+            records (list): Dicts with "text", "embedding" and "metadata", and optionally "id" (a record with an
+                existing id replaces it).
+        """
+        records = list(records)
+        if not records:
+            return
+        vectors = np.asarray([record["embedding"] for record in records], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1.0)
+        with self._lock:
+            if len(self._records) and self._matrix.shape[1] != vectors.shape[1]:
+                raise ValueError(f"Embedding size {vectors.shape[1]} does not match the index ({self._matrix.shape[1]})")
+            current = list(self._records)  # Copied so snapshots handed out earlier stay consistent
+            positions = {record["id"]: row for row, record in enumerate(current)}
+            matrix = self._matrix.copy() if len(current) else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            new_rows = []
+            for record, vector in zip(records, vectors):
+                entry = {"id": record.get("id") or str(uuid.uuid4()), "text": record["text"], "metadata": dict(record.get("metadata") or {})}
+                row = positions.get(entry["id"])
+                if row is None:
+                    positions[entry["id"]] = len(current) + len(new_rows)
+                    new_rows.append((entry, vector))
+                else:
+                    current[row] = entry
+                    matrix[row] = vector
+            if new_rows:
+                current += [entry for entry, _ in new_rows]
+                matrix = np.vstack([matrix, np.stack([vector for _, vector in new_rows])])
+            self._records, self._matrix = current, np.ascontiguousarray(matrix)
+            self._changed()
+
+    def add_texts(self, texts, metadatas, ids=None):
+        """Embeds texts with the backend's embedder and adds them with their metadata."""
+        embeddings = embed_texts(self.embedder, texts)
+        ids = ids or [None] * len(texts)
+        self.add({"id": id_, "text": text, "embedding": embedding, "metadata": metadata}
+                 for id_, text, embedding, metadata in zip(ids, texts, embeddings, metadatas))
+
+    def delete(self, ids):
+        """Removes records by id."""
+        ids = set(ids)
+        with self._lock:
+            keep = [row for row, record in enumerate(self._records) if record["id"] not in ids]
+            if len(keep) == len(self._records):
+                return
+            self._records = [self._records[row] for row in keep]
+            self._matrix = np.ascontiguousarray(self._matrix[keep])
+            self._changed()
+
+    def clear(self):
+        """Removes every record."""
+        with self._lock:
+            self._records, self._matrix = [], np.zeros((0, 0), dtype=np.float32)
+            self._changed()
+
+    def search(self, query, filters=None, top_k=10):
+        """
+        Returns the top_k chunks most similar to query among those matching filters.
+
+        Returns:
+            list: Chunk dicts with "id", "text", "score" and "metadata", most similar first.
+        """
+        return self.search_vector(embed_query(self.embedder, query), filters, top_k)
+
+    def search_vector(self, vector, filters=None, top_k=10):
+        """Same as search() for an already embedded query."""
+        records, matrix, rows, _ = self.snapshot(filters)
+        if not len(rows):
+            return []
+        scores = self.dense_scores(matrix, rows, vector)
+        k = min(top_k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [{"id": records[rows[i]]["id"], "text": records[rows[i]]["text"], "score": float(scores[i]),
+                 "metadata": records[rows[i]]["metadata"]} for i in best]
+
+    def snapshot(self, filters=None):
+        """
+        Returns a consistent view for one search: (records, matrix, rows matching filters, version). The
+        returned lists and arrays are never mutated in place, so they can be used without holding the lock.
+        """
+        conditions = parse_filters(filters)
+        with self._lock:
+            records, matrix = self._records, self._matrix
+            rows = np.arange(len(records))
+            for key, operator_str, value in conditions:
+                if not len(rows):
+                    break
+                rows = np.intersect1d(rows, self._matching_rows(key, operator_str, value), assume_unique=True)
+            return records, matrix, rows, self.version
+
+    @staticmethod
+    def dense_scores(matrix, rows, vector):
+        """Returns the cosine similarity of the query vector to the given rows of the matrix."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return matrix[rows] @ (vector / norm if norm else vector)
+
+    def _matching_rows(self, key, operator_str, value):
+        """Returns the sorted row numbers where the metadata key matches. Caller holds the lock."""
+        if key in NUMERIC_KEYS:
+            order, values = self._sorted_column(key)
+            left, right = np.searchsorted(values, value, "left"), np.searchsorted(values, value, "right")
+            known = np.count_nonzero(~np.isnan(values))  # Rows missing the key sort last and never match
+            selected = {
+                "LT": order[:left], "LE": order[:right], "EQ": order[left:right],
+                "GT": order[right:known], "GE": order[left:known],
+                "NE": np.concatenate([order[:left], order[right:known]]),
+            }[operator_str]
+            return np.sort(selected)
+        bitmaps = self._columns.get(key)
+        if bitmaps is None:
+            bitmaps = {}
+            for row, record in enumerate(self._records):
+                bitmaps.setdefault(str(record["metadata"].get(key)), []).append(row)
+            bitmaps = self._columns[key] = {item: np.array(rows) for item, rows in bitmaps.items()}
+        return bitmaps.get(value, np.zeros(0, dtype=np.int64))
+
+    def _sorted_column(self, key):
+        """Returns (row order, sorted values) of a numeric metadata key; missing values are NaN. Caller holds the lock."""
+        if key not in self._columns:
+            values = np.array([_as_float(record["metadata"].get(key)) for record in self._records], dtype=np.float64)
+            order = np.argsort(values, kind="stable")
+            self._columns[key] = (order, values[order])
+        return self._columns[key]
+
+    def _changed(self):
+        """Drops derived indexes and persists the index. Caller holds the lock."""
+        self._columns = {}
+        self.version += 1
+        self._save()
+
+    def _save(self):
+        """Persists the index atomically. Caller holds the lock."""
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        vectors_path = os.path.join(self.path, "vectors.npy")
+        records_path = os.path.join(self.path, "records.json")
+        with open(vectors_path + ".tmp", "wb") as f:
+            np.save(f, self._matrix)
+        with open(records_path + ".tmp", "w") as f:
+            json.dump(self._records, f)
+        os.replace(vectors_path + ".tmp", vectors_path)
+        os.replace(records_path + ".tmp", records_path)
+
+    def _load(self):
+        with open(os.path.join(self.path, "records.json"), "r") as f:
+            records = json.load(f)
+        matrix = np.load(os.path.join(self.path, "vectors.npy"))
+        if len(records) != len(matrix):
+            print(f"Local vector index at {self.path} is inconsistent ({len(records)} records, {len(matrix)} vectors); starting empty.")
+            return
+        self._records, self._matrix = records, np.ascontiguousarray(matrix, dtype=np.float32)
+
+
+class VertexVectorBackend:
+    """
+    The Vertex AI Vector Search index behind LlamaIndex, for corpora spanning many games. Searches go to the
+    remote endpoint; filters are translated into LlamaIndex MetadataFilters.
+    """
+    def __init__(self, index, embedder=None, max_retrievers=64):
+        """
+        Initializes the VertexVectorBackend.
+
+        Args:
+            index (VectorStoreIndex): LlamaIndex index over a VertexAIVectorStore.
+            embedder (object, optional): Embeds queries (e.g. a CachedEmbedding); by default the index's own
+                embedding model does.
+            max_retrievers (int): Retrievers kept for reuse, one per distinct (filters, top_k).
+        """
+        self.index = index
+        self.embedder = embedder
+        self.max_retrievers = max_retrievers
+        self._retrievers = OrderedDict()  # (conditions, top_k) -> retriever, least recently used first
+        self._lock = threading.Lock()
+
+    def search(self, query, filters=None, top_k=10):
+        """Returns the top_k chunks most similar to query among those matching filters, most similar first."""
+        from llama_index.core.schema import QueryBundle
+
+        retriever = self.retriever(filters, top_k)
+        embedding = embed_query(self.embedder, query) if self.embedder else None  # The retriever skips embedding when given one
+        return [{"id": row.node.node_id, "text": row.get_text(), "score": row.get_score(), "metadata": row.metadata}
+                for row in retriever.retrieve(QueryBundle(query_str=query, embedding=embedding))]
+
+    def retriever(self, filters=None, top_k=10):
+        """Returns the retriever for (filters, top_k), creating it only the first time that pair is searched."""
+        key = (repr(parse_filters(filters)), top_k)
+        with self._lock:
+            retriever = self._retrievers.get(key)
+            if retriever is not None:
+                self._retrievers.move_to_end(key)
+                return retriever
+        retriever = self.index.as_retriever(filters=self.metadata_filters(filters), similarity_top_k=top_k)
+        with self._lock:
+            self._retrievers[key] = retriever
+            while len(self._retrievers) > self.max_retrievers:
+                self._retrievers.popitem(last=False)
+        return retriever
+
+    @staticmethod
+    def metadata_filters(filters):
+        """
+        Converts filters into LlamaIndex MetadataFilters (an empty list when there are none). Numeric keys keep
+        their operator, as in LocalVectorBackend; other keys are matched for equality.
+        """
+        from llama_index.core.vector_stores.types import MetadataFilters, MetadataFilter, FilterOperator
+
+        conditions = parse_filters(filters)
+        if not conditions:
+            return []
+        return MetadataFilters(filters=[
+            MetadataFilter(key=key, value=value, operator=getattr(FilterOperator, operator_str)) if key in NUMERIC_KEYS
+            else MetadataFilter(key=key, value=value)
+            for key, operator_str, value in conditions
+        ])
@@ -0,0 +1,179 @@
+import threading
+import time
+
+from google.cloud import aiplatform
+from crewai_tools import SerperDevTool, ScrapeWebsiteTool
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.vector_stores.vertexaivectorsearch import VertexAIVectorStore
+
+from text_embeddings import HashingEmbedder
+from vector_backends import LocalVectorBackend, VertexVectorBackend, embed_query
+from hybrid_retrieval import HybridRetriever
+from embedding_cache import CachedEmbedding
+from llm_clients import text_embedding
+
+
+class VertexConnectionManager:
+    """
+    Creates the retrieval stack on first use instead of at import: the Vertex AI SDK, the Matching Engine index
+    and endpoint, the VertexAIVectorStore, the text embedding model, the LlamaIndex index, the vector backend
+    with its retriever, and the web search tools.
+
+    Each resource is built once, under a lock, and shared by every request, so the SDK clients and their gRPC
+    channels are opened once per process and reused; a failed build is retried on the next use instead of
+    failing the import. Build times are recorded per resource and reported by status().
+    """
+    def __init__(self, backend="vertex", project_id=None, region=None, index_id=None, endpoint_id=None, gcs_bucket_name=None,
+                 local_dir=None, embeddings="vertex", embedding_cache=None, credentials_path="1.json",
+                 embed_model_name="textembedding-gecko@003", embed_location="us-central1"):
+        """
+        Initializes the VertexConnectionManager. Nothing is connected until a resource is first requested.
+
+        Args:
+            backend (str): "vertex" (Vertex AI Vector Search) or "local" (in-process index).
+            project_id (str): Google Cloud project ID.
+            region (str): Region of the Vector Search index.
+            index_id (str): ID of the Matching Engine index.
+            endpoint_id (str): ID of the Matching Engine index endpoint.
+            gcs_bucket_name (str): Bucket backing the Vertex AI Vector Store.
+            local_dir (str): Where the local index is persisted.
+            embeddings (str): "vertex" or "hashing" (local, fully offline) for the local index.
+            embedding_cache (EmbeddingCache, optional): Persistent cache in front of the Vertex embedding model.
+            credentials_path (str): Service account key file.
+            embed_model_name (str): Vertex AI text embedding model.
+            embed_location (str): Region of the embedding model.
+        """
+        self.backend_name = backend
+        self.project_id = project_id
+        self.region = region
+        self.index_id = index_id
+        self.endpoint_id = endpoint_id
+        self.gcs_bucket_name = gcs_bucket_name
+        self.local_dir = local_dir
+        self.embeddings = embeddings
+        self.embedding_cache = embedding_cache
+        self.credentials_path = credentials_path
+        self.embed_model_name = embed_model_name
+        self.embed_location = embed_location
+        self.timings = {}  # Resource -> seconds its build took
+        self.errors = {}  # Resource -> error of its last failed build
+        self._resources = {}
+        self._lock = threading.RLock()  # Reentrant: builders request the resources they depend on
+
+    def embed_model(self):
+        """Returns the raw embedding model: VertexTextEmbedding, or a HashingEmbedder for an offline local index."""
+        return self._resource("embed_model", self._build_embed_model)
+
+    def query_embed_model(self):
+        """
+        Returns the semantic text embedding model (Vertex AI, through the embedding cache when enabled), even
+        when the local index embeds with the HashingEmbedder. Used where meaning matters, e.g. the answer cache.
+        """
+        return self._resource("query_embed_model", self._build_query_embed_model)
+
+    def vector_store(self):
+        """Returns the VertexAIVectorStore over the configured index and endpoint."""
+        return self._resource("vector_store", self._build_vector_store)
+
+    def index(self):
+        """Returns the LlamaIndex VectorStoreIndex over the Vertex AI Vector Store."""
+        return self._resource("index", self._build_index)
+
+    def backend(self):
+        """Returns the vector backend (LocalVectorBackend or VertexVectorBackend)."""
+        return self._resource("backend", self._build_backend)
+
+    def retriever(self):
+        """Returns the object whose search(query, filters, top_k) serves chat retrieval."""
+        return self._resource("retriever", self._build_retriever)
+
+    def web_tools(self):
+        """Returns the web search and scrape tools of the MLB information agent."""
+        return self._resource("web_tools", lambda: [SerperDevTool(), ScrapeWebsiteTool()])
+
+    def warm_up(self):
+        """
+        Builds every resource and sends one query embedding, so the first chat request does not pay for
+        connecting. Failures are recorded and reported, not raised.
+
+        Returns:
+            dict: The status() after warming up.
+        """
+        try:
+            self.retriever()
+            self.web_tools()
+            start = time.perf_counter()
+            embed_query(self.embed_model(), "warm up")  # Opens the prediction channel; bypasses the embedding cache on purpose
+            self.timings["embed_probe"] = round(time.perf_counter() - start, 3)
+            print(f"Vector retrieval warmed up ({self.backend_name}): {self.timings}")
+        except Exception as e:
+            print(f"Error warming up vector retrieval ({self.backend_name}): {e}")
+        return self.status()
+
+    def status(self):
+        """Returns which resources are connected, their build timings and the last build errors."""
+        with self._lock:
+            connected = sorted(self._resources)
+        return {"backend": self.backend_name, "ready": "retriever" in connected, "connected": connected,
+                "timings": dict(self.timings), "errors": dict(self.errors)}
+
+    def _resource(self, name, build):
+        """Returns a resource, building it on first use (double-checked, so concurrent first calls build it once)."""
+        resource = self._resources.get(name)
+        if resource is not None:
+            return resource
+        with self._lock:
+            if name not in self._resources:
+                start = time.perf_counter()
+                try:
+                    self._resources[name] = build()
+                except Exception as e:
+                    self.errors[name] = str(e)
+                    raise
+                self.timings[name] = round(time.perf_counter() - start, 3)
+                self.errors.pop(name, None)
+            return self._resources[name]
+
+    def _cached(self, model):
+        """Routes a remote embedding model through the persistent embedding cache, when enabled."""
+        return CachedEmbedding(model, self.embedding_cache) if self.embedding_cache else model
+
+    def _build_embed_model(self):
+        if self.backend_name == "local" and self.embeddings == "hashing":
+            return HashingEmbedder()
+        return text_embedding(self.embed_model_name, self.project_id, self.embed_location, self.credentials_path)
+
+    def _build_query_embed_model(self):
+        embed_model = self.embed_model()
+        if isinstance(embed_model, HashingEmbedder):
+            embed_model = text_embedding(self.embed_model_name, self.project_id, self.embed_location, self.credentials_path)
+        return self._cached(embed_model)
+
+    def _build_vector_store(self):
+        print("Connecting to Vertex AI Vector Search...")
+        aiplatform.init(project=self.project_id, location=self.region)  # Initialize Vertex AI
+        vertex_ai_index = aiplatform.MatchingEngineIndex(index_name=self.index_id)  # Load the Vertex AI Matching Engine Index
+        vertex_ai_endpoint = aiplatform.MatchingEngineIndexEndpoint(index_endpoint_name=self.endpoint_id)  # Load the Vertex AI Matching Engine Index Endpoint
+        return VertexAIVectorStore(project_id=self.project_id, region=self.region, index_id=vertex_ai_index.resource_name,
+                                   endpoint_id=vertex_ai_endpoint.resource_name, gcs_bucket_name=self.gcs_bucket_name)
+
+    def _build_index(self):
+        embed_model = self.embed_model()
+        Settings.embed_model = embed_model  # Set the embedding model for LlamaIndex
+        index = VectorStoreIndex.from_vector_store(vector_store=self.vector_store(), embed_model=embed_model)
+        print("Vertex AI Vector Search connected.")
+        return index
+
+    def _build_backend(self):
+        if self.backend_name == "local":
+            # In-process index: retrieval needs no network, and none at all with the hashing embedder
+            embed_model = self.embed_model()
+            backend = LocalVectorBackend(self.local_dir, embed_model if isinstance(embed_model, HashingEmbedder) else self._cached(embed_model))
+            print(f"Local vector index loaded from {self.local_dir} ({len(backend)} chunks).")
+            return backend
+        return VertexVectorBackend(self.index(), embedder=self._cached(self.embed_model()))
+
+    def _build_retriever(self):
+        if self.backend_name == "local":
+            return HybridRetriever(self.backend())  # Exact metadata pre-filters, dense + BM25 fused by rank
+        return self.backend()
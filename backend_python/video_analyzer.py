@@ -1,13 +1,23 @@
 import os
-import re
+import json
 import time
 from typing import List
-from google import genai
 from google.genai import types
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, CancelledError, as_completed
 from tqdm import tqdm
 import tenacity
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
+from job_scheduler import Priority
+from segment_analysis import SegmentAnalysis, parse_segment_analysis
+from llm_clients import genai_client
+from media_utils import segment_sort_key
+from telemetry import bind, stage
+
+
+class InvalidAnalysisError(Exception):
+    """Raised when Gemini's response does not match the requested schema."""
+
+
 DETAILED_GAME_ANALYSIS_PROMPT = """Analyze the provided video of a baseball game.
 
 **Deliverables:**
@@ -147,47 +157,65 @@ class VideoAnalyzer:
     It supports video uploading, analysis with specific prompts, and saving the analysis results to files.
     It also supports processing multiple video segments in parallel using a thread pool executor.
     """
-    def __init__(self, api_key, model_id):
+    def __init__(self, api_key, model_id, preprocessor=None):
         """
         Initializes the VideoAnalyzer with the API key, model ID, system prompt, and detailed analysis prompt.
 
         Args:
             api_key (str): The API key for the Google Gemini API.
             model_id (str): The ID of the Gemini model to use.
-            system_prompt (str): The system prompt to guide the model's behavior.
-            detailed_analysis_prompt (str): The prompt used to perform detailed analysis on the video content.
+            preprocessor (SegmentTranscoder, optional): Transcodes segments to a smaller, model-friendly profile before upload.
         """
-        self.client = genai.Client(api_key=api_key)  # Initialize the Gemini API client.
+        self.client = genai_client(api_key)  # Initialize the Gemini API client (the local stand-in when FAKE_GOOGLE_URL is set).
         self.model_id = model_id  # Store the model ID.
         self.system_prompt = SYSTEM_PROMPT
         self.detailed_analysis_prompt = DETAILED_GAME_ANALYSIS_PROMPT
+        self.response_schema = SegmentAnalysis  # Segment analyses are requested in JSON mode with this schema
+        self.preprocessor = preprocessor
 
 
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(10), retry=retry_if_exception_type(ValueError))
-    def analyze_baseball_video(self, video_path, user_prompt):
+    def analyze_baseball_video(self, video_path, user_prompt, response_schema=None):
         """
         Analyzes a single baseball video using the Gemini API.
-        Retries the analysis up to 3 times with a 10-second delay if a ValueError occurs.
+        Retries the upload and analysis up to 3 times with a 10-second delay if the video processing fails.
+        A response that does not match the schema is retried by generate_analysis on the same upload.
 
         Args:
             video_path (str): The path to the video file.
             user_prompt (str): The user prompt to guide the analysis.
+            response_schema (type, optional): Pydantic model the response must follow; Gemini is asked for JSON with
+                this schema and a response that does not validate is retried.
 
         Returns:
-            str: The text response from the Gemini API after analyzing the video.
+            str: The text response from the Gemini API after analyzing the video (compact JSON with a schema).
 
         Raises:
             ValueError: If the video processing fails after multiple retries.
+            InvalidAnalysisError: If every response failed schema validation.
         """
-        file_upload = self.client.files.upload(path=video_path)  # Upload the video file to the API.
-        while file_upload.state == "PROCESSING":  # Poll the upload status until it's complete.
-            print('Waiting for video to be processed.')
-            time.sleep(10)  # Wait for 10 seconds before checking again.
-            file_upload = self.client.files.get(name=file_upload.name)  # Get the updated file status.
+        with stage("video.preprocess", enabled=bool(self.preprocessor)):
+            upload_path = self.preprocessor.prepare(video_path) if self.preprocessor else video_path  # Upload the compact version when enabled.
+        file_upload = self.client.files.upload(path=upload_path)  # Upload the video file to the API.
+        with stage("gemini.processing_wait"):
+            while file_upload.state == "PROCESSING":  # Poll the upload status until it's complete.
+                print('Waiting for video to be processed.')
+                time.sleep(10)  # Wait for 10 seconds before checking again.
+                file_upload = self.client.files.get(name=file_upload.name)  # Get the updated file status.
         if file_upload.state == "FAILED":  # Raise an error if the video processing failed.
             raise ValueError(f"Video processing failed: {file_upload.state}")
         print(f'Video processing complete: ' + file_upload.uri)
-        prompt = user_prompt  # Use the user prompt for the analysis.
+        return self.generate_analysis(file_upload, video_path, user_prompt, response_schema)
+
+    @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(InvalidAnalysisError), reraise=True)
+    def generate_analysis(self, file_upload, video_path, prompt, response_schema=None):
+        """
+        Asks Gemini about an uploaded, processed video. Responses that do not match the segment schema are
+        retried up to 3 times with the same upload, so the video is neither uploaded nor processed again.
+
+        Returns:
+            str: The text response (compact JSON with a schema).
+        """
         response = self.client.models.generate_content(  # Generate content using the Gemini API.
             model=self.model_id,  # Specify the model to use.
             contents=[
@@ -200,8 +228,15 @@ class VideoAnalyzer:
             config=types.GenerateContentConfig(
                 system_instruction=self.system_prompt,  # Provide a system instruction.
                 temperature=0.0,  # Set the temperature to 0 for more deterministic output.
+                response_mime_type="application/json" if response_schema else None,  # JSON mode for structured analyses.
+                response_schema=response_schema,
             ),
         )
+        if response_schema is SegmentAnalysis:
+            analysis = parse_segment_analysis(response.text)
+            if analysis is None:
+                raise InvalidAnalysisError(f"Analysis of {video_path} does not match the segment schema")
+            return json.dumps(analysis)
         return response.text  # Return the text response from the API.
 
     def analyze_and_save(self, video_path, prompt, output_dir, segment_name):
@@ -209,33 +244,35 @@ class VideoAnalyzer:
         Analyzes a single video and saves the analysis result to a text file.
         """
         try:
-            analysis = self.analyze_baseball_video(video_path, prompt)  # Analyze the video using the specified prompt.
-            response_file = os.path.join(output_dir, f"{segment_name}.txt")  # Create the output file path.
-            with open(response_file, "w") as f:  # Open the file in write mode.
-                f.write(analysis)  # Write the analysis result to the file.
+            with stage("analyze_rag.segment", segment=segment_name):
+                schema = self.response_schema if prompt == self.detailed_analysis_prompt else None
+                analysis = self.analyze_baseball_video(video_path, prompt, response_schema=schema)  # Analyze the video using the specified prompt.
+                response_file = os.path.join(output_dir, f"{segment_name}.txt")  # Create the output file path.
+                with stage("analyze_rag.write"), open(response_file, "w") as f:  # Open the file in write mode.
+                    f.write(analysis)  # Write the analysis result to the file.
             print(f"Successfully processed and saved: {video_path}")  # Print message on successful analysis
             return True # Indicate success
         except Exception as e:
             print(f"Error processing {video_path}: {e}")
             return False # Indicate failure
 
-    @staticmethod
-    def extract_segment_number(filename):
+    def _analyze_segment(self, video_path, prompt, output_dir, segment_name, progress_callback=None, cancel_event=None):
         """
-        Extracts the segment number from the filename using regex.
-
-        Args:
-            filename (str): The filename of the video segment.
-
-        Returns:
-            int: The segment number if found, otherwise float('inf').
+        Runs analyze_and_save for one segment, reporting start and outcome through the progress callback.
         """
-        match = re.search(r'segment_(\d+)\.mp4', filename)  # Search for the pattern "segment_(\d+).mp4" in the filename.
-        if match:
-            return int(match.group(1))  # Return the captured segment number as an integer.
-        return float('inf')  # Put files that don't match at the end, ensures files without segment number appear at the end when sorting
+        if cancel_event is not None and cancel_event.is_set():  # Skip work that was queued before a cancel.
+            if progress_callback:
+                progress_callback(video_path, "cancelled")
+            return False
+        if progress_callback:
+            progress_callback(video_path, "processing")
+        success = self.analyze_and_save(video_path, prompt, output_dir, segment_name)
+        if progress_callback:
+            progress_callback(video_path, "done" if success else "failed")
+        return success
 
-    def process_segments(self, video_dir, output_dir, max_workers=4, max_retries=3):
+    def process_segments(self, video_dir, output_dir, max_workers=4, max_retries=3, scheduler=None,
+                         progress_callback=None, cancel_event=None, skip_existing=False):
         """
         Processes multiple video segments in parallel using a thread pool executor.
 
@@ -244,6 +281,15 @@ class VideoAnalyzer:
             output_dir (str): The directory to save the analysis results.
             max_workers (int): The maximum number of worker threads to use.
             max_retries (int): The maximum number of times to retry failed files.
+            scheduler (JobScheduler, optional): Shared scheduler to run the segments on as BATCH jobs instead of a
+                private thread pool, so that batch analysis yields to interactive requests. max_workers is ignored when set.
+            progress_callback (callable, optional): Called as progress_callback(video_path, status) where status is one of
+                "pending", "skipped", "processing", "done", "failed" or "cancelled".
+            cancel_event (threading.Event, optional): When set, no further segments are started and queued ones are dropped.
+            skip_existing (bool): Skip segments whose analysis file already exists in the event directory (used to resume).
+
+        Returns:
+            list: The video paths that were not processed successfully.
         """
         if not os.path.exists(output_dir):  # Check if output directory exists.
             os.makedirs(output_dir)  # Create the output directory if it doesn't exist.
@@ -251,41 +297,72 @@ class VideoAnalyzer:
         if not os.path.exists(event_dir): # specific event directory, adjust name if required.
             os.makedirs(event_dir) # Create an event directory within the output directory to save segment analysis results.
 
-        video_files = sorted([entry.path for entry in os.scandir(video_dir) if entry.is_file() and entry.name.endswith(".mp4")], key=self.extract_segment_number) # Grab all .mp4 files and then sort the files based on its filename
+        video_files = sorted([entry.path for entry in os.scandir(video_dir) if entry.is_file() and entry.name.endswith(".mp4")], key=segment_sort_key) # Grab all .mp4 files and then sort the files based on their segment number
         # List of files in `video_dir`, keeping only the file paths, ensures the filename contains ".mp4" and sorting the files based on segment number extracted from the filename
 
-        failed_files = video_files.copy() #Initially assume all have failed
+        failed_files = [] #Initially assume all have failed, except already analyzed ones when resuming
+        for video_path in video_files:
+            segment_name = os.path.splitext(os.path.basename(video_path))[0]
+            if skip_existing and os.path.exists(os.path.join(event_dir, f"{segment_name}.txt")):
+                status = "skipped"
+            else:
+                failed_files.append(video_path)
+                status = "pending"
+            if progress_callback:
+                progress_callback(video_path, status)
+
+        cancelled = lambda: cancel_event is not None and cancel_event.is_set()
 
         for retry_attempt in range(max_retries + 1):
           if not failed_files:
             print("All files processed successfully!")
             break # Break the loop once there are no more failed files.
+          if cancelled():
+            print("Segment processing cancelled.")
+            break
 
           print(f"\n--- Retry Attempt {retry_attempt}/{max_retries} ---")
 
-          with ThreadPoolExecutor(max_workers=max_workers) as executor:  # Create a thread pool executor with the specified number of worker threads.
+          executor = None if scheduler else ThreadPoolExecutor(max_workers=max_workers)  # Private pool only when no shared scheduler is given.
+          try:
               with tqdm(total=len(failed_files), desc="Processing video segments") as pbar:  # Initialize a progress bar.
                   futures = {}  # Dictionary to store futures and their corresponding video paths
                   for video_path in failed_files:  # Iterate over each video file that previously failed.
                       file_name = os.path.basename(video_path)  # Get the filename from the video path.
                       segment_name = os.path.splitext(file_name)[0]  # Remove the extension from the filename to get the segment name.
-                      future = executor.submit(  # Submit the analysis task to the thread pool executor.
-                          self.analyze_and_save,  # Call the analysis function.
+                      args = (
+                          bind(self._analyze_segment, "analyze_rag.queue_wait"),  # Call the analysis function, traced under the job.
                           video_path,  # Pass the video path.
                           self.detailed_analysis_prompt,  # Pass the detailed analysis prompt.
                           event_dir,  # Pass the output directory to event directory.
                           segment_name,  # Pass the segment name.
+                          progress_callback,  # Report per-segment progress.
+                          cancel_event,  # Allow queued segments to be dropped on cancel.
                       )
+                      if scheduler:
+                          future = scheduler.submit(Priority.BATCH, *args)  # Queue behind interactive and live work.
+                      else:
+                          future = executor.submit(*args)  # Submit the analysis task to the thread pool executor.
                       futures[video_path] = future  # Store the future with the video path as the key
 
                   successful_files = [] # Keep track of the files processed successfully in this retry attempt.
                   for video_path, future in tqdm(futures.items(), desc="Collecting Results"):  # Iterate through the futures dictionary
+                      if cancelled():
+                          future.cancel()  # Drop segments that have not started yet.
                       try:
                           if future.result(): # Get result, is True when successful
                               successful_files.append(video_path) #Store the file path if it was successful
+                      except CancelledError:
+                          if progress_callback:
+                              progress_callback(video_path, "cancelled")
                       except Exception as e:
                           print(f"Task failed for {video_path} with exception: {e}") # Print exception, though the retry would catch it anyway.
+                          if progress_callback:
+                              progress_callback(video_path, "failed")
                       pbar.update(1)
+          finally:
+              if executor:
+                  executor.shutdown(wait=True, cancel_futures=cancelled())
 
           # Update the list of failed files by removing successfully processed files
           failed_files = [f for f in failed_files if f not in successful_files]
@@ -295,4 +372,5 @@ class VideoAnalyzer:
             for file_path in failed_files:
                 print(file_path)
         else:
-            print("\nAll files processed SUCCESSFULLY after retries!")
\ No newline at end of file
+            print("\nAll files processed SUCCESSFULLY after retries!")
+        return failed_files
@@ -0,0 +1,196 @@
+import os
+import re
+import tempfile
+import threading
+
+import ffmpeg
+
+from media_utils import extract_segment_number, probe_duration
+
+
+class ClipCutter:
+    """
+    Cuts short clips out of the 30-second segments with ffmpeg stream copy (no re-encode).
+
+    Clips are cached on disk by (segment, range), so asking about the same moment twice reuses the
+    existing file. Ranges that cross a segment boundary join the pieces of the neighbouring segments.
+    """
+    def __init__(self, cache_dir="cache/clips", segment_duration=30, segment_bounds=None):
+        """
+        Initializes the ClipCutter.
+
+        Args:
+            cache_dir (str): Directory where cut clips are stored.
+            segment_duration (float): Nominal length of a segment in seconds.
+            segment_bounds (callable, optional): segment_bounds(segment_name) returns the (start, end) video
+                seconds of a segment, e.g. PlayAlignment.segment_bounds over the segmenter's keyframe-aligned
+                index. Without it segments are assumed to be exactly segment_duration long.
+        """
+        self.cache_dir = cache_dir
+        self.segment_duration = segment_duration
+        self.segment_bounds = segment_bounds
+        self._locks = {}  # output path -> lock, so concurrent requests cut a clip only once
+        self._locks_guard = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def source_segment(clip_path):
+        """
+        Returns the name of the segment a clip ends in, read back from the clip's cache name, or None if
+        clip_path is not a clip.
+        """
+        name = os.path.basename(clip_path)
+        if not name.startswith("clip_"):
+            return None
+        match = re.match(r'(.+)_\d+-\d+$', os.path.splitext(name[len("clip_"):])[0].split("__")[-1])
+        return match.group(1) + ".mp4" if match else None
+
+    def clip_for_query(self, segment_path, current_time, window=10.0):
+        """
+        Returns a clip of `window` seconds ending at the viewer's position inside the segment.
+
+        Args:
+            segment_path (str): Path of the segment being watched.
+            current_time (float): Elapsed game time in seconds sent by the client. Its position inside the
+                segment is rounded to whole seconds so that questions asked moments apart share a cached clip.
+            window (float): Length of the clip in seconds.
+
+        Returns:
+            str: Path to the clip, or segment_path itself if no clip could be cut.
+        """
+        try:
+            offset = float(round(self.offset_in_segment(segment_path, float(current_time))))
+            return self.cut_window(segment_path, offset, window)
+        except Exception as e:
+            print(f"Could not cut clip from {segment_path}, using full segment: {e}")
+            return segment_path
+
+    def offset_in_segment(self, segment_path, current_time):
+        """
+        Returns the position of current_time (video seconds) inside segment_path, measured from the segment's
+        recorded start and clamped to its length. Segments without recorded bounds fall back to current_time
+        modulo the nominal segment duration.
+        """
+        if self.segment_bounds:
+            try:
+                start, end = self.segment_bounds(os.path.basename(segment_path))
+                return min(max(current_time - start, 0.0), end - start)
+            except ValueError:
+                pass
+        return current_time % self.segment_duration
+
+    def cut_window(self, segment_path, end, window):
+        """
+        Cuts the `window` seconds before `end` (seconds into segment_path), reaching into the previous
+        segment when the window starts before the segment does.
+        """
+        return self.cut_range(segment_path, end - window, end)
+
+    def cut_range(self, segment_path, start, end):
+        """
+        Cuts [start, end) seconds relative to the beginning of segment_path. A negative start reaches
+        into the previous segment and an end past the segment's duration into the next one.
+
+        Returns:
+            str: Path to the clip (segment_path itself if the range is empty).
+        """
+        duration = probe_duration(segment_path) or self.segment_duration
+        pieces = []
+        if start < 0:
+            previous_path = self.adjacent_segment(segment_path, -1)
+            if previous_path:
+                previous_duration = probe_duration(previous_path) or self.segment_duration
+                pieces.append((previous_path, max(0.0, previous_duration + start), previous_duration))
+            start = 0.0
+        if min(end, duration) > start:
+            pieces.append((segment_path, start, min(end, duration)))
+        if end > duration:
+            next_path = self.adjacent_segment(segment_path, 1)
+            if next_path:
+                next_duration = probe_duration(next_path) or self.segment_duration
+                pieces.append((next_path, max(0.0, start - duration), min(end - duration, next_duration)))
+        if not pieces:
+            return segment_path
+
+        output_path = os.path.join(self.cache_dir, self.clip_name(pieces))
+        with self._lock_for(output_path):
+            if not os.path.exists(output_path):
+                if len(pieces) == 1:
+                    self.cut(*pieces[0], output_path)
+                else:
+                    self.concat(pieces, output_path)
+        return output_path
+
+    def cut(self, segment_path, start, end, output_path):
+        """
+        Cuts [start, end) of segment_path into output_path with stream copy. Because no frames are
+        re-encoded, the clip starts at the keyframe at or before `start`.
+        """
+        tmp_path = output_path + ".tmp.mp4"
+        (
+            ffmpeg
+            .input(segment_path, ss=f"{start:.3f}")
+            .output(tmp_path, t=f"{end - start:.3f}", c="copy", avoid_negative_ts="make_zero", movflags="+faststart")
+            .overwrite_output()
+            .run(quiet=True)
+        )
+        os.replace(tmp_path, output_path)
+        return output_path
+
+    def concat(self, pieces, output_path):
+        """
+        Cuts each (segment_path, start, end) piece and joins them with the concat demuxer, all with stream copy.
+        """
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as work_dir:
+            piece_paths = [self.cut(segment_path, start, end, os.path.join(work_dir, f"piece_{i:03d}.mp4"))
+                           for i, (segment_path, start, end) in enumerate(pieces)]
+            self.join(piece_paths, output_path)
+        return output_path
+
+    def join(self, paths, output_path):
+        """
+        Joins existing clips end to end with the concat demuxer and stream copy. The clips must share
+        codecs and parameters, which holds for anything cut from the same game's segments.
+        """
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as work_dir:
+            list_path = os.path.join(work_dir, "pieces.txt")
+            with open(list_path, "w") as f:
+                for path in paths:
+                    f.write(f"file '{os.path.abspath(path)}'\n")
+            tmp_path = output_path + ".tmp.mp4"
+            (
+                ffmpeg
+                .input(list_path, f="concat", safe=0)
+                .output(tmp_path, c="copy", movflags="+faststart")
+                .overwrite_output()
+                .run(quiet=True)
+            )
+            os.replace(tmp_path, output_path)
+        return output_path
+
+    def adjacent_segment(self, segment_path, step):
+        """
+        Returns the path of the segment `step` positions away (keeping the zero padding of the name), or None.
+        """
+        number = extract_segment_number(segment_path)
+        if number is None or number + step < 0:
+            return None
+        name = os.path.basename(segment_path)
+        digits = re.search(r'segment_(\d+)\.\w+$', name).group(1)
+        adjacent_name = re.sub(r'segment_\d+(\.\w+)$', lambda m: f"segment_{number + step:0{len(digits)}d}{m.group(1)}", name)
+        adjacent_path = os.path.join(os.path.dirname(segment_path), adjacent_name)
+        return adjacent_path if os.path.exists(adjacent_path) else None
+
+    @staticmethod
+    def clip_name(pieces):
+        """
+        Deterministic cache name for a list of (segment_path, start, end) pieces, in milliseconds. The last
+        piece names the segment the clip ends in (see source_segment).
+        """
+        parts = [f"{os.path.splitext(os.path.basename(path))[0]}_{int(round(start * 1000))}-{int(round(end * 1000))}"
+                 for path, start, end in pieces]
+        return "clip_" + "__".join(parts) + ".mp4"
+
+    def _lock_for(self, output_path):
+        with self._locks_guard:
+            return self._locks.setdefault(output_path, threading.Lock())
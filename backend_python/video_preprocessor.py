@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+
+import ffmpeg
+
+from media_utils import file_sha256
+
+# Encoding profiles for segments sent to Gemini. Gemini samples video at about 1 frame per second and
+# downmixes audio, so a small, low frame rate encode carries the same information as the source.
+TRANSCODE_PROFILES = {
+    "model": {"height": 360, "fps": 2, "crf": 30, "preset": "veryfast", "audio_bitrate": "32k", "audio_rate": 16000},
+    "model_low": {"height": 240, "fps": 1, "crf": 34, "preset": "veryfast", "audio_bitrate": "24k", "audio_rate": 16000},
+}
+
+
+class SegmentTranscoder:
+    """
+    Optional preprocessing stage that transcodes video segments to a model-friendly profile before upload.
+
+    Transcoded files are cached on disk under a key derived from the source content hash and the profile
+    settings, so each segment is transcoded at most once no matter how often it is analyzed.
+    """
+    def __init__(self, cache_dir="cache/transcoded", profile="model"):
+        """
+        Initializes the SegmentTranscoder.
+
+        Args:
+            cache_dir (str): Directory where transcoded segments are stored.
+            profile (str): Name of the profile in TRANSCODE_PROFILES to encode with.
+        """
+        if profile not in TRANSCODE_PROFILES:
+            raise ValueError(f"Unknown transcode profile: {profile}")
+        self.cache_dir = cache_dir
+        self.profile = profile
+        self.settings = TRANSCODE_PROFILES[profile]
+        self._settings_hash = hashlib.sha256(json.dumps(self.settings, sort_keys=True).encode()).hexdigest()[:8]
+        self._locks = {}  # cache path -> lock, so concurrent requests for one segment transcode it once
+        self._locks_guard = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def cache_path(self, video_path):
+        """Returns the cache location of the transcoded version of video_path."""
+        return os.path.join(self.cache_dir, f"{file_sha256(video_path)}_{self.profile}_{self._settings_hash}.mp4")
+
+    def prepare(self, video_path):
+        """
+        Returns the path of the file that should be uploaded for video_path: the cached transcode when it is
+        smaller than the source, otherwise the source itself. Errors fall back to the source file.
+
+        Args:
+            video_path (str): Path to the original segment.
+
+        Returns:
+            str: Path to upload.
+        """
+        try:
+            output_path = self.cache_path(video_path)
+            with self._locks_guard:
+                lock = self._locks.setdefault(output_path, threading.Lock())
+            with lock:
+                if not os.path.exists(output_path):
+                    self.transcode(video_path, output_path)
+            if os.path.getsize(output_path) >= os.path.getsize(video_path):
+                return video_path  # Already compact, nothing to gain
+            return output_path
+        except Exception as e:
+            print(f"Preprocessing failed for {video_path}, uploading original: {e}")
+            return video_path
+
+    def transcode(self, video_path, output_path):
+        """
+        Transcodes video_path to output_path using the configured profile. The output is written to a
+        temporary file first so a crashed transcode never leaves a partial file in the cache.
+        """
+        settings = self.settings
+        tmp_path = output_path + ".tmp.mp4"
+        (
+            ffmpeg
+            .input(video_path)
+            .output(
+                tmp_path,
+                vf=f"scale=-2:{settings['height']},fps={settings['fps']}",
+                ac=1,
+                ar=settings["audio_rate"],
+                crf=settings["crf"],
+                preset=settings["preset"],
+                movflags="+faststart",
+                **{"c:v": "libx264", "c:a": "aac", "b:a": settings["audio_bitrate"]},
+            )
+            .overwrite_output()
+            .run(quiet=True)
+        )
+        os.replace(tmp_path, output_path)
+        return output_path
@@ -144,6 +144,7 @@ const App = () => {
         query: query,
         video: currentBuffer[currentSegmentIndex],
         current_time: elapsedTime,
+        segment_time: video.currentTime,
       };
       if (requestBody.video === undefined) {
         requestBody.video = "segment_003.mp4";
@@ -59,7 +59,8 @@ const VideoPage = () => {
             const requestData = {
                 query: query,
                 video: currentSegmentPath,
-                current_time: elapsedTime
+                current_time: elapsedTime,
+                segment_time: currentTime
             };
             const response =  axios.post(`${API_BASE_URL}/analyze`, requestData)
             console.log(response)
@@ -287,48 +288,6 @@ const VideoPage = () => {
         return () => clearTimeout(bufferTimeout);
     }, []);
  
-    const saveSegment = async (videoBlob) => {
-        try {
-            const base64Data = await blobToBase64(videoBlob);
-            //   console.log("Base64 Data:", base64Data);
- 
-            const requestBody = {
-                videoData: base64Data,
-            };
-            //   console.log("Request Body:", requestBody);
- 
-            const response = await fetch(`${API_BASE_URL}/save-segment`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(requestBody),
-            });
- 
-            const result = await response.json();
-            if (response.ok) {
-                console.log('Segment saved successfully:', result);
-                return result
-            } else {
-                console.error('Error saving segment:', result);
-                return {}
-            }
-        } catch (error) {
-            console.error('Error during save request:', error);
-            return {}
-        }
-    };
- 
-    // Helper function to convert Blob to Base64
-    const blobToBase64 = (blob) => {
-        return new Promise((resolve, reject) => {
-            const reader = new FileReader();
-            reader.onloadend = () => resolve(reader.result);
-            reader.onerror = reject;
-            reader.readAsDataURL(blob);
-        });
-    };
- 
     const sendChatMessage = () => {
         if (chatInput.trim()) {
             const newMessage = { sender: "user", text: chatInput };
@@ -350,67 +309,25 @@ const VideoPage = () => {
         if (video) {
             const currentTime = video.currentTime;
             const segmentDuration = 10;
-            const videoElement = document.createElement("video");
-            videoElement.src = video.src;
-            videoElement.crossOrigin = "anonymous";
- 
-            const stream = videoElement.captureStream();
-            const mediaRecorder = new MediaRecorder(stream);
-            let chunks = [];
-            mediaRecorder.ondataavailable = (e) => {
-                chunks.push(e.data);
-            };
-            mediaRecorder.onstop = async () => {
-                const videoBlob = new Blob(chunks, { type: "video/mp4" });
-                console.log("Captured videoBlob:", videoBlob.size, videoBlob.type);
- 
-                const saveMessage = await saveSegment(videoBlob);
-                // console.log(".....................saveMessage...................", saveMessage)
-                if (saveMessage) {
-                    const latestVideoFile = await fetchLatestVideo();
-                    // console.log("......................latestVideoFile.................", latestVideoFile)
-                    if (latestVideoFile) {
-                        const newMessage = {
-                            sender: "agent",
-                            text: "",
-                            videoUrl: `${API_BASE_URL}/saved_segments/${latestVideoFile}`,
-                        };
-                        // console.log("...........newMessage.........", newMessage)
-                        setChatMessages((prevMessages) => [...prevMessages, newMessage]);
-                    }
-                }
-            };
-            videoElement.currentTime = currentTime;
-            videoElement.onseeked = () => {
-                mediaRecorder.start();
-                videoElement.play();
-            };
-            setTimeout(() => {
-                mediaRecorder.stop();
-                videoElement.pause();
-            }, segmentDuration * 1000);
-        }
-    };
- 
-    // Function to fetch the latest saved video
-    const fetchLatestVideo = async () => {
-        try {
-            const response = await fetch(`${API_BASE_URL}/get-latest-video`);
-            if (response.ok) {
-                const videoData = await response.json();
-                console.log(videoData.latestVideoFile);
-                return videoData.latestVideoFile;
-            } else {
-                console.error("Error fetching the latest video");
+            try {
+                // The server cuts the clip from the segment files with stream copy, no replay needed
+                const response = await axios.post(`${API_BASE_URL}/clips`, {
+                    segmentName: currentBuffer[currentSegmentIndex],
+                    start: currentTime,
+                    end: currentTime + segmentDuration,
+                });
+                const newMessage = {
+                    sender: "agent",
+                    text: "",
+                    videoUrl: `${API_BASE_URL}/saved_segments/${response.data.clipId}`,
+                };
+                setChatMessages((prevMessages) => [...prevMessages, newMessage]);
+            } catch (error) {
+                console.error("Error creating clip:", error);
             }
-        } catch (error) {
-            console.error("Error fetching the latest video:", error);
         }
- 
-        return null;
     };
  
- 
     const getTooltipId = () => {
         return activeBox === 'B1' ? 'statistics-tooltip' : 'commentary-tooltip';
     };